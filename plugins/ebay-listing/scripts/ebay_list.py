@@ -20,28 +20,48 @@ Setup (OAuth):
   6. Run: python3 ebay_list.py list ...
 """
 import argparse
+import atexit
 import base64
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import cProfile
+import csv
+import gzip
+import hashlib
+import hmac
+import io
 import http.server
+import ipaddress
 import json
+import math
 import mimetypes
+import mmap
 import os
+import pstats
+import queue
 import re
+import socket
+import sqlite3
 import ssl
+import struct
 import subprocess
 import sys
 import tempfile
 import threading
 import time
+import tracemalloc
 import urllib.parse
 import uuid
 import webbrowser
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
 import requests
 import requests.packages.urllib3.util.connection as urllib3_cn
 
-# Force IPv4 — workaround for Python 3.14 + local DNS proxy failing IPv6 lookups
-urllib3_cn.HAS_IPV6 = False
-
 PRODUCTION_API = "https://api.ebay.com"
 SANDBOX_API = "https://api.sandbox.ebay.com"
 PRODUCTION_AUTH = "https://auth.ebay.com"
@@ -49,6 +69,12 @@ SANDBOX_AUTH = "https://auth.sandbox.ebay.com"
 
 TOKEN_FILE = os.path.expanduser("~/.ebay_tokens.json")
 
+# Local caches and stores (messages, sales history, ...) live here
+STATE_DIR = os.path.expanduser(os.environ.get("EBAY_STATE_DIR", "~/.ebay_listing"))
+
+# Default worker count for concurrent API calls
+MAX_WORKERS = 4
+
 SELL_SCOPE = "https://api.ebay.com/oauth/api_scope/sell.inventory"
 
 # Common eBay marketplace IDs
@@ -71,6 +97,15 @@ class EbayApiError(Exception):
     pass
 
 
+class DeadlineExceeded(Exception):
+    """The --deadline budget for this command ran out.
+
+    Deliberately not an EbayApiError: handlers that skip or report a failed call
+    must not swallow it and carry on past the budget.
+    """
+    pass
+
+
 # --- Presets for common listing configurations ---
 
 LISTING_PRESETS = {
@@ -85,6 +120,9 @@ LISTING_PRESETS = {
         ],
         "no_returns": True,
         "best_offer": True,
+        # Business policies by name (or ID), e.g. {"shipping": "Mascot pickup", "return": "No returns"}.
+        # When set, listings reference them instead of carrying inline shipping/returns.
+        "seller_profiles": {},
     },
 }
 
@@ -112,7 +150,16 @@ def get_auth_mode() -> str:
     return "oauth"
 
 
-def get_env():
+def get_env(account: str | None = None):
+    """Credentials for an account profile, or from env vars when no profile is selected.
+
+    account defaults to the profile made current by use_account().
+    """
+    if account is None:
+        account = current_account()
+    if account:
+        return account_env(account)
+
     mode = get_auth_mode()
     sandbox = os.environ.get("EBAY_SANDBOX", "").lower() in ("1", "true", "yes")
 
@@ -151,22 +198,231 @@ def basic_auth_header(client_id: str, client_secret: str) -> str:
     return f"Basic {creds}"
 
 
+# --- Accounts ---
+
+# Named seller profiles live in STATE_DIR/accounts.json, e.g.
+#   {"shop-a": {"auth_token_env": "SHOP_A_TOKEN", "rate_per_second": 4},
+#    "shop-b": {"client_id": "...", "client_secret": "...", "runame": "..."}}
+# Each profile gets its own HTTP session, token file, rate budget and state directory.
+_ACCOUNT: contextvars.ContextVar[str] = contextvars.ContextVar("ebay_account", default="")
+_ACCOUNT_RUNTIME: dict[str, dict] = {}
+_ACCOUNT_LOCK = threading.Lock()
+
+
+class RateLimiter:
+    """Token bucket shared by every thread making calls for one account."""
+
+    def __init__(self, rate_per_second: float = 0, burst: int = 0):
+        self.rate = rate_per_second
+        self.capacity = burst or max(1, int(rate_per_second))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            remaining = deadline_remaining()
+            if remaining is not None and wait > remaining:
+                raise DeadlineExceeded(f"Deadline of {_DEADLINE['seconds']:g}s exceeded waiting for the rate limit")
+            time.sleep(wait)
+            _profile_wait("rate_limit", wait)
+
+    def try_acquire(self) -> bool:
+        """Take a token only if one is available right now."""
+        if self.rate <= 0:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+def load_accounts() -> dict[str, dict]:
+    path = os.path.join(STATE_DIR, "accounts.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def account_env(name: str) -> dict:
+    """Build a get_env()-style dict from a named profile."""
+    profile = load_accounts().get(name)
+    if profile is None:
+        raise EbayApiError(f"Unknown account '{name}'. Define it in {os.path.join(STATE_DIR, 'accounts.json')}.")
+    sandbox = bool(profile.get("sandbox", False))
+    token = profile.get("auth_token") or os.environ.get(profile.get("auth_token_env", ""), "")
+    if token:
+        return {"mode": "authnauth", "auth_token": token, "sandbox": sandbox, "account": name}
+    missing = [k for k in ("client_id", "client_secret", "runame") if not profile.get(k)]
+    if missing:
+        raise EbayApiError(f"Account '{name}' needs auth_token / auth_token_env or {', '.join(missing)}.")
+    return {
+        "mode": "oauth",
+        "client_id": profile["client_id"],
+        "client_secret": profile["client_secret"],
+        "runame": profile["runame"],
+        "sandbox": sandbox,
+        "account": name,
+    }
+
+
+def current_account() -> str:
+    return _ACCOUNT.get()
+
+
+@contextlib.contextmanager
+def use_account(name: str):
+    """Make a profile current for this thread (and work it submits via _run_concurrently)."""
+    token = _ACCOUNT.set(name)
+    try:
+        yield
+    finally:
+        _ACCOUNT.reset(token)
+
+
+def _account_runtime() -> dict:
+    """Session and rate limiter for the current account, created on first use.
+
+    The default (env var) account keeps using module-level requests calls.
+    """
+    name = current_account()
+    with _ACCOUNT_LOCK:
+        runtime = _ACCOUNT_RUNTIME.get(name)
+        if runtime is None:
+            if name:
+                profile = load_accounts().get(name, {})
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=MAX_WORKERS * 2)
+                session.mount("https://", adapter)
+                rate = float(profile.get("rate_per_second", 0))
+            else:
+                session = None
+                rate = float(os.environ.get("EBAY_RATE_LIMIT", "0") or 0)
+            runtime = {"session": session, "limiter": RateLimiter(rate)}
+            _ACCOUNT_RUNTIME[name] = runtime
+    return runtime
+
+
+def _state_dir() -> str:
+    name = current_account()
+    return os.path.join(STATE_DIR, "accounts", name) if name else STATE_DIR
+
+
+def _token_file() -> str:
+    name = current_account()
+    return os.path.join(STATE_DIR, "accounts", name, "tokens.json") if name else TOKEN_FILE
+
+
+def _state_path(*parts: str) -> str:
+    """Return a path under the current account's state directory, creating parents as needed."""
+    path = os.path.join(_state_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def _submit_all(pool: ThreadPoolExecutor, fn, items: list) -> list:
+    """Submit fn(item) for each item, carrying the caller's context (current account) along."""
+    fn = _profiled_task(fn)
+    return [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+
+
+def _iter_results(futures: list):
+    """Yield future results in order, waiting no longer than the remaining deadline.
+
+    If the deadline passes, a future fails or the caller stops early, work that
+    hasn't started yet is cancelled. Calls already in flight are bounded by
+    their own (deadline-clipped) timeouts.
+    """
+    try:
+        for future in futures:
+            remaining = deadline_remaining()
+            try:
+                yield future.result(timeout=None if remaining is None else max(0, remaining))
+            except concurrent.futures.TimeoutError:
+                raise DeadlineExceeded(f"Deadline of {_DEADLINE['seconds']:g}s exceeded") from None
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _run_concurrently(fn, items: list, max_workers: int = MAX_WORKERS) -> list:
+    """Run fn over items on a thread pool, returning results in input order."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(_iter_results(_submit_all(pool, fn, items)))
+
+
+_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(namespace: str, key: str, ttl: float):
+    """Return a cached value from <state dir>/cache/<namespace>.json, or None if missing/expired."""
+    path = os.path.join(_state_dir(), "cache", f"{namespace}.json")
+    with _CACHE_LOCK:
+        try:
+            with open(path) as f:
+                entry = json.load(f).get(key)
+        except (OSError, ValueError):
+            return None
+    if entry is None or time.time() - entry["saved_at"] > ttl:
+        return None
+    return entry["value"]
+
+
+def _cache_put(namespace: str, key: str, value):
+    path = _state_path("cache", f"{namespace}.json")
+    with _CACHE_LOCK:
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        data[key] = {"saved_at": time.time(), "value": value}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def _ebay_time(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
 # --- Token management ---
 
 
 def save_tokens(data: dict):
+    token_file = _token_file()
+    os.makedirs(os.path.dirname(token_file), exist_ok=True)
     data["saved_at"] = time.time()
-    with open(TOKEN_FILE, "w") as f:
+    with open(token_file, "w") as f:
         json.dump(data, f, indent=2)
-    os.chmod(TOKEN_FILE, 0o600)
-    print(f"Tokens saved to {TOKEN_FILE}")
+    os.chmod(token_file, 0o600)
+    print(f"Tokens saved to {token_file}")
 
 
 def load_tokens() -> dict:
-    if not os.path.exists(TOKEN_FILE):
+    token_file = _token_file()
+    if not os.path.exists(token_file):
         print(f"No tokens found. Run 'ebay_list.py auth' first.", file=sys.stderr)
         sys.exit(1)
-    with open(TOKEN_FILE) as f:
+    with open(token_file) as f:
         return json.load(f)
 
 
@@ -185,17 +441,17 @@ def get_access_token() -> str:
 
 def refresh_token(tokens: dict) -> dict:
     env = get_env()
-    resp = requests.post(
-        f"{api_base(env['sandbox'])}/identity/v1/oauth2/token",
+    resp = _http_request(
+        "POST", f"{api_base(env['sandbox'])}/identity/v1/oauth2/token", "OAuthRefresh",
         headers={
             "Content-Type": "application/x-www-form-urlencoded",
             "Authorization": basic_auth_header(env["client_id"], env["client_secret"]),
         },
-        data={
+        data=urllib.parse.urlencode({
             "grant_type": "refresh_token",
             "refresh_token": tokens["refresh_token"],
             "scope": SELL_SCOPE,
-        },
+        }),
     )
     if resp.status_code != 200:
         print(f"Token refresh failed: {resp.status_code} {resp.text}", file=sys.stderr)
@@ -283,17 +539,17 @@ def do_auth():
         sys.exit(1)
 
     # Exchange code for tokens
-    resp = requests.post(
-        f"{api_base(sandbox)}/identity/v1/oauth2/token",
+    resp = _http_request(
+        "POST", f"{api_base(sandbox)}/identity/v1/oauth2/token", "OAuthToken",
         headers={
             "Content-Type": "application/x-www-form-urlencoded",
             "Authorization": basic_auth_header(env["client_id"], env["client_secret"]),
         },
-        data={
+        data=urllib.parse.urlencode({
             "grant_type": "authorization_code",
             "code": auth_code_holder["code"],
             "redirect_uri": env["runame"],
-        },
+        }),
     )
 
     if resp.status_code != 200:
@@ -340,8 +596,8 @@ def create_inventory_item(
         "product": product,
     }
 
-    resp = requests.put(
-        url,
+    resp = _http_request(
+        "PUT", url, "createOrReplaceInventoryItem",
         headers={
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
@@ -381,8 +637,8 @@ def create_offer(
     if category_id:
         body["categoryId"] = category_id
 
-    resp = requests.post(
-        url,
+    resp = _http_request(
+        "POST", url, "createOffer",
         headers={
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json",
@@ -403,13 +659,14 @@ def publish_offer(offer_id: str, sandbox: bool = False) -> str:
     token = get_access_token()
     url = f"{api_base(sandbox)}/sell/inventory/v1/offer/{offer_id}/publish"
 
-    resp = requests.post(
-        url,
+    resp = _http_request(
+        "POST", url, "publishOffer",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
     )
 
     if resp.status_code == 200:
         listing_id = resp.json().get("listingId", "")
+        count_event("listings_created")
         print(f"Published! Listing ID: {listing_id}")
         print(f"https://www.ebay.com/itm/{listing_id}")
         return listing_id
@@ -453,30 +710,1090 @@ def _escape_xml(text: str) -> str:
     )
 
 
-def trading_api_call(
-    call_name: str,
-    xml_body: str,
-    auth_token: str,
-    sandbox: bool = False,
-    site_id: str = "0",
-) -> str:
-    url = TRADING_API_SANDBOX if sandbox else TRADING_API_PRODUCTION
-    headers = {
+# --- Connection layer ---
+
+# urllib3 opens every connection through util.connection.create_connection, which
+# tries addresses one at a time, so a dead IPv6 path costs a full connect timeout.
+# This replacement races IPv6 and IPv4 Happy-Eyeballs style (RFC 8305) and
+# remembers which family won per host. Lookups go through a small TTL cache
+# persisted in the state directory, so each invocation doesn't resolve from scratch.
+HAPPY_EYEBALLS_DELAY = 0.25
+DNS_CACHE_TTL = 300
+DNS_CACHE_MAX_ENTRIES = 64
+_DNS: dict = {"entries": None}
+_DNS_LOCK = threading.Lock()
+
+
+def _dns_path() -> str:
+    return os.path.join(STATE_DIR, "dns_cache.json")
+
+
+def _dns_entries() -> dict:
+    """host:port -> {"addrs": [[family, sockaddr], ...], "expires": epoch, "family": winning family}."""
+    if _DNS["entries"] is None:
+        try:
+            with open(_dns_path()) as f:
+                _DNS["entries"] = json.load(f)
+        except (OSError, ValueError):
+            _DNS["entries"] = {}
+    return _DNS["entries"]
+
+
+def _save_dns():
+    entries = _dns_entries()
+    if len(entries) > DNS_CACHE_MAX_ENTRIES:
+        for key in sorted(entries, key=lambda k: entries[k]["expires"])[:len(entries) - DNS_CACHE_MAX_ENTRIES]:
+            del entries[key]
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        tmp = f"{_dns_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, _dns_path())
+    except OSError:
+        pass  # the cache is an optimisation; never fail a request over it
+
+
+def _getaddrinfo(host: str, port: int) -> list[list]:
+    try:
+        infos = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)
+    except socket.gaierror:
+        # Some local DNS proxies fail AAAA lookups outright; IPv4 alone still works
+        infos = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)
+    addrs = []
+    for family, _, _, _, sockaddr in infos:
+        entry = [int(family), list(sockaddr)]
+        if entry not in addrs:
+            addrs.append(entry)
+    return addrs
+
+
+def resolve_host(host: str, port: int) -> list[tuple[int, tuple]]:
+    """Addresses to try for host:port, remembered winning family first, families interleaved."""
+    try:
+        ipaddress.ip_address(host)
+        literal = True
+    except ValueError:
+        literal = host == "localhost"
+    if literal:
+        return [(int(f), tuple(sa)) for f, _, _, _, sa in socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket.SOCK_STREAM)]
+
+    key = f"{host}:{port}"
+    with _DNS_LOCK:
+        entry = dict(_dns_entries().get(key) or {})
+    if not entry or entry["expires"] < time.time():
+        try:
+            addrs = _getaddrinfo(host, port)
+        except socket.gaierror:
+            if not entry:
+                raise
+            # Resolver down: a stale answer beats none, but it keeps its expiry so
+            # the next connection asks the resolver again
+        else:
+            entry = {"addrs": addrs, "expires": time.time() + DNS_CACHE_TTL, "family": entry.get("family", 0)}
+            with _DNS_LOCK:
+                _dns_entries()[key] = entry
+                _save_dns()
+
+    by_family: dict[int, list] = {}
+    for family, sockaddr in entry["addrs"]:
+        by_family.setdefault(family, []).append((family, tuple(sockaddr)))
+    order = sorted(by_family, key=lambda f: f != entry["family"])  # stable: keeps resolver order otherwise
+    queues = [by_family[f] for f in order]
+    interleaved = []
+    while any(queues):
+        for q in queues:
+            if q:
+                interleaved.append(q.pop(0))
+    return interleaved
+
+
+def _forget_host(host: str, port: int) -> bool:
+    """Drop a host's cached addresses. Returns whether there were any."""
+    with _DNS_LOCK:
+        if _dns_entries().pop(f"{host}:{port}", None) is None:
+            return False
+        _save_dns()
+    return True
+
+
+def _remember_family(host: str, port: int, family: int):
+    key = f"{host}:{port}"
+    with _DNS_LOCK:
+        entry = _dns_entries().get(key)
+        if entry and entry.get("family") != family:
+            entry["family"] = family
+            _save_dns()
+
+
+def _connect_one(family: int, sockaddr: tuple, timeout, source_address, socket_options) -> socket.socket:
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        for option in socket_options or []:
+            sock.setsockopt(*option)
+        if timeout is None or isinstance(timeout, (int, float)):
+            sock.settimeout(timeout)  # anything else is urllib3's "use the default" sentinel
+        if source_address:
+            sock.bind(source_address)
+        sock.connect(sockaddr)
+        return sock
+    except OSError:
+        sock.close()
+        raise
+
+
+def _close_losers(results: queue.Queue, pending: int):
+    for _ in range(pending):
+        sock = results.get()[1]
+        if sock is not None:
+            sock.close()
+
+
+def create_connection(address, timeout=None, source_address=None, socket_options=None) -> socket.socket:
+    """Drop-in for urllib3's create_connection that races address families.
+
+    The next address starts after HAPPY_EYEBALLS_DELAY, or straight away once the
+    current attempt fails. The first connect to succeed wins; the rest are closed.
+    If every address fails, the cached answer may be out of date (the host moved):
+    it is dropped and the host resolved again, and new addresses get one more race.
+    """
+    host, port = address
+    host = host.strip("[]")
+    addrs = resolve_host(host, port)
+    try:
+        return _race_connect(host, port, addrs, timeout, source_address, socket_options)
+    except OSError:
+        if not _forget_host(host, port):
+            raise
+        fresh = resolve_host(host, port)
+        if fresh == addrs:
+            raise
+        return _race_connect(host, port, fresh, timeout, source_address, socket_options)
+
+
+def _race_connect(host: str, port: int, addrs: list, timeout, source_address, socket_options) -> socket.socket:
+    if not addrs:
+        raise OSError(f"getaddrinfo returned no addresses for {host}")
+    results: queue.Queue = queue.Queue()
+
+    def attempt(family, sockaddr):
+        try:
+            results.put((family, _connect_one(family, sockaddr, timeout, source_address, socket_options), None))
+        except OSError as e:
+            results.put((family, None, e))
+
+    pending, error = 0, None
+    for i, (family, sockaddr) in enumerate(addrs):
+        threading.Thread(target=attempt, args=(family, sockaddr), daemon=True, name="connect").start()
+        pending += 1
+        last = i == len(addrs) - 1
+        stagger_until = time.monotonic() + HAPPY_EYEBALLS_DELAY
+        while pending:
+            try:
+                won_family, sock, err = results.get(timeout=None if last else max(0.0, stagger_until - time.monotonic()))
+            except queue.Empty:
+                break  # this attempt is slow: start the next one alongside it
+            pending -= 1
+            if sock is not None:
+                if pending:
+                    threading.Thread(target=_close_losers, args=(results, pending), daemon=True).start()
+                _remember_family(host, port, won_family)
+                return sock
+            error = err
+            if not last:
+                break  # failed fast: don't wait out the stagger
+    raise error
+
+
+urllib3_cn.create_connection = create_connection
+
+
+# --- HTTP transport ---
+
+# Per-call-name transfer counters, filled in by _http_request and printed by --stats.
+TRANSFER_STATS: dict[str, dict] = {}
+_TRANSFER_LOCK = threading.Lock()
+
+
+def _record_transfer(call_name: str, sent: int, wire: int, decoded: int):
+    with _TRANSFER_LOCK:
+        stats = TRANSFER_STATS.setdefault(call_name, {"calls": 0, "sent": 0, "wire": 0, "decoded": 0})
+        stats["calls"] += 1
+        stats["sent"] += sent
+        stats["wire"] += wire
+        stats["decoded"] += decoded
+
+
+def _response_sizes(resp) -> tuple[int, int]:
+    """Return (wire_bytes, decoded_bytes) for a response opened with stream=True.
+
+    Reading resp.content pulls the body through urllib3's incremental gzip decoder,
+    so the compressed stream is never buffered whole. raw.tell() then reports how
+    many (still compressed) bytes actually came over the wire.
+    """
+    decoded = len(resp.content or b"")
+    try:
+        wire = int(resp.raw.tell())
+    except (AttributeError, TypeError, ValueError):
+        wire = decoded
+    return wire, decoded
+
+
+# Record/replay: when active, every _http_request is written to (or answered from)
+# a gzipped JSON-lines cassette, matched on call name + normalized request hash.
+_CASSETTE: dict = {"mode": "", "path": "", "latency": "recorded", "entries": {}}
+_CASSETTE_LOCK = threading.Lock()
+
+
+def _request_body(kwargs: dict) -> bytes:
+    """The body of a request as bytes, from data= or json= (keys sorted; same size requests sends)."""
+    data = kwargs.get("data")
+    if data is None and "json" in kwargs:
+        data = json.dumps(kwargs["json"], sort_keys=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")  # count bytes on the wire, not characters
+    return data if isinstance(data, bytes) else b""
+
+
+def _request_fingerprint(method: str, url: str, call_name: str, body: bytes) -> str:
+    """call_name:hash of the request with tokens, boundaries and timestamps normalized away."""
+    data = re.sub(rb"<eBayAuthToken>.*?</eBayAuthToken>", b"", body, flags=re.DOTALL)
+    data = re.sub(rb"BOUNDARY_[0-9a-f]{32}", b"BOUNDARY", data)
+    data = re.sub(rb"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z", b"TIMESTAMP", data)
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode())
+    digest.update(urllib.parse.urlsplit(url).path.encode())
+    digest.update(data)
+    return f"{call_name}:{digest.hexdigest()[:16]}"
+
+
+class _CassetteResponse:
+    """Minimal stand-in for requests.Response when replaying a recorded call."""
+
+    def __init__(self, entry: dict):
+        self.status_code = entry["status"]
+        self.headers = requests.structures.CaseInsensitiveDict(entry.get("headers", {}))
+        self.content = entry["body"].encode("utf-8")
+        self.text = entry["body"]
+        self.raw = type("_Raw", (), {"tell": lambda _self: entry.get("wire", len(self.content))})()
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size: int = 1, decode_unicode: bool = False):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def start_recording(path: str):
+    """Append every HTTP exchange made from now on to a cassette file."""
+    _CASSETTE.update(mode="record", path=path, entries={})
+
+
+def start_replay(path: str, latency: str = "recorded"):
+    """Answer HTTP calls from a cassette instead of the network.
+
+    latency is "recorded" (sleep for the original duration) or "zero".
+    """
+    entries: dict[str, collections.deque] = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            entries.setdefault(entry["key"], collections.deque()).append(entry)
+    _CASSETTE.update(mode="replay", path=path, latency=latency, entries=entries)
+
+
+def stop_cassette():
+    _CASSETTE.update(mode="", path="", entries={})
+
+
+def _replay(key: str) -> _CassetteResponse:
+    with _CASSETTE_LOCK:
+        queue = _CASSETTE["entries"].get(key)
+        if not queue:
+            raise EbayApiError(f"No recorded response for {key} in {_CASSETTE['path']}")
+        # Consume recorded responses in order; keep answering with the last one
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+    if _CASSETTE["latency"] == "recorded":
+        time.sleep(entry.get("elapsed", 0))
+    return _CassetteResponse(entry)
+
+
+_RECORDED_SECRETS = (
+    (re.compile(r'("(?:access_token|refresh_token)"\s*:\s*)"[^"]*"'), r'\1"REDACTED"'),
+    (re.compile(r"<eBayAuthToken>.*?</eBayAuthToken>", re.DOTALL), "<eBayAuthToken>REDACTED</eBayAuthToken>"),
+)
+
+
+def _redact_secrets(body: str) -> str:
+    """Blank out OAuth and Auth'n'Auth tokens so cassettes can be shared."""
+    for pattern, replacement in _RECORDED_SECRETS:
+        body = pattern.sub(replacement, body)
+    return body
+
+
+def _record(key: str, call_name: str, resp, elapsed: float, wire: int):
+    entry = {
+        "key": key,
+        "call": call_name,
+        "status": resp.status_code,
+        "headers": {"Content-Type": resp.headers.get("Content-Type", "")},
+        "body": _redact_secrets(resp.text),
+        "elapsed": round(elapsed, 4),
+        "wire": wire,
+    }
+    with _CASSETTE_LOCK:
+        with gzip.open(_CASSETTE["path"], "at", encoding="utf-8") as f:
+            f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+DEFAULT_TIMEOUT = 60  # seconds, for calls that don't set their own
+
+# --deadline: one wall-clock budget for the whole command. Every request timeout
+# is clipped to what's left, and concurrent work is cancelled when it runs out.
+_DEADLINE: dict = {"at": None, "seconds": 0}
+
+
+def set_deadline(seconds: float):
+    _DEADLINE.update(at=time.monotonic() + seconds, seconds=seconds)
+
+
+def clear_deadline():
+    _DEADLINE.update(at=None, seconds=0)
+
+
+def deadline_remaining() -> float | None:
+    """Seconds left in the command's budget, or None when no deadline is set."""
+    if _DEADLINE["at"] is None:
+        return None
+    return _DEADLINE["at"] - time.monotonic()
+
+
+def _request_timeout(call_name: str, requested: float | None) -> float:
+    timeout = requested or DEFAULT_TIMEOUT
+    remaining = deadline_remaining()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Deadline of {_DEADLINE['seconds']:g}s exceeded before {call_name}")
+    return min(timeout, remaining)
+
+
+# Circuit breakers: consecutive 5xx / connection failures per call name are kept in
+# STATE_DIR/breakers.json, so a dead endpoint (GetCategorySpecifics answering 503)
+# is skipped for a cool-down instead of timing out on every run. Breakers are scoped
+# by account and environment ("default/production", "shop2/sandbox"): a sandbox
+# outage must not short-circuit production calls, nor one account's the others'.
+BREAKER_THRESHOLD = 3
+BREAKER_COOLDOWN = 15 * 60
+_BREAKER_EXEMPT = {"ImageProbe", "Notification"}  # third-party / local hosts, not eBay endpoints
+_BREAKER_STATE: dict = {"path": "", "breakers": {}, "probing": set()}
+_BREAKER_LOCK = threading.Lock()
+
+
+def _breaker_path() -> str:
+    return os.path.join(STATE_DIR, "breakers.json")
+
+
+def _breaker_scope(url: str) -> str:
+    env = "sandbox" if ".sandbox." in urllib.parse.urlsplit(url).netloc else "production"
+    return f"{current_account() or 'default'}/{env}"
+
+
+def _breakers() -> dict:
+    """{scope: {call name: breaker}}, (re)loaded from disk when its path changes. Call with _BREAKER_LOCK held."""
+    path = _breaker_path()
+    if _BREAKER_STATE["path"] != path:
+        try:
+            with open(path) as f:
+                loaded = json.load(f)
+        except (OSError, ValueError):
+            loaded = {}
+        # Entries from before breakers were scoped (call name -> breaker) are dropped
+        breakers = {scope: table for scope, table in loaded.items() if "failures" not in table}
+        _BREAKER_STATE.update(path=path, breakers=breakers, probing=set())
+    return _BREAKER_STATE["breakers"]
+
+
+def _save_breakers():
+    path = _BREAKER_STATE["path"]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_BREAKER_STATE["breakers"], f, indent=2)
+    os.replace(tmp, path)
+
+
+def _breaker_check(call_name: str, scope: str):
+    """Raise instead of calling an endpoint whose breaker is open.
+
+    Once the cool-down has passed the breaker is half-open: one call goes through
+    as a probe while concurrent callers keep being short-circuited. The caller
+    must _breaker_release() the probe slot however the call ends.
+    """
+    with _BREAKER_LOCK:
+        breaker = _breakers().get(scope, {}).get(call_name)
+        if not breaker or breaker.get("opened_at") is None:
+            return
+        remaining = breaker["opened_at"] + BREAKER_COOLDOWN - time.time()
+        if remaining > 0:
+            raise EbayApiError(
+                f"{call_name} skipped: circuit open after {breaker['failures']} consecutive failures "
+                f"(retrying in {math.ceil(remaining / 60)} min, or run 'breakers --reset')"
+            )
+        if (scope, call_name) in _BREAKER_STATE["probing"]:
+            raise EbayApiError(f"{call_name} skipped: circuit half-open, probe in flight")
+        _BREAKER_STATE["probing"].add((scope, call_name))
+
+
+def _breaker_release(call_name: str, scope: str):
+    with _BREAKER_LOCK:
+        _BREAKER_STATE["probing"].discard((scope, call_name))
+
+
+def _breaker_result(call_name: str, scope: str, ok: bool):
+    with _BREAKER_LOCK:
+        breakers = _breakers()
+        table = breakers.get(scope, {})
+        breaker = table.get(call_name)
+        if ok:
+            if breaker:
+                if breaker.get("opened_at") is not None:
+                    print(f"Circuit for {call_name} closed again (probe succeeded).", file=sys.stderr)
+                del table[call_name]
+                if not table:
+                    del breakers[scope]
+                _save_breakers()
+            return
+        breaker = breakers.setdefault(scope, {}).setdefault(call_name, {"failures": 0, "opened_at": None, "trips": 0})
+        breaker["failures"] += 1
+        if breaker["opened_at"] is not None or breaker["failures"] >= BREAKER_THRESHOLD:
+            if breaker["opened_at"] is None:
+                breaker["trips"] += 1
+                print(
+                    f"Circuit breaker tripped for {call_name} after {breaker['failures']} consecutive failures; "
+                    f"skipping it for {BREAKER_COOLDOWN // 60} min.",
+                    file=sys.stderr,
+                )
+            breaker["opened_at"] = time.time()
+        _save_breakers()
+
+
+def reset_breakers(call_name: str = "") -> list[str]:
+    """Close one breaker (or all), in every scope. Returns the call names that were reset."""
+    reset = []
+    with _BREAKER_LOCK:
+        breakers = _breakers()
+        for scope, table in list(breakers.items()):
+            names = [call_name] if call_name else list(table)
+            reset += [n for n in names if table.pop(n, None) is not None]
+            if not table:
+                del breakers[scope]
+        if reset:
+            _save_breakers()
+    return sorted(set(reset))
+
+
+def breaker_status() -> list[dict]:
+    with _BREAKER_LOCK:
+        breakers = {scope: dict(table) for scope, table in _breakers().items()}
+    status = []
+    for scope, table in sorted(breakers.items()):
+        for name, b in sorted(table.items()):
+            if b.get("opened_at") is None:
+                state, remaining = "closed", 0
+            else:
+                remaining = max(0, b["opened_at"] + BREAKER_COOLDOWN - time.time())
+                state = "open" if remaining else "half-open"
+            status.append({"scope": scope, "call": name, "state": state, "failures": b["failures"],
+                           "trips": b["trips"], "retry_in": round(remaining)})
+    return status
+
+
+# Cumulative metrics: each run's request counters, latency histograms, bytes and
+# business events are merged into STATE_DIR/metrics.json on exit (see run()), and
+# can be written out as a Prometheus node-exporter textfile.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+_METRICS: dict = {"calls": {}, "events": {}}
+_METRICS_LOCK = threading.Lock()
+_RUN: dict = {"command": "", "account": "", "textfile": ""}
+
+
+def _empty_histogram() -> dict:
+    return {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0}
+
+
+def _observe(histogram: dict, seconds: float):
+    index = next((i for i, le in enumerate(LATENCY_BUCKETS) if seconds <= le), len(LATENCY_BUCKETS))
+    histogram["buckets"][index] += 1
+    histogram["sum"] += seconds
+    histogram["count"] += 1
+
+
+def _metric_request(call_name: str, status: str, seconds: float, sent: int = 0, received: int = 0):
+    key = f"{current_account()}|{call_name}"
+    with _METRICS_LOCK:
+        m = _METRICS["calls"].setdefault(key, {"status": {}, "latency": _empty_histogram(), "sent": 0, "received": 0})
+        m["status"][status] = m["status"].get(status, 0) + 1
+        _observe(m["latency"], seconds)
+        m["sent"] += sent
+        m["received"] += received
+
+
+def count_event(name: str, n: int = 1):
+    """Bump a business counter (listings_created, orders_shipped, ...) for this run."""
+    key = f"{current_account()}|{name}"
+    with _METRICS_LOCK:
+        _METRICS["events"][key] = _METRICS["events"].get(key, 0) + n
+
+
+def _metrics_path() -> str:
+    return os.path.join(STATE_DIR, "metrics.json")
+
+
+def load_metrics() -> dict:
+    try:
+        with open(_metrics_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"calls": {}, "commands": {}, "events": {}, "updated_at": 0}
+
+
+def _merge_histogram(into: dict, h: dict):
+    into["buckets"] = [a + b for a, b in zip(into["buckets"], h["buckets"])]
+    into["sum"] += h["sum"]
+    into["count"] += h["count"]
+
+
+@contextlib.contextmanager
+def _metrics_file_lock():
+    """Serialise read-merge-write of metrics.json between concurrent runs (cron, agents)."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    with open(os.path.join(STATE_DIR, "metrics.lock"), "w") as lock:
+        try:
+            import fcntl
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        except ImportError:
+            pass  # no advisory locks on this platform; last writer wins
+        yield
+
+
+def flush_metrics(command: str = "", account: str = "", ok: bool = True, seconds: float = 0.0) -> dict:
+    """Merge this run's metrics (plus one command run, if named) into the store. Returns the store."""
+    with _METRICS_LOCK:
+        calls, events = _METRICS["calls"], _METRICS["events"]
+        _METRICS.update(calls={}, events={})
+    with _metrics_file_lock():
+        store = load_metrics()
+        for key, m in calls.items():
+            s = store["calls"].setdefault(key, {"status": {}, "latency": _empty_histogram(), "sent": 0, "received": 0})
+            for status, n in m["status"].items():
+                s["status"][status] = s["status"].get(status, 0) + n
+            _merge_histogram(s["latency"], m["latency"])
+            s["sent"] += m["sent"]
+            s["received"] += m["received"]
+        for key, n in events.items():
+            store["events"][key] = store["events"].get(key, 0) + n
+        if command:
+            c = store["commands"].setdefault(f"{account}|{command}", {"ok": 0, "error": 0, "duration": _empty_histogram()})
+            c["ok" if ok else "error"] += 1
+            _observe(c["duration"], seconds)
+        store["updated_at"] = time.time()
+        tmp = f"{_metrics_path()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(store, f)
+        os.replace(tmp, _metrics_path())
+    return store
+
+
+def _prom_labels(**labels) -> str:
+    def esc(v: str) -> str:
+        return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels.items()) + "}"
+
+
+def _prom_histogram(lines: list, name: str, h: dict, labels: dict):
+    cumulative = 0
+    for le, n in zip([*map(str, LATENCY_BUCKETS), "+Inf"], h["buckets"]):
+        cumulative += n
+        lines.append(f"{name}_bucket{_prom_labels(**labels, le=le)} {cumulative}")
+    lines.append(f"{name}_sum{_prom_labels(**labels)} {h['sum']:.6f}")
+    lines.append(f"{name}_count{_prom_labels(**labels)} {h['count']}")
+
+
+def format_prometheus(store: dict) -> str:
+    """Render the metrics store in Prometheus text exposition format."""
+    def split(key: str) -> tuple[str, str]:
+        account, name = key.split("|", 1)
+        return account or "default", name
+
+    lines = [
+        "# HELP ebay_api_requests_total eBay API requests by call name and HTTP status (error = no response).",
+        "# TYPE ebay_api_requests_total counter",
+    ]
+    calls = sorted(store["calls"].items())
+    for key, m in calls:
+        account, call = split(key)
+        for status, n in sorted(m["status"].items()):
+            lines.append(f"ebay_api_requests_total{_prom_labels(account=account, call=call, status=status)} {n}")
+    lines += ["# HELP ebay_api_request_duration_seconds eBay API request latency.",
+              "# TYPE ebay_api_request_duration_seconds histogram"]
+    for key, m in calls:
+        account, call = split(key)
+        _prom_histogram(lines, "ebay_api_request_duration_seconds", m["latency"], {"account": account, "call": call})
+    for metric, field, help_text in (("ebay_api_sent_bytes_total", "sent", "Request bytes sent."),
+                                     ("ebay_api_received_bytes_total", "received", "Response bytes received on the wire.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for key, m in calls:
+            account, call = split(key)
+            lines.append(f"{metric}{_prom_labels(account=account, call=call)} {m[field]}")
+    lines += ["# HELP ebay_command_runs_total ebay_list.py invocations by command and outcome.",
+              "# TYPE ebay_command_runs_total counter"]
+    commands = sorted(store["commands"].items())
+    for key, c in commands:
+        account, command = split(key)
+        for outcome in ("ok", "error"):
+            lines.append(f"ebay_command_runs_total{_prom_labels(account=account, command=command, outcome=outcome)} {c[outcome]}")
+    lines += ["# HELP ebay_command_duration_seconds ebay_list.py wall-clock time per command.",
+              "# TYPE ebay_command_duration_seconds histogram"]
+    for key, c in commands:
+        account, command = split(key)
+        _prom_histogram(lines, "ebay_command_duration_seconds", c["duration"], {"account": account, "command": command})
+    lines += ["# HELP ebay_events_total Listings created, revised, ended, orders shipped, offers answered, ...",
+              "# TYPE ebay_events_total counter"]
+    for key, n in sorted(store["events"].items()):
+        account, event = split(key)
+        lines.append(f"ebay_events_total{_prom_labels(account=account, event=event)} {n}")
+    lines += ["# HELP ebay_metrics_updated_timestamp_seconds When the metrics store was last updated.",
+              "# TYPE ebay_metrics_updated_timestamp_seconds gauge",
+              f"ebay_metrics_updated_timestamp_seconds {store.get('updated_at', 0):.0f}"]
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: str, store: dict | None = None):
+    """Write atomically, as node-exporter's textfile collector requires."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(format_prometheus(store or load_metrics()))
+    os.replace(tmp, path)
+
+
+# --profile DIR: the command runs under cProfile and tracemalloc, while a sampler
+# thread collects stacks from every thread for a flamegraph. Time spent waiting on
+# the network or the rate limiter is tallied separately so it isn't mistaken for CPU.
+PROFILE_SAMPLE_INTERVAL = 0.005
+PROFILE_TOP_N = 25
+_PROFILE: dict = {"dir": "", "command": "", "profiler": None, "workers": [], "stacks": None,
+                  "sampler": None, "stop": None, "waits": {}, "wall": 0.0, "cpu": 0.0}
+_PROFILE_LOCK = threading.Lock()
+
+
+def _profile_wait(kind: str, seconds: float):
+    if _PROFILE["profiler"] is not None:
+        with _PROFILE_LOCK:
+            _PROFILE["waits"][kind] = _PROFILE["waits"].get(kind, 0.0) + seconds
+
+
+def _profiled_task(fn):
+    """Wrap a pool task so its CPU time shows up in the pstats output too."""
+    if _PROFILE["profiler"] is None:
+        return fn
+
+    def task(item):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return fn(item)  # interpreter-wide profiler (3.12+) already sees this thread
+        try:
+            return fn(item)
+        finally:
+            profiler.disable()
+            with _PROFILE_LOCK:
+                _PROFILE["workers"].append(profiler)
+
+    return task
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def _sample_stacks(stop: threading.Event, stacks: collections.Counter):
+    me = threading.get_ident()
+    names = {}
+    while not stop.wait(PROFILE_SAMPLE_INTERVAL):
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = _collapse(frame)
+            if "ebay_list.py:" not in stack:
+                continue  # idle pool worker
+            if ident not in names:
+                names = {t.ident: t.name for t in threading.enumerate()}
+            stacks[f"{names.get(ident, ident)};{stack}"] += 1
+
+
+def start_profiling(directory: str, command: str):
+    os.makedirs(directory, exist_ok=True)
+    tracemalloc.start()
+    stop, stacks = threading.Event(), collections.Counter()
+    sampler = threading.Thread(target=_sample_stacks, args=(stop, stacks), name="profile-sampler", daemon=True)
+    profiler = cProfile.Profile()
+    _PROFILE.update(dir=directory, command=command, profiler=profiler, workers=[], stacks=stacks,
+                    sampler=sampler, stop=stop, waits={}, wall=time.monotonic(), cpu=time.process_time())
+    sampler.start()
+    profiler.enable()
+
+
+def stop_profiling() -> dict:
+    """Write <command>-<timestamp>.pstats/.collapsed/.alloc.txt and print a summary. Idempotent."""
+    profiler = _PROFILE["profiler"]
+    if profiler is None:
+        return {}
+    profiler.disable()
+    _PROFILE["profiler"] = None
+    wall = time.monotonic() - _PROFILE["wall"]
+    cpu = time.process_time() - _PROFILE["cpu"]
+    _PROFILE["stop"].set()
+    _PROFILE["sampler"].join()
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stem = os.path.join(_PROFILE["dir"], f"{_PROFILE['command']}-{time.strftime('%Y%m%d-%H%M%S')}")
+    stats = pstats.Stats(profiler)
+    for worker in _PROFILE["workers"]:
+        stats.add(worker)
+    stats.dump_stats(f"{stem}.pstats")
+    with open(f"{stem}.collapsed", "w") as f:
+        for stack, count in _PROFILE["stacks"].most_common():
+            f.write(f"{stack} {count}\n")
+    top = snapshot.statistics("lineno")[:PROFILE_TOP_N]
+    with open(f"{stem}.alloc.txt", "w") as f:
+        f.write(f"Peak traced memory: {_format_bytes(peak)} (still allocated at exit: {_format_bytes(current)})\n\n")
+        for i, stat in enumerate(top, 1):
+            frame = stat.traceback[0]
+            f.write(f"{i:>3}. {frame.filename}:{frame.lineno}  {_format_bytes(stat.size)} in {stat.count} blocks\n")
+
+    summary = {
+        "wall": wall,
+        "cpu": cpu,
+        "network": _PROFILE["waits"].get("network", 0.0),
+        "rate_limit": _PROFILE["waits"].get("rate_limit", 0.0),
+        "peak": peak,
+        "files": [f"{stem}.pstats", f"{stem}.collapsed", f"{stem}.alloc.txt"],
+    }
+    print(f"\nProfile: wall {wall:.2f}s, CPU {cpu:.2f}s, network wait {summary['network']:.2f}s, "
+          f"rate-limit wait {summary['rate_limit']:.2f}s, peak memory {_format_bytes(peak)}", file=sys.stderr)
+    print("  (network/rate-limit waits add up across threads, so they can exceed wall time)", file=sys.stderr)
+    for path in summary["files"]:
+        print(f"  {path}", file=sys.stderr)
+    return summary
+
+
+# --hedge: for read-only calls, if the first attempt hasn't answered within that
+# call's observed p95 latency, a duplicate is sent and whichever answers first wins.
+# Latency samples are kept in STATE_DIR/latencies.json between runs (see run()), so
+# a command that makes a call only once or twice can still hedge it.
+HEDGE_SAFE_CALLS = frozenset({
+    "GetItem", "GetCategories", "GetCategoryFeatures", "GetCategorySpecifics", "GeteBayDetails",
+    "GetMyeBaySelling", "GetMyMessages", "GetSellerTransactions", "GetBestOffers", "GetUserPreferences",
+})
+HEDGE_MIN_SAMPLES = 20  # no hedging until a call's p95 is known
+HEDGE_MAX_FRACTION = 0.1  # at most this share of a call's requests get a duplicate
+HEDGE_MIN_DELAY = 0.05
+LATENCY_WINDOW = 200
+_HEDGE: dict = {"enabled": False, "pool": None}
+HEDGE_STATS: dict[str, dict] = {}
+_LATENCIES: dict[str, collections.deque] = {}
+_LATENCY_STATE = {"loaded": False, "dirty": False}
+_HEDGE_LOCK = threading.Lock()
+
+
+def enable_hedging(enabled: bool = True):
+    _HEDGE["enabled"] = enabled
+
+
+def _latencies_path() -> str:
+    return os.path.join(STATE_DIR, "latencies.json")
+
+
+def _load_latencies():
+    """Seed the sample windows from earlier runs (once per process). Caller holds _HEDGE_LOCK."""
+    if _LATENCY_STATE["loaded"]:
+        return
+    _LATENCY_STATE["loaded"] = True
+    try:
+        with open(_latencies_path()) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return
+    for call_name, samples in saved.items():
+        window = collections.deque(samples, maxlen=LATENCY_WINDOW)
+        window.extend(_LATENCIES.get(call_name, ()))
+        _LATENCIES[call_name] = window
+
+
+def save_latencies():
+    """Persist the per-call sample windows if this run added any."""
+    with _HEDGE_LOCK:
+        if not _LATENCY_STATE["dirty"]:
+            return
+        _load_latencies()
+        data = {name: [round(x, 4) for x in window] for name, window in _LATENCIES.items()}
+        _LATENCY_STATE["dirty"] = False
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp = f"{_latencies_path()}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, _latencies_path())
+
+
+def _observe_latency(call_name: str, seconds: float):
+    with _HEDGE_LOCK:
+        _LATENCIES.setdefault(call_name, collections.deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        _LATENCY_STATE["dirty"] = True
+
+
+def _hedge_delay(call_name: str) -> float | None:
+    """How long to wait before hedging this call, or None if it must not be hedged."""
+    if not _HEDGE["enabled"] or call_name not in HEDGE_SAFE_CALLS:
+        return None
+    with _HEDGE_LOCK:
+        _load_latencies()
+        samples = sorted(_LATENCIES.get(call_name, ()))
+        HEDGE_STATS.setdefault(call_name, {"calls": 0, "hedged": 0, "won": 0})["calls"] += 1
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_DELAY, _percentile(samples, 95))
+
+
+def _claim_hedge(call_name: str) -> bool:
+    with _HEDGE_LOCK:
+        stats = HEDGE_STATS[call_name]
+        if stats["hedged"] + 1 > stats["calls"] * HEDGE_MAX_FRACTION:
+            return False
+        stats["hedged"] += 1
+        return True
+
+
+def _open(client, method: str, url: str, headers: dict, kwargs: dict):
+    """Send a request and return once the headers are in; the body is left unread."""
+    return getattr(client, method.lower())(url, headers=headers, stream=True, **kwargs)
+
+
+def _send(client, method: str, url: str, headers: dict, kwargs: dict, read: bool = True):
+    """Make one request and read its body. Returns (response, wire bytes, decoded bytes).
+
+    With read=False the body is left for the caller and both sizes are 0.
+    """
+    started = time.monotonic()
+    try:
+        resp = _open(client, method, url, headers, kwargs)
+        wire, decoded = _response_sizes(resp) if read else (0, 0)
+    finally:
+        _profile_wait("network", time.monotonic() - started)
+    return resp, wire, decoded
+
+
+def _discard_loser(future):
+    # Closing before the body is read drops the connection instead of downloading the duplicate
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _hedged_send(call_name: str, delay: float, limiter: RateLimiter, client, method: str, url: str,
+                 headers: dict, kwargs: dict):
+    """_send, plus one duplicate if the first attempt is slower than `delay`.
+
+    The first response to arrive wins and only its body is read; the other is
+    closed unread.
+    """
+    with _HEDGE_LOCK:
+        if _HEDGE["pool"] is None:
+            _HEDGE["pool"] = ThreadPoolExecutor(max_workers=MAX_WORKERS * 4, thread_name_prefix="hedge")
+        pool = _HEDGE["pool"]
+    started = time.monotonic()
+    try:
+        resp = _first_response(call_name, delay, limiter, pool, client, method, url, headers, kwargs)
+        wire, decoded = _response_sizes(resp)
+    finally:
+        _profile_wait("network", time.monotonic() - started)
+    return resp, wire, decoded
+
+
+def _first_response(call_name: str, delay: float, limiter: RateLimiter, pool: ThreadPoolExecutor, client,
+                    method: str, url: str, headers: dict, kwargs: dict):
+    primary = pool.submit(_open, client, method, url, headers, kwargs)
+    try:
+        return primary.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    # The duplicate must fit the rate budget right now and the hedge cap
+    if not limiter.try_acquire() or not _claim_hedge(call_name):
+        return primary.result()
+    backup = pool.submit(_open, client, method, url, headers, kwargs)
+    pending = {primary, backup}
+    error = None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is not None:
+                error = future.exception()
+                continue
+            if future is backup:
+                with _HEDGE_LOCK:
+                    HEDGE_STATS[call_name]["won"] += 1
+            for other in pending:
+                other.add_done_callback(_discard_loser)
+            return future.result()
+    raise error
+
+
+def print_hedge_stats():
+    hedged = {name: st for name, st in HEDGE_STATS.items() if st["calls"]}
+    if not hedged:
+        return
+    print("\nHedged requests:", file=sys.stderr)
+    print(f"  {'Call':<28} {'Calls':>5} {'Hedged':>7} {'Won':>5} {'p95':>8}", file=sys.stderr)
+    for call_name, st in sorted(hedged.items()):
+        samples = sorted(_LATENCIES.get(call_name, ()))
+        p95 = f"{_percentile(samples, 95):.2f}s" if samples else "-"
+        print(f"  {call_name:<28} {st['calls']:>5} {st['hedged']:>7} {st['won']:>5} {p95:>8}", file=sys.stderr)
+
+
+def _http_request(method: str, url: str, call_name: str, **kwargs):
+    """Single choke point for outbound HTTP calls.
+
+    Negotiates gzip, streams the body and records per-call transfer sizes. Calls go
+    through the current account's session and rate budget, or a cassette when
+    recording/replaying. Endpoints that keep failing are short-circuited by a
+    per-call-name circuit breaker. Every call gets a timeout, clipped to what's
+    left of the --deadline budget. With --hedge, slow read-only calls are hedged.
+    stream=True returns before the body is read, for the caller to consume with
+    iter_content() and close(); those calls are never hedged and their body is not
+    counted in the transfer stats.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers.setdefault("Accept-Encoding", "gzip")
+    body = _request_body(kwargs)
+    sent = len(body)
+
+    mode = _CASSETTE["mode"]
+    stream = kwargs.pop("stream", False) and not mode  # cassettes store the body, so it is read
+    key = _request_fingerprint(method, url, call_name, body) if mode else ""
+    kwargs["timeout"] = _request_timeout(call_name, kwargs.get("timeout"))
+    if mode == "replay":
+        started = time.monotonic()
+        resp = _replay(key)
+        wire, decoded = _response_sizes(resp)
+        _record_transfer(call_name, sent, wire, decoded)
+        _metric_request(call_name, str(resp.status_code), time.monotonic() - started, sent, wire)
+        return resp
+
+    guarded = call_name not in _BREAKER_EXEMPT
+    scope = _breaker_scope(url) if guarded else ""
+    if guarded:
+        _breaker_check(call_name, scope)
+    try:
+        runtime = _account_runtime()
+        runtime["limiter"].acquire()
+        kwargs["timeout"] = _request_timeout(call_name, kwargs["timeout"])  # the limiter may have waited
+        client = runtime["session"] or requests
+        started = time.monotonic()
+        delay = _hedge_delay(call_name) if not mode and not stream else None
+        try:
+            if delay is None:
+                resp, wire, decoded = _send(client, method, url, headers, kwargs, read=not stream)
+            else:
+                resp, wire, decoded = _hedged_send(call_name, delay, runtime["limiter"], client, method, url, headers, kwargs)
+        except requests.RequestException as e:
+            _metric_request(call_name, "error", time.monotonic() - started, sent)
+            remaining = deadline_remaining()
+            if isinstance(e, requests.Timeout) and remaining is not None and remaining <= 0.05:
+                # Our budget ran out, not the endpoint: don't count it against the breaker
+                raise DeadlineExceeded(f"Deadline of {_DEADLINE['seconds']:g}s exceeded during {call_name}") from e
+            if guarded:
+                _breaker_result(call_name, scope, False)
+            raise
+        if guarded:
+            _breaker_result(call_name, scope, resp.status_code < 500)
+    finally:
+        if guarded:  # a half-open probe that never got an answer (deadline, rate-limit wait) frees its slot
+            _breaker_release(call_name, scope)
+    elapsed = time.monotonic() - started
+    _observe_latency(call_name, elapsed)
+    _record_transfer(call_name, sent, wire, decoded)
+    _metric_request(call_name, str(resp.status_code), elapsed, sent, wire)
+    if mode == "record":
+        _record(key, call_name, resp, time.monotonic() - started, wire)
+    return resp
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def print_transfer_stats():
+    """Print bytes on the wire vs decoded size for every call made in this run."""
+    if not TRANSFER_STATS:
+        return
+    print("\nTransfer stats:", file=sys.stderr)
+    print(f"  {'Call':<28} {'Calls':>5} {'Sent':>10} {'Wire':>10} {'Decoded':>10} {'Saved':>6}", file=sys.stderr)
+    for call_name, st in sorted(TRANSFER_STATS.items()):
+        saved = 100 * (1 - st["wire"] / st["decoded"]) if st["decoded"] else 0
+        print(
+            f"  {call_name:<28} {st['calls']:>5} {_format_bytes(st['sent']):>10} "
+            f"{_format_bytes(st['wire']):>10} {_format_bytes(st['decoded']):>10} {saved:>5.0f}%",
+            file=sys.stderr,
+        )
+
+
+def _trading_headers(call_name: str, site_id: str) -> dict:
+    return {
         "X-EBAY-API-COMPATIBILITY-LEVEL": TRADING_API_VERSION,
         "X-EBAY-API-CALL-NAME": call_name,
         "X-EBAY-API-SITEID": site_id,
         "Content-Type": "text/xml",
     }
 
-    xml_request = f"""<?xml version="1.0" encoding="utf-8"?>
+
+def _trading_envelope(call_name: str, xml_body: str, auth_token: str) -> bytes:
+    return f"""<?xml version="1.0" encoding="utf-8"?>
 <{call_name}Request xmlns="urn:ebay:apis:eBLBaseComponents">
   <RequesterCredentials>
     <eBayAuthToken>{auth_token}</eBayAuthToken>
   </RequesterCredentials>
   {xml_body}
-</{call_name}Request>"""
+</{call_name}Request>""".encode("utf-8")
 
-    resp = requests.post(url, headers=headers, data=xml_request.encode("utf-8"))
+
+def trading_api_call(
+    call_name: str,
+    xml_body: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> str:
+    url = TRADING_API_SANDBOX if sandbox else TRADING_API_PRODUCTION
+    resp = _http_request(
+        "POST", url, call_name,
+        headers=_trading_headers(call_name, site_id),
+        data=_trading_envelope(call_name, xml_body, auth_token),
+    )
     if resp.status_code != 200:
         raise EbayApiError(f"Trading API error: {resp.status_code}\n{resp.text}")
     return resp.text
@@ -487,6 +1804,11 @@ def _extract_xml_value(xml_text: str, tag: str) -> str:
     return match.group(1) if match else ""
 
 
+def _xml_float(xml_text: str, tag: str) -> float | None:
+    match = re.search(f"<{tag}[^>]*>([\\d.]+)</{tag}>", xml_text)
+    return float(match.group(1)) if match else None
+
+
 def upload_picture(
     file_path: str,
     auth_token: str,
@@ -542,7 +1864,9 @@ def upload_picture(
     last_err = None
     for attempt in range(3):
         try:
-            resp = requests.post(url, headers=upload_headers, data=body, timeout=60)
+            resp = _http_request(
+                "POST", url, "UploadSiteHostedPictures", headers=upload_headers, data=body, timeout=60
+            )
             break
         except (requests.ConnectionError, requests.Timeout) as e:
             last_err = e
@@ -562,32 +1886,121 @@ def upload_picture(
         raise EbayApiError(f"Image upload failed: {error}")
 
     hosted_url = _extract_xml_value(resp.text, "FullURL")
+    count_event("images_uploaded")
     print(f"Uploaded: {os.path.basename(file_path)} -> {hosted_url}")
     return hosted_url
 
 
+IMAGE_PROBE_TTL = 24 * 3600
+MAX_IMAGE_BYTES = 12 * 1024 * 1024  # EPS rejects pictures over 12 MB
+
+
+def probe_image_url(url: str, timeout: float = 10) -> dict:
+    """Check a remote image with HEAD (or a 1-byte range GET if HEAD isn't supported).
+
+    Returns {"url", "ok", "status", "content_type", "size", "error"}. Good results
+    are cached for IMAGE_PROBE_TTL so repeat listings don't re-probe.
+    """
+    cached = _cache_get("image_probes", url, IMAGE_PROBE_TTL)
+    if cached is not None:
+        return cached
+
+    result = {"url": url, "ok": False, "status": 0, "content_type": "", "size": None, "error": ""}
+    try:
+        resp = _http_request("HEAD", url, "ImageProbe", timeout=timeout, allow_redirects=True)
+        if resp.status_code in (403, 405, 501) or not resp.headers.get("Content-Type"):
+            resp = _http_request("GET", url, "ImageProbe", headers={"Range": "bytes=0-0"}, timeout=timeout)
+    except requests.RequestException as e:
+        result["error"] = f"unreachable ({e.__class__.__name__})"
+        return result
+
+    result["status"] = resp.status_code
+    result["content_type"] = resp.headers.get("Content-Type", "").split(";")[0].strip()
+    content_range = resp.headers.get("Content-Range", "")
+    if "/" in content_range and content_range.rsplit("/", 1)[1].isdigit():
+        result["size"] = int(content_range.rsplit("/", 1)[1])
+    elif resp.status_code == 200 and resp.headers.get("Content-Length", "").isdigit():
+        result["size"] = int(resp.headers["Content-Length"])
+
+    if resp.status_code not in (200, 206):
+        result["error"] = f"HTTP {resp.status_code}"
+    elif not result["content_type"].startswith("image/"):
+        result["error"] = f"not an image ({result['content_type'] or 'no content type'})"
+    elif result["size"] is not None and result["size"] > MAX_IMAGE_BYTES:
+        result["error"] = f"too large ({_format_bytes(result['size'])}, max {_format_bytes(MAX_IMAGE_BYTES)})"
+    else:
+        result["ok"] = True
+        _cache_put("image_probes", url, result)
+    return result
+
+
+def probe_image_urls(urls: list[str]) -> list[dict]:
+    """Probe remote image URLs concurrently. Results are in input order."""
+    return _run_concurrently(probe_image_url, urls, max_workers=8)
+
+
+def upload_external_picture(
+    image_url: str,
+    auth_token: str,
+    sandbox: bool = False,
+) -> str:
+    """Have eBay fetch a publicly hosted image itself (ExternalPictureURL). Returns the EPS URL."""
+    body = f"""
+  <ExternalPictureURL>{_escape_xml(image_url)}</ExternalPictureURL>
+  <PictureSet>Supersize</PictureSet>"""
+    result = trading_api_call("UploadSiteHostedPictures", body, auth_token, sandbox)
+    ack = _extract_xml_value(result, "Ack")
+    if ack not in ("Success", "Warning"):
+        error = _extract_xml_value(result, "LongMessage") or _extract_xml_value(result, "ShortMessage")
+        raise EbayApiError(f"External picture upload failed for {image_url}: {error}")
+    hosted_url = _extract_xml_value(result, "FullURL")
+    count_event("images_uploaded")
+    print(f"Hosted: {image_url} -> {hosted_url}")
+    return hosted_url
+
+
+PICTURE_MODES = ["passthrough", "external"]
+
+
 def resolve_images(
     image_args: list[str],
     auth_token: str = "",
     sandbox: bool = False,
+    probe_remote: bool = False,
+    picture_mode: str = "passthrough",
 ) -> list[str]:
-    """Resolve image arguments: upload local files, pass through URLs."""
-    urls = []
+    """Resolve image arguments: upload local files, pass through URLs.
+
+    With probe_remote, every http(s) URL is checked first so a dead link fails
+    before any upload starts. picture_mode="external" has eBay copy remote URLs
+    onto its own picture servers instead of linking to them. Uploads run
+    concurrently; the result keeps the input order.
+    """
+    remote = [img for img in image_args if img.startswith(("http://", "https://"))]
     for img in image_args:
-        if img.startswith("http://") or img.startswith("https://"):
-            urls.append(img)
-        elif os.path.isfile(img):
-            if not auth_token:
-                raise EbayApiError("Local image upload requires Auth'n'Auth (EBAY_AUTH_TOKEN).")
-            hosted_url = upload_picture(img, auth_token, sandbox)
-            urls.append(hosted_url)
-        else:
+        if img not in remote and not os.path.isfile(img):
             raise EbayApiError(f"Image not found: {img}")
-    return urls
+    if (len(remote) < len(image_args) or picture_mode == "external") and not auth_token:
+        raise EbayApiError("Local image upload requires Auth'n'Auth (EBAY_AUTH_TOKEN).")
 
+    if probe_remote:
+        bad = [r for r in probe_image_urls(remote) if not r["ok"]]
+        if bad:
+            lines = "\n".join(f"  {r['url']}: {r['error']}" for r in bad)
+            raise EbayApiError(f"{len(bad)} image URL(s) failed pre-flight checks:\n{lines}")
 
-def _trading_api_call_safe(
-    call_name: str,
+    def resolve(img: str) -> str:
+        if img in remote:
+            if picture_mode == "external":
+                return upload_external_picture(img, auth_token, sandbox)
+            return img
+        return upload_picture(img, auth_token, sandbox)
+
+    return _run_concurrently(resolve, image_args)
+
+
+def _trading_api_call_safe(
+    call_name: str,
     xml_body: str,
     auth_token: str,
     sandbox: bool = False,
@@ -595,22 +2008,13 @@ def _trading_api_call_safe(
 ) -> str | None:
     """Like trading_api_call but returns None on failure instead of sys.exit."""
     url = TRADING_API_SANDBOX if sandbox else TRADING_API_PRODUCTION
-    headers = {
-        "X-EBAY-API-COMPATIBILITY-LEVEL": TRADING_API_VERSION,
-        "X-EBAY-API-CALL-NAME": call_name,
-        "X-EBAY-API-SITEID": site_id,
-        "Content-Type": "text/xml",
-    }
-    xml_request = f"""<?xml version="1.0" encoding="utf-8"?>
-<{call_name}Request xmlns="urn:ebay:apis:eBLBaseComponents">
-  <RequesterCredentials>
-    <eBayAuthToken>{auth_token}</eBayAuthToken>
-  </RequesterCredentials>
-  {xml_body}
-</{call_name}Request>"""
-
     try:
-        resp = requests.post(url, headers=headers, data=xml_request.encode("utf-8"), timeout=30)
+        resp = _http_request(
+            "POST", url, call_name,
+            headers=_trading_headers(call_name, site_id),
+            data=_trading_envelope(call_name, xml_body, auth_token),
+            timeout=30,
+        )
         if resp.status_code != 200:
             return None
         return resp.text
@@ -732,6 +2136,171 @@ def suggest_category(title: str) -> list[dict]:
     return results
 
 
+# --- Offline category classifier ---
+
+# Character n-gram naive Bayes trained on our own title -> category history.
+CLASSIFIER_NGRAMS = (3, 4, 5)
+CLASSIFIER_ALPHA = 0.1
+CLASSIFIER_MIN_CONFIDENCE = 0.6
+_MODEL_CACHE: dict = {}
+
+
+def _title_ngrams(title: str) -> dict[str, int]:
+    text = " " + re.sub(r"[^a-z0-9]+", " ", title.lower()).strip() + " "
+    counts: dict[str, int] = {}
+    for n in CLASSIFIER_NGRAMS:
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+
+def train_category_model(examples: list[tuple[str, str]], names: dict | None = None) -> dict:
+    """Train a multinomial naive Bayes model from (title, category_id) pairs.
+
+    The model is stored as an inverted index (n-gram -> [[class, weight], ...]) so
+    prediction only touches classes that share an n-gram with the title.
+    """
+    names = names or {}
+    class_counts: dict[str, int] = {}
+    feature_counts: dict[str, dict[str, int]] = {}
+    for title, cat_id in examples:
+        if not title or not cat_id:
+            continue
+        class_counts[cat_id] = class_counts.get(cat_id, 0) + 1
+        fc = feature_counts.setdefault(cat_id, {})
+        for gram, n in _title_ngrams(title).items():
+            fc[gram] = fc.get(gram, 0) + n
+
+    classes = sorted(class_counts)
+    vocab = {gram for fc in feature_counts.values() for gram in fc}
+    total_docs = sum(class_counts.values())
+    priors, norms = [], []
+    postings: dict[str, list] = {}
+    for ci, cat_id in enumerate(classes):
+        fc = feature_counts[cat_id]
+        priors.append(round(math.log(class_counts[cat_id] / total_docs), 5))
+        # log(alpha / (total + alpha * |V|)) is the score of an unseen-in-class n-gram;
+        # seen n-grams add log(1 + count / alpha) on top of it.
+        norms.append(round(math.log(CLASSIFIER_ALPHA / (sum(fc.values()) + CLASSIFIER_ALPHA * len(vocab))), 5))
+        for gram, count in fc.items():
+            postings.setdefault(gram, []).append([ci, round(math.log(1 + count / CLASSIFIER_ALPHA), 4)])
+
+    return {
+        "version": 1,
+        "classes": classes,
+        "names": {c: names.get(c) or CATEGORY_KEYWORDS.get(c, "") for c in classes},
+        "priors": priors,
+        "norms": norms,
+        "postings": postings,
+        "examples": total_docs,
+    }
+
+
+def save_category_model(model: dict, path: str = ""):
+    path = path or _state_path("category_model.json.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(model, f, separators=(",", ":"))
+    _MODEL_CACHE.clear()
+
+
+def load_category_model(path: str = "") -> dict | None:
+    """Load the trained model, cached in-process. Returns None if no model has been trained."""
+    path = path or os.path.join(_state_dir(), "category_model.json.gz")
+    if not os.path.exists(path):
+        return None
+    mtime = os.path.getmtime(path)
+    cached = _MODEL_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        model = json.load(f)
+    _MODEL_CACHE[path] = (mtime, model)
+    return model
+
+
+def predict_category(model: dict, title: str, k: int = 5) -> list[dict]:
+    """Top-k categories for a title with softmax confidence, best first."""
+    postings = model["postings"]
+    scores = list(model["priors"])
+    known = 0
+    touched = [0.0] * len(scores)
+    for gram, n in _title_ngrams(title).items():
+        plist = postings.get(gram)
+        if plist is None:
+            continue
+        known += n
+        for ci, weight in plist:
+            touched[ci] += n * weight
+    if not known:
+        return []
+    for ci, norm in enumerate(model["norms"]):
+        scores[ci] += known * norm + touched[ci]
+
+    top = max(scores)
+    total = sum(math.exp(sc - top) for sc in scores)
+    ranked = sorted(range(len(scores)), key=lambda ci: -scores[ci])[:k]
+    return [
+        {
+            "id": model["classes"][ci],
+            "name": model["names"].get(model["classes"][ci], ""),
+            "confidence": round(math.exp(scores[ci] - top) / total, 4),
+        }
+        for ci in ranked
+    ]
+
+
+def load_training_examples(csv_path: str = "") -> tuple[list[tuple[str, str]], dict]:
+    """Collect (title, category_id) pairs from the sales warehouse and an optional CSV.
+
+    The CSV needs title and category_id columns; a category_name column is optional.
+    """
+    examples = []
+    names = {}
+    conn = open_sales_store()
+    for row in conn.execute("SELECT title, category_id FROM sales WHERE title != '' AND category_id != ''"):
+        examples.append((row["title"], row["category_id"]))
+    if csv_path:
+        with open(csv_path, newline="") as f:
+            for row in csv.DictReader(f):
+                examples.append((row["title"], row["category_id"]))
+                if row.get("category_name"):
+                    names[row["category_id"]] = row["category_name"]
+    return examples, names
+
+
+def _auto_select_category(
+    title: str,
+    auth_token: str = "",
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> str:
+    """Pick a category for a title: trained model first, live lookup if it's unsure, then keywords."""
+    model = load_category_model()
+    if model:
+        predictions = predict_category(model, title)
+        if predictions and predictions[0]["confidence"] >= CLASSIFIER_MIN_CONFIDENCE:
+            best = predictions[0]
+            print(f"  Auto-selected: {best['name'] or best['id']} ({best['id']}, {best['confidence']:.0%} confidence)")
+            return best["id"]
+        if auth_token:
+            print("  Classifier unsure — checking eBay categories...")
+            leaves = [c for c in find_categories_online(title, auth_token, sandbox, site_id) if c["leaf"]]
+            if leaves:
+                print(f"  Auto-selected: {leaves[0]['name']} ({leaves[0]['id']})")
+                return leaves[0]["id"]
+
+    suggestions = suggest_category(title)
+    if suggestions:
+        print(f"  Auto-selected: {suggestions[0]['name']} ({suggestions[0]['id']})")
+        if len(suggestions) > 1:
+            for s in suggestions[1:4]:
+                print(f"  Also considered: {s['name']} ({s['id']})")
+        return suggestions[0]["id"]
+    print("  No category suggestions found. Listing without category.")
+    return ""
+
+
 def get_valid_conditions(
     category_id: str,
     auth_token: str,
@@ -835,60 +2404,18 @@ def resolve_condition(
     return desired_id
 
 
-def _build_listing_xml(
-    title: str,
-    description: str,
-    price: float,
-    condition_id: str,
-    image_urls: list[str],
-    quantity: int = 1,
-    category_id: str = "",
-    currency: str = "USD",
-    marketplace: str = "US",
-    # Shipping
-    shipping_type: str = "Flat",
-    domestic_services: list[dict] | None = None,
-    international_services: list[dict] | None = None,
-    dispatch_days: int = 3,
-    ship_to_locations: str = "",
-    # Calculated shipping dimensions
+def _shipping_details_xml(
+    shipping_type: str,
+    currency: str,
+    domestic_services: list[dict] | None,
+    international_services: list[dict] | None,
     package_type: str = "",
     package_length: float | None = None,
     package_width: float | None = None,
     package_depth: float | None = None,
     weight_kg: float | None = None,
-    # Returns
-    returns_accepted: bool = True,
-    return_days: int = 30,
-    return_shipping_paid_by: str = "Buyer",
-    # Item details
-    item_specifics: dict | None = None,
-    condition_description: str = "",
-    postcode: str = "",
-    location: str = "",
-    # Best offer
-    best_offer: bool = False,
-    best_offer_min: float | None = None,
-    best_offer_auto_accept: float | None = None,
-    # Display
-    gallery_type: str = "",
 ) -> str:
-    """Build the XML body for an AddFixedPriceItem / VerifyAddFixedPriceItem call.
-
-    Takes a resolved condition_id (not a condition name). Returns the XML <Item> body string.
-    """
-    pictures_xml = "\n".join(
-        f"      <PictureURL>{_escape_xml(url)}</PictureURL>" for url in image_urls
-    )
-
-    category_xml = ""
-    if category_id:
-        category_xml = f"""
-    <PrimaryCategory>
-      <CategoryID>{_escape_xml(category_id)}</CategoryID>
-    </PrimaryCategory>"""
-
-    # Shipping
+    """The inline <ShippingDetails> block: shipping type, package and service options."""
     shipping_xml = f"""
     <ShippingDetails>
       <ShippingType>{_escape_xml(shipping_type)}</ShippingType>"""
@@ -953,21 +2480,92 @@ def _build_listing_xml(
 
     shipping_xml += """
     </ShippingDetails>"""
+    return shipping_xml
+
+
+def _build_listing_xml(
+    title: str,
+    description: str,
+    price: float,
+    condition_id: str,
+    image_urls: list[str],
+    quantity: int = 1,
+    category_id: str = "",
+    currency: str = "USD",
+    marketplace: str = "US",
+    # Shipping
+    shipping_type: str = "Flat",
+    domestic_services: list[dict] | None = None,
+    international_services: list[dict] | None = None,
+    dispatch_days: int = 3,
+    ship_to_locations: str = "",
+    # Calculated shipping dimensions
+    package_type: str = "",
+    package_length: float | None = None,
+    package_width: float | None = None,
+    package_depth: float | None = None,
+    weight_kg: float | None = None,
+    # Returns
+    returns_accepted: bool = True,
+    return_days: int = 30,
+    return_shipping_paid_by: str = "Buyer",
+    # Item details
+    item_specifics: dict | None = None,
+    condition_description: str = "",
+    postcode: str = "",
+    location: str = "",
+    # Best offer
+    best_offer: bool = False,
+    best_offer_min: float | None = None,
+    best_offer_auto_accept: float | None = None,
+    # Display
+    gallery_type: str = "",
+    # Business policies: {"shipping"|"return"|"payment": profile ID}
+    seller_profiles: dict | None = None,
+) -> str:
+    """Build the XML body for an AddFixedPriceItem / VerifyAddFixedPriceItem call.
+
+    Takes a resolved condition_id (not a condition name). Returns the XML <Item> body string.
+    A shipping or return profile in seller_profiles replaces the inline ShippingDetails
+    (and DispatchTimeMax) or ReturnPolicy block respectively.
+    """
+    seller_profiles = seller_profiles or {}
+    pictures_xml = "\n".join(
+        f"      <PictureURL>{_escape_xml(url)}</PictureURL>" for url in image_urls
+    )
+
+    category_xml = ""
+    if category_id:
+        category_xml = f"""
+    <PrimaryCategory>
+      <CategoryID>{_escape_xml(category_id)}</CategoryID>
+    </PrimaryCategory>"""
+
+    # Shipping (a shipping profile replaces ShippingDetails and DispatchTimeMax)
+    shipping_xml = dispatch_xml = ""
+    if not seller_profiles.get("shipping"):
+        shipping_xml = _shipping_details_xml(
+            shipping_type, currency, domestic_services, international_services,
+            package_type, package_length, package_width, package_depth, weight_kg,
+        )
+        dispatch_xml = f"\n    <DispatchTimeMax>{dispatch_days}</DispatchTimeMax>"
 
     # Ship to locations
     ship_to_xml = ""
     if ship_to_locations:
         ship_to_xml = f"\n    <ShipToLocations>{_escape_xml(ship_to_locations)}</ShipToLocations>"
 
-    # Returns
-    returns_xml = f"""
+    # Returns (a return profile replaces ReturnPolicy)
+    returns_xml = ""
+    if not seller_profiles.get("return"):
+        returns_xml = f"""
     <ReturnPolicy>
       <ReturnsAcceptedOption>{"ReturnsAccepted" if returns_accepted else "ReturnsNotAccepted"}</ReturnsAcceptedOption>"""
-    if returns_accepted:
-        returns_xml += f"""
+        if returns_accepted:
+            returns_xml += f"""
       <ReturnsWithinOption>Days_{return_days}</ReturnsWithinOption>
       <ShippingCostPaidByOption>{_escape_xml(return_shipping_paid_by)}</ShippingCostPaidByOption>"""
-    returns_xml += """
+        returns_xml += """
     </ReturnPolicy>"""
 
     # Item specifics
@@ -1024,11 +2622,10 @@ def _build_listing_xml(
     <Currency>{_escape_xml(currency)}</Currency>
     <ListingDuration>GTC</ListingDuration>
     <ListingType>FixedPriceItem</ListingType>
-    <Quantity>{quantity}</Quantity>
-    <DispatchTimeMax>{dispatch_days}</DispatchTimeMax>{category_xml}{postcode_xml}{location_xml}{best_offer_xml}{best_offer_details_xml}{ship_to_xml}
+    <Quantity>{quantity}</Quantity>{dispatch_xml}{category_xml}{postcode_xml}{location_xml}{best_offer_xml}{best_offer_details_xml}{ship_to_xml}
     <PictureDetails>{gallery_xml}
 {pictures_xml}
-    </PictureDetails>{shipping_xml}{returns_xml}{specifics_xml}
+    </PictureDetails>{shipping_xml}{returns_xml}{_seller_profiles_xml(seller_profiles)}{specifics_xml}
   </Item>"""
 
 
@@ -1072,6 +2669,8 @@ def trading_add_fixed_price_item(
     best_offer_auto_accept: float | None = None,
     # Display
     gallery_type: str = "",
+    # Business policies by name or ID: {"shipping"|"return"|"payment": ...}
+    seller_profiles: dict | None = None,
 ) -> str:
     """Create a fixed-price listing via Trading API.
 
@@ -1085,15 +2684,7 @@ def trading_add_fixed_price_item(
     # Auto-suggest category if not provided
     if not category_id:
         print(f"No category specified — looking up suggestions for: {title}")
-        suggestions = suggest_category(title)
-        if suggestions:
-            category_id = suggestions[0]["id"]
-            print(f"  Auto-selected: {suggestions[0]['name']} ({category_id})")
-            if len(suggestions) > 1:
-                for s in suggestions[1:4]:
-                    print(f"  Also considered: {s['name']} ({s['id']})")
-        else:
-            print("  No category suggestions found. Listing without category.")
+        category_id = _auto_select_category(title, auth_token, sandbox, site_id)
 
     # Resolve condition to a valid ID for this category
     if category_id and auth_token:
@@ -1101,6 +2692,8 @@ def trading_add_fixed_price_item(
     else:
         condition_id = CONDITION_ID_MAP.get(condition, "1000")
 
+    profile_ids = resolve_seller_profiles(seller_profiles, auth_token, sandbox, site_id) if seller_profiles else None
+
     body = _build_listing_xml(
         title=title,
         description=description,
@@ -1132,6 +2725,7 @@ def trading_add_fixed_price_item(
         best_offer_min=best_offer_min,
         best_offer_auto_accept=best_offer_auto_accept,
         gallery_type=gallery_type,
+        seller_profiles=profile_ids,
     )
 
     call_name = "VerifyAddFixedPriceItem" if draft else "AddFixedPriceItem"
@@ -1147,12 +2741,51 @@ def trading_add_fixed_price_item(
         fees = _extract_xml_value(result, "Fee")
         print(f"Verification passed (draft). Estimated fees shown above.")
     else:
+        save_snapshot(item_id, {
+            "price": price,
+            "title": title,
+            "description": description,
+            "best_offer_min": best_offer_min if best_offer else None,
+            "best_offer_auto_accept": best_offer_auto_accept if best_offer else None,
+        })
+        count_event("listings_created")
         print(f"Listed! Item ID: {item_id}")
         print(f"https://www.ebay.com/itm/{item_id}")
 
     return item_id
 
 
+def open_snapshot_store() -> sqlite3.Connection:
+    """Open (and create if needed) the last-published field snapshots used to diff revisions."""
+    conn = sqlite3.connect(_state_path("snapshots.db"))
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE IF NOT EXISTS snapshots (item_id TEXT PRIMARY KEY, fields TEXT, updated_at TEXT)")
+    return conn
+
+
+def load_snapshot(item_id: str) -> dict:
+    conn = open_snapshot_store()
+    row = conn.execute("SELECT fields FROM snapshots WHERE item_id = ?", (item_id,)).fetchone()
+    conn.close()
+    return json.loads(row["fields"]) if row else {}
+
+
+def save_snapshot(item_id: str, fields: dict):
+    """Merge fields into an item's snapshot. A description is stored as its SHA-256, never in full."""
+    fields = dict(fields)
+    if "description" in fields:
+        fields["description_sha256"] = hashlib.sha256(fields.pop("description").encode()).hexdigest()
+    conn = open_snapshot_store()
+    with conn:
+        row = conn.execute("SELECT fields FROM snapshots WHERE item_id = ?", (item_id,)).fetchone()
+        merged = {**(json.loads(row["fields"]) if row else {}), **fields}
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?)",
+            (item_id, json.dumps(merged), _ebay_time(datetime.now(timezone.utc))),
+        )
+    conn.close()
+
+
 def revise_fixed_price_item(
     item_id: str,
     auth_token: str,
@@ -1164,20 +2797,42 @@ def revise_fixed_price_item(
     best_offer_min: float | None = None,
     best_offer_auto_accept: float | None = None,
     currency: str = "AUD",
+    force: bool = False,
 ) -> str:
-    """Revise an existing fixed-price listing via Trading API."""
-    fields = ""
+    """Revise an existing fixed-price listing via Trading API.
+
+    Only fields that differ from the item's last-published snapshot are sent; if
+    none do, no call is made. force=True sends every field passed.
+    """
+    requested = {}
     if price is not None:
-        fields += f'\n    <StartPrice currencyID="{_escape_xml(currency)}">{price}</StartPrice>'
+        requested["price"] = price
     if title:
-        fields += f"\n    <Title>{_escape_xml(title)}</Title>"
+        requested["title"] = title
     if description:
+        requested["description_sha256"] = hashlib.sha256(description.encode()).hexdigest()
+    if best_offer_min is not None:
+        requested["best_offer_min"] = best_offer_min
+    if best_offer_auto_accept is not None:
+        requested["best_offer_auto_accept"] = best_offer_auto_accept
+    snapshot = {} if force else load_snapshot(item_id)
+    changed = {k: v for k, v in requested.items() if snapshot.get(k) != v}
+    if not changed:
+        print(f"Item {item_id} unchanged; skipping revision.")
+        return item_id
+
+    fields = ""
+    if "price" in changed:
+        fields += f'\n    <StartPrice currencyID="{_escape_xml(currency)}">{price}</StartPrice>'
+    if "title" in changed:
+        fields += f"\n    <Title>{_escape_xml(title)}</Title>"
+    if "description_sha256" in changed:
         fields += f"\n    <Description><![CDATA[{description}]]></Description>"
-    if best_offer_min is not None or best_offer_auto_accept is not None:
+    if "best_offer_min" in changed or "best_offer_auto_accept" in changed:
         fields += "\n    <ListingDetails>"
-        if best_offer_auto_accept is not None:
+        if "best_offer_auto_accept" in changed:
             fields += f'\n      <BestOfferAutoAcceptPrice currencyID="{_escape_xml(currency)}">{best_offer_auto_accept}</BestOfferAutoAcceptPrice>'
-        if best_offer_min is not None:
+        if "best_offer_min" in changed:
             fields += f'\n      <MinimumBestOfferPrice currencyID="{_escape_xml(currency)}">{best_offer_min}</MinimumBestOfferPrice>'
         fields += "\n    </ListingDetails>"
 
@@ -1192,6 +2847,8 @@ def revise_fixed_price_item(
         errors = _extract_xml_value(result, "LongMessage") or _extract_xml_value(result, "ShortMessage")
         raise EbayApiError(f"ReviseFixedPriceItem failed: {ack}\nError: {errors}")
 
+    save_snapshot(item_id, changed)
+    count_event("listings_revised")
     print(f"Revised item {item_id} successfully.")
     return item_id
 
@@ -1243,6 +2900,27 @@ def get_category_specifics(
     return specifics
 
 
+def _parse_categories(xml_text: str) -> list[dict]:
+    """Parse GetCategories <Category> blocks into dicts with keys: id, name, leaf, parent_id."""
+    categories = []
+    for block in re.finditer(
+        r"<Category>(.*?)</Category>", xml_text, re.DOTALL
+    ):
+        content = block.group(1)
+        cat_id = _extract_xml_value(content, "CategoryID")
+        cat_name = _extract_xml_value(content, "CategoryName")
+        cat_parent = _extract_xml_value(content, "CategoryParentID")
+        is_leaf = "<LeafCategory>true</LeafCategory>" in content
+
+        categories.append({
+            "id": cat_id,
+            "name": cat_name,
+            "leaf": is_leaf,
+            "parent_id": cat_parent,
+        })
+    return categories
+
+
 def find_categories_online(
     query: str,
     auth_token: str,
@@ -1269,22 +2947,7 @@ def find_categories_online(
     if result is None:
         return []
 
-    categories = []
-    for block in re.finditer(
-        r"<Category>(.*?)</Category>", result, re.DOTALL
-    ):
-        content = block.group(1)
-        cat_id = _extract_xml_value(content, "CategoryID")
-        cat_name = _extract_xml_value(content, "CategoryName")
-        cat_parent = _extract_xml_value(content, "CategoryParentID")
-        is_leaf = "<LeafCategory>true</LeafCategory>" in content
-
-        categories.append({
-            "id": cat_id,
-            "name": cat_name,
-            "leaf": is_leaf,
-            "parent_id": cat_parent,
-        })
+    categories = _parse_categories(result)
 
     # Filter by query keywords
     if query and not parent_id:
@@ -1333,60 +2996,2477 @@ def validate_leaf_category(
     return True, ""  # Not found — don't block
 
 
-# --- CLI ---
+# --- Item aspects index ---
+
+# The Taxonomy API's fetch_item_aspects returns one gzipped JSON file with the
+# aspects (item specifics) of every leaf category in a marketplace's tree. It is
+# stream-decoded one category at a time into a binary index:
+#
+#   header  magic, category count, table offset, meta offset, meta length
+#   data    one compact JSON record per category
+#   meta    tree id/version and sync time (JSON)
+#   table   (category id, offset, length) entries sorted by category id
+#
+# Lookups mmap the file and binary-search the table, so only the pages for one
+# category are ever read.
+ASPECT_INDEX_MAGIC = b"EBYASPX1"
+_ASPECT_HEADER = struct.Struct("<8sIQQI")
+_ASPECT_ENTRY = struct.Struct("<QQI")
+ASPECT_VALUES_MAX = 100  # per free-text aspect; selection-only aspects keep every allowed value
+ASPECT_INDEX_MAX_AGE = 30 * 24 * 3600  # older indexes are ignored in favour of live lookups
+APPLICATION_SCOPE = "https://api.ebay.com/oauth/api_scope"
+_ASPECT_INDEXES: dict[str, "AspectIndex"] = {}
+_ASPECT_LOCK = threading.Lock()
+
+
+def _app_credentials() -> tuple[str, str]:
+    """Client ID / secret for application tokens, from the account profile or env vars."""
+    name = current_account()
+    profile = load_accounts().get(name, {}) if name else {}
+    client_id = (profile.get("client_id") or profile.get("app_id") or
+                 os.environ.get("EBAY_CLIENT_ID") or os.environ.get("EBAY_APP_ID", ""))
+    secret = (profile.get("client_secret") or profile.get("cert_id") or
+              os.environ.get("EBAY_CLIENT_SECRET") or os.environ.get("EBAY_CERT_ID", ""))
+    if not client_id or not secret:
+        raise EbayApiError("The Taxonomy API needs EBAY_CLIENT_ID and EBAY_CLIENT_SECRET (App ID / Cert ID).")
+    return client_id, secret
+
+
+def get_application_token(sandbox: bool = False) -> str:
+    """Client-credentials token for public APIs such as Taxonomy (no user consent needed)."""
+    client_id, secret = _app_credentials()
+    resp = _http_request(
+        "POST", f"{api_base(sandbox)}/identity/v1/oauth2/token", "ApplicationToken",
+        headers={
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Authorization": basic_auth_header(client_id, secret),
+        },
+        data=urllib.parse.urlencode({"grant_type": "client_credentials", "scope": APPLICATION_SCOPE}),
+    )
+    if resp.status_code != 200:
+        raise EbayApiError(f"Application token request failed: {resp.status_code} {resp.text[:300]}")
+    return resp.json()["access_token"]
 
 
-def main():
-    parser = argparse.ArgumentParser(
-        description="List items on eBay via Inventory API",
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
-conditions: NEW, LIKE_NEW, NEW_OTHER, USED_EXCELLENT, USED_VERY_GOOD,
-  USED_GOOD, USED_ACCEPTABLE, CERTIFIED_REFURBISHED, SELLER_REFURBISHED,
-  FOR_PARTS_OR_NOT_WORKING
+def _aspect_index_path(marketplace: str) -> str:
+    return os.path.join(_state_dir(), "aspects", f"{marketplace}.idx")
 
-marketplaces: US, UK, AU, CA, DE, FR, IT, ES
 
-examples:
-  ebay_list.py auth
-  ebay_list.py list --title "GoPro Hero 12" --price 299.99 --condition NEW \\
-    --image "https://example.com/photo.jpg" --category 31388
-        """,
-    )
-    sub = parser.add_subparsers(dest="command", required=True)
+def _marketplace_for_site(site_id: str) -> str:
+    return next((code for code, sid in SITE_ID_MAP.items() if sid == site_id), "")
 
-    sub.add_parser("auth", help="Authenticate with eBay (opens browser)")
-    sub.add_parser("refresh", help="Refresh access token")
-    sub.add_parser("dashboard", help="Show all active/sold listings with prices and metrics")
-    msg_p = sub.add_parser("messages", help="Show recent eBay messages")
-    msg_p.add_argument("--days", type=int, default=14, help="Number of days to look back (default: 14)")
 
-    cat_p = sub.add_parser("categories", help="Search for eBay category IDs (built-in)")
-    cat_p.add_argument("query", nargs="+", help="Keywords to search (e.g. 'gimbal stabilizer')")
+def _iter_category_aspects(stream, meta: dict, chunk_size: int = 1 << 20):
+    """Yield each categoryAspects entry from a text stream without reading it whole.
 
-    fc_p = sub.add_parser("find-category", help="Search eBay site for category IDs (live API)")
-    fc_p.add_argument("query", nargs="+", help="Keywords to search (e.g. 'mobile phones')")
-    fc_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
-    fc_p.add_argument("--parent", default="", help="Parent category ID to search within")
+    Top-level scalars seen before the array (categoryTreeId, categoryTreeVersion)
+    are copied into meta.
+    """
+    decoder = json.JSONDecoder()
+    skip = re.compile(r"[\s,]*")
+    buf = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        buf += chunk
+        start = buf.find('"categoryAspects"')
+        if start >= 0 and "[" in buf[start:]:
+            break
+        if not chunk:
+            raise EbayApiError("Aspects file has no categoryAspects array.")
+    for key, value in re.findall(r'"(categoryTreeId|categoryTreeVersion)"\s*:\s*"([^"]*)"', buf[:start]):
+        meta[key] = value
+    pos = buf.index("[", start) + 1
+    while True:
+        pos = skip.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            entry, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                raise EbayApiError("Aspects file ended mid-record.")
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield entry
 
-    sp_p = sub.add_parser("specifics", help="Show required item specifics for a category")
-    sp_p.add_argument("category_id", help="eBay category ID")
-    sp_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
 
-    verify_p = sub.add_parser("verify", help="Dry-run a listing (VerifyAddFixedPriceItem)")
+def _compact_aspects(entry: dict) -> tuple[int, dict] | None:
+    category = entry.get("category", {})
+    if not str(category.get("categoryId", "")).isdigit():
+        return None
+    aspects = []
+    for aspect in entry.get("aspects", []):
+        constraint = aspect.get("aspectConstraint", {})
+        mode = constraint.get("aspectMode", "FREE_TEXT")
+        values = [v["localizedValue"] for v in aspect.get("aspectValues", []) if "localizedValue" in v]
+        aspects.append({
+            "name": aspect.get("localizedAspectName", ""),
+            "required": bool(constraint.get("aspectRequired")),
+            "values": values if mode == "SELECTION_ONLY" else values[:ASPECT_VALUES_MAX],
+            "mode": mode,
+            "usage": constraint.get("aspectUsage", ""),
+        })
+    return int(category["categoryId"]), {"name": category.get("categoryName", ""), "aspects": aspects}
 
-    list_p = sub.add_parser("list", help="Create and publish a listing")
 
-    # Add shared args to both list and verify
-    for p in [list_p, verify_p]:
-        p.add_argument("--title", required=True, help="Item title (max 80 chars)")
-        p.add_argument("--description", required=True, help="Item description (max 4000 chars)")
-        p.add_argument("--price", required=True, type=float, help="Listing price")
-        p.add_argument("--condition", required=True, choices=CONDITIONS, help="Item condition")
-        p.add_argument("--image", required=True, action="append", dest="images", help="Image URL or local file path (repeatable)")
-        p.add_argument("--quantity", type=int, default=1, help="Quantity available (default: 1)")
-        p.add_argument("--category", default="", help="eBay category ID (auto-suggested from title if omitted)")
-        p.add_argument("--marketplace", default="US", choices=MARKETPLACES.keys(), help="Marketplace (default: US)")
+class _ChunkReader(io.RawIOBase):
+    """Read-only file over an iterator of byte chunks, such as Response.iter_content()."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        n = min(len(buf), len(self._pending))
+        buf[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+
+def build_aspect_index(stream, path: str, meta: dict | None = None) -> dict:
+    """Write the binary index for an aspects JSON text stream to path (atomically). Returns meta."""
+    meta = dict(meta or {})
+    entries = []
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(b"\0" * _ASPECT_HEADER.size)
+            for raw in _iter_category_aspects(stream, meta):
+                compact = _compact_aspects(raw)
+                if compact is None:
+                    continue
+                record = json.dumps(compact[1], separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+                entries.append((compact[0], f.tell(), len(record)))
+                f.write(record)
+            meta.update(categories=len(entries), synced_at=time.time())
+            meta_bytes = json.dumps(meta).encode("utf-8")
+            meta_offset = f.tell()
+            f.write(meta_bytes)
+            table_offset = f.tell()
+            for entry in sorted(entries):
+                f.write(_ASPECT_ENTRY.pack(*entry))
+            f.seek(0)
+            f.write(_ASPECT_HEADER.pack(ASPECT_INDEX_MAGIC, len(entries), table_offset, meta_offset, len(meta_bytes)))
+        os.replace(tmp, path)
+    except BaseException:
+        # A failed or interrupted sync must not leave a half-written index behind
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    with _ASPECT_LOCK:
+        stale = _ASPECT_INDEXES.pop(path, None)
+    if stale:
+        stale.close()
+    return meta
+
+
+class AspectIndex:
+    """Read-only, memory-mapped view of an index written by build_aspect_index."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._table, meta_offset, meta_len = _ASPECT_HEADER.unpack_from(self._mm, 0)
+        if magic != ASPECT_INDEX_MAGIC:
+            self.close()
+            raise EbayApiError(f"{path} is not an aspects index. Run 'aspects sync' again.")
+        self.meta = json.loads(self._mm[meta_offset:meta_offset + meta_len])
+
+    def get(self, category_id: str) -> dict | None:
+        """{"name", "aspects": [{"name", "required", "values", "mode", "usage"}]} or None."""
+        if not str(category_id).isdigit():
+            return None
+        target, lo, hi = int(category_id), 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cat_id, offset, length = _ASPECT_ENTRY.unpack_from(self._mm, self._table + mid * _ASPECT_ENTRY.size)
+            if cat_id == target:
+                return json.loads(self._mm[offset:offset + length])
+            if cat_id < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+
+def open_aspect_index(marketplace: str) -> AspectIndex | None:
+    """The synced index for a marketplace (opened once per process), or None if there isn't one."""
+    path = _aspect_index_path(marketplace)
+    with _ASPECT_LOCK:
+        index = _ASPECT_INDEXES.get(path)
+        if index is None and os.path.exists(path):
+            index = _ASPECT_INDEXES[path] = AspectIndex(path)
+    return index
+
+
+def lookup_aspects(category_id: str, site_id: str) -> dict | None:
+    """Aspects for a category from a fresh local index, or None (no index, too old, or unknown category)."""
+    marketplace = _marketplace_for_site(site_id)
+    index = open_aspect_index(marketplace) if marketplace else None
+    if index is None or time.time() - index.meta.get("synced_at", 0) > ASPECT_INDEX_MAX_AGE:
+        return None
+    return index.get(category_id)
+
+
+def sync_aspect_index(marketplace: str, sandbox: bool = False) -> dict:
+    """Download fetch_item_aspects for a marketplace's default category tree and index it."""
+    token = get_application_token(sandbox)
+    headers = {"Authorization": f"Bearer {token}"}
+    taxonomy = f"{api_base(sandbox)}/commerce/taxonomy/v1"
+    resp = _http_request(
+        "GET", f"{taxonomy}/get_default_category_tree_id?marketplace_id={MARKETPLACES[marketplace]}",
+        "GetDefaultCategoryTreeId", headers=headers,
+    )
+    if resp.status_code != 200:
+        raise EbayApiError(f"get_default_category_tree_id failed: {resp.status_code} {resp.text[:300]}")
+    tree_id = resp.json()["categoryTreeId"]
+    resp = _http_request(
+        "GET", f"{taxonomy}/category_tree/{tree_id}/fetch_item_aspects", "FetchItemAspects",
+        headers=headers, timeout=600, stream=True,
+    )
+    try:
+        if resp.status_code != 200:
+            raise EbayApiError(f"fetch_item_aspects failed: {resp.status_code} {resp.text[:300]}")
+        # Neither the compressed file nor the (much larger) JSON is ever held whole:
+        # the body is decompressed and indexed as it comes off the socket
+        raw = io.BufferedReader(_ChunkReader(resp.iter_content(chunk_size=64 * 1024)))
+        if raw.peek(2)[:2] == b"\x1f\x8b":
+            raw = gzip.GzipFile(fileobj=raw)
+        with io.TextIOWrapper(raw, encoding="utf-8") as stream:
+            return build_aspect_index(stream, _aspect_index_path(marketplace),
+                                      {"marketplace": marketplace, "categoryTreeId": tree_id})
+    finally:
+        resp.close()
+
+
+# --- Local pre-submit validation ---
+
+TITLE_MAX_LENGTH = 80
+DESCRIPTION_MAX_LENGTH = 500000  # Trading API limit; the Inventory API allows 4000
+CONDITION_DESCRIPTION_MAX_LENGTH = 1000
+MAX_PICTURES = 24
+METADATA_TTL = 7 * 24 * 3600  # Category trees and specifics change rarely
+
+
+def get_category_info(
+    category_id: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> dict | None:
+    """Cached {"leaf", "name"} for a category, or None if eBay couldn't tell us."""
+    indexed = lookup_aspects(category_id, site_id)
+    if indexed is not None:
+        return {"leaf": True, "name": indexed["name"]}  # the aspects file only covers leaf categories
+    key = f"{site_id}:{category_id}"
+    info = _cache_get("categories", key, METADATA_TTL)
+    if info is not None:
+        return info
+    is_leaf, cat_name = validate_leaf_category(category_id, auth_token, sandbox, site_id)
+    if not cat_name:
+        return None  # Unverified — don't cache a guess
+    info = {"leaf": is_leaf, "name": cat_name}
+    _cache_put("categories", key, info)
+    return info
+
+
+def get_cached_category_specifics(
+    category_id: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> list[dict] | None:
+    """Specifics from the synced aspects index, else cached get_category_specifics.
+
+    Returns None when neither is available.
+    """
+    indexed = lookup_aspects(category_id, site_id)
+    if indexed is not None:
+        return indexed["aspects"]
+    key = f"{site_id}:{category_id}"
+    specs = _cache_get("specifics", key, METADATA_TTL)
+    if specs is not None:
+        return specs
+    try:
+        specs = get_category_specifics(category_id, auth_token, sandbox, site_id)
+    except EbayApiError:
+        return None
+    _cache_put("specifics", key, specs)
+    return specs
+
+
+def get_shipping_services(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> list[str] | None:
+    """Cached list of valid shipping service codes for a site (GeteBayDetails)."""
+    services = _cache_get("shipping_services", site_id, METADATA_TTL)
+    if services is not None:
+        return services
+    body = "\n  <DetailName>ShippingServiceDetails</DetailName>"
+    result = _trading_api_call_safe("GeteBayDetails", body, auth_token, sandbox, site_id)
+    if result is None:
+        return None
+    services = []
+    for block in re.finditer(r"<ShippingServiceDetails>(.*?)</ShippingServiceDetails>", result, re.DOTALL):
+        content = block.group(1)
+        if "<ValidForSellingFlow>false</ValidForSellingFlow>" in content:
+            continue
+        name = _extract_xml_value(content, "ShippingService")
+        if name:
+            services.append(name)
+    if not services:
+        return None
+    _cache_put("shipping_services", site_id, services)
+    return services
+
+
+def validate_listing(
+    title: str,
+    description: str,
+    price: float,
+    image_count: int,
+    quantity: int = 1,
+    category_id: str = "",
+    item_specifics: dict | None = None,
+    domestic_services: list[dict] | None = None,
+    international_services: list[dict] | None = None,
+    condition_description: str = "",
+    best_offer_min: float | None = None,
+    best_offer_auto_accept: float | None = None,
+    auth_token: str = "",
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> list[str]:
+    """Check a listing locally before any uploads or Add calls. Returns every problem found.
+
+    Category, specifics and shipping checks use cached metadata (fetched once if
+    missing); when eBay can't provide it the check is skipped rather than failed.
+    """
+    problems = []
+    if not title.strip():
+        problems.append("Title is empty.")
+    elif len(title) > TITLE_MAX_LENGTH:
+        problems.append(f"Title is {len(title)} characters (max {TITLE_MAX_LENGTH}).")
+    if not description.strip():
+        problems.append("Description is empty.")
+    elif len(description) > DESCRIPTION_MAX_LENGTH:
+        problems.append(f"Description is {len(description)} characters (max {DESCRIPTION_MAX_LENGTH}).")
+    if len(condition_description) > CONDITION_DESCRIPTION_MAX_LENGTH:
+        problems.append(
+            f"Condition description is {len(condition_description)} characters (max {CONDITION_DESCRIPTION_MAX_LENGTH})."
+        )
+    if price <= 0:
+        problems.append(f"Price must be positive (got {price}).")
+    if quantity < 1:
+        problems.append(f"Quantity must be at least 1 (got {quantity}).")
+    if image_count < 1:
+        problems.append("At least one image is required.")
+    elif image_count > MAX_PICTURES:
+        problems.append(f"{image_count} images given (max {MAX_PICTURES}).")
+    if best_offer_min is not None and best_offer_min >= price:
+        problems.append(f"Best offer minimum {best_offer_min} must be below the price {price}.")
+    if best_offer_auto_accept is not None and best_offer_auto_accept >= price:
+        problems.append(f"Best offer auto-accept {best_offer_auto_accept} must be below the price {price}.")
+    if best_offer_min is not None and best_offer_auto_accept is not None and best_offer_min > best_offer_auto_accept:
+        problems.append("Best offer minimum is above the auto-accept price.")
+
+    if not auth_token:
+        return problems
+
+    if category_id:
+        info = get_category_info(category_id, auth_token, sandbox, site_id)
+        if info and not info["leaf"]:
+            problems.append(f"Category {category_id} ({info['name']}) is not a leaf category.")
+        elif info:
+            specs = get_cached_category_specifics(category_id, auth_token, sandbox, site_id)
+            given = {name.lower() for name in (item_specifics or {})}
+            missing = [s["name"] for s in specs or [] if s["required"] and s["name"].lower() not in given]
+            if missing:
+                problems.append(f"Missing required item specifics: {', '.join(missing)}.")
+            # Selection-only aspects (known from the aspects index) accept nothing but their listed values
+            closed = {s["name"].lower(): s for s in specs or [] if s.get("mode") == "SELECTION_ONLY" and s["values"]}
+            for name, value in (item_specifics or {}).items():
+                spec = closed.get(name.lower())
+                if spec and str(value).lower() not in {v.lower() for v in spec["values"]}:
+                    problems.append(f"'{value}' is not an allowed value for {spec['name']} "
+                                    f"(e.g. {', '.join(spec['values'][:5])}).")
+
+    services = [s["service"] for s in (domestic_services or []) + (international_services or [])]
+    if services:
+        valid = get_shipping_services(auth_token, sandbox, site_id)
+        if valid:
+            valid_set = set(valid)
+            for svc in services:
+                if svc not in valid_set:
+                    problems.append(f"Unknown shipping service for this site: {svc}.")
+
+    return problems
+
+
+# --- Business policies (SellerProfiles) ---
+
+# Shipping, return and payment policies live on eBay as seller profiles. A listing
+# that references their IDs carries a few bytes instead of full ShippingDetails /
+# ReturnPolicy blocks. Profiles are fetched once per site and cached for a day.
+POLICY_TTL = 24 * 3600
+POLICY_TYPES = {"shipping": "SHIPPING", "return": "RETURN_POLICY", "payment": "PAYMENT"}
+
+
+def _parse_seller_profiles(result: str) -> list[dict]:
+    profiles = []
+    for block in re.findall(r"<SupportedSellerProfile>(.*?)</SupportedSellerProfile>", result, re.DOTALL):
+        profiles.append({
+            "id": _extract_xml_value(block, "ProfileID"),
+            "type": _extract_xml_value(block, "ProfileType"),
+            "name": _extract_xml_value(block, "ProfileName"),
+            "summary": _extract_xml_value(block, "ShortSummary"),
+            "default": _extract_xml_value(block, "IsDefault") == "true",
+        })
+    return profiles
+
+
+def fetch_seller_profiles(auth_token: str, sandbox: bool = False, site_id: str = "0", refresh: bool = False) -> list[dict]:
+    """The seller's business policies for a site (GetUserPreferences), cached for POLICY_TTL."""
+    profiles = None if refresh else _cache_get("seller_profiles", site_id, POLICY_TTL)
+    if profiles is not None:
+        return profiles
+    result = trading_api_call(
+        "GetUserPreferences",
+        "<ShowSellerProfilePreferences>true</ShowSellerProfilePreferences>",
+        auth_token, sandbox, site_id,
+    )
+    if _extract_xml_value(result, "Ack") not in ("Success", "Warning"):
+        raise EbayApiError(f"GetUserPreferences failed: {_extract_xml_value(result, 'LongMessage')}")
+    profiles = _parse_seller_profiles(result)
+    _cache_put("seller_profiles", site_id, profiles)
+    return profiles
+
+
+def resolve_seller_profiles(
+    spec: dict,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+    check_ids: bool = False,
+) -> dict:
+    """Map {"shipping"|"return"|"payment": profile name or ID} to profile IDs.
+
+    Numeric values are taken as IDs without a lookup, unless check_ids is set
+    (profiles belong to one site, so an ID reused across sites must exist on each).
+    Names are matched case-insensitively against the cached profiles, refreshed
+    once on a miss so a policy created since the last fetch is found.
+    """
+    resolved, wanted = {}, {}
+    for kind, value in spec.items():
+        if kind not in POLICY_TYPES:
+            raise EbayApiError(f"Unknown policy type '{kind}' (expected {', '.join(POLICY_TYPES)})")
+        if value and str(value).isdigit() and not check_ids:
+            resolved[kind] = str(value)
+        elif value:
+            wanted[kind] = str(value)
+    for refresh in (False, True):
+        if not wanted:
+            break
+        profiles = fetch_seller_profiles(auth_token, sandbox, site_id, refresh=refresh)
+        for kind, name in list(wanted.items()):
+            match = next((p for p in profiles if p["type"] == POLICY_TYPES[kind]
+                          and (p["id"] == name or p["name"].lower() == name.lower())), None)
+            if match:
+                resolved[kind] = match["id"]
+                del wanted[kind]
+    if wanted:
+        kind, name = next(iter(wanted.items()))
+        label = f"with ID {name}" if name.isdigit() else f"named '{name}'"
+        raise EbayApiError(f"No {kind} policy {label} on site {site_id}. Run 'policies --refresh' to list them.")
+    return resolved
+
+
+def _seller_profiles_xml(profile_ids: dict) -> str:
+    xml = ""
+    for kind, element in (("shipping", "Shipping"), ("return", "Return"), ("payment", "Payment")):
+        if profile_ids.get(kind):
+            xml += f"""
+      <Seller{element}Profile><{element}ProfileID>{_escape_xml(profile_ids[kind])}</{element}ProfileID></Seller{element}Profile>"""
+    return f"\n    <SellerProfiles>{xml}\n    </SellerProfiles>" if xml else ""
+
+
+# --- Multi-marketplace listing ---
+
+SITE_CURRENCY = {
+    "US": "USD", "CA": "CAD", "UK": "GBP", "AU": "AUD",
+    "DE": "EUR", "FR": "EUR", "IT": "EUR", "ES": "EUR",
+}
+
+
+def get_category_tree(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "0",
+) -> dict[str, dict]:
+    """Full category tree for a site as {id: {name, parent_id, leaf}}, cached for METADATA_TTL."""
+    namespace = f"category_tree_{site_id}"
+    tree = _cache_get(namespace, "tree", METADATA_TTL)
+    if tree is not None:
+        return tree
+    body = """
+  <DetailLevel>ReturnAll</DetailLevel>
+  <ViewAllNodes>true</ViewAllNodes>"""
+    result = _trading_api_call_safe("GetCategories", body, auth_token, sandbox, site_id)
+    if result is None:
+        return {}
+    tree = {
+        c["id"]: {"name": c["name"], "parent_id": c["parent_id"], "leaf": c["leaf"]}
+        for c in _parse_categories(result)
+    }
+    if tree:
+        _cache_put(namespace, "tree", tree)
+    return tree
+
+
+def map_category(
+    category_id: str,
+    source_tree: dict[str, dict],
+    target_tree: dict[str, dict],
+) -> str:
+    """Find the equivalent leaf category on another site by matching category names.
+
+    Prefers a leaf with the same name whose parent also has the same name; falls
+    back to the same ID if it is a leaf on the target site. Returns "" if no match.
+    """
+    source = source_tree.get(category_id)
+    if not source:
+        return category_id if target_tree.get(category_id, {}).get("leaf") else ""
+    name = source["name"].lower()
+    parent_name = source_tree.get(source["parent_id"], {}).get("name", "").lower()
+
+    candidates = [
+        cat_id for cat_id, cat in target_tree.items()
+        if cat["leaf"] and cat["name"].lower() == name
+    ]
+    for cat_id in candidates:
+        target_parent = target_tree.get(target_tree[cat_id]["parent_id"], {}).get("name", "").lower()
+        if target_parent == parent_name:
+            return cat_id
+    if candidates:
+        return candidates[0]
+    if target_tree.get(category_id, {}).get("leaf"):
+        return category_id
+    return ""
+
+
+def _parse_domestic_service(spec: str) -> dict:
+    """Parse SERVICE[:COST|free] into a domestic shipping service dict."""
+    parts = spec.split(":")
+    svc = {"service": parts[0]}
+    if len(parts) > 1:
+        if parts[1].lower() == "free":
+            svc["free"] = True
+        else:
+            svc["cost"] = float(parts[1])
+    return svc
+
+
+def _parse_site_overrides(values: list[str] | None, option: str) -> dict[str, list[str]]:
+    """Parse repeatable SITE=VALUE options into {site: [values]}."""
+    overrides: dict[str, list[str]] = {}
+    for value in values or []:
+        site, sep, rest = value.partition("=")
+        site = site.strip().upper()
+        if not sep or site not in SITE_ID_MAP:
+            raise EbayApiError(f"Invalid {option} value (use SITE=VALUE, e.g. UK=...): {value}")
+        overrides.setdefault(site, []).append(rest.strip())
+    return overrides
+
+
+def plan_marketplaces(
+    marketplaces: list[str],
+    category_id: str,
+    price: float,
+    domestic_services: list[dict],
+    auth_token: str,
+    sandbox: bool = False,
+    site_prices: dict | None = None,
+    site_currencies: dict | None = None,
+    site_shipping: dict | None = None,
+    site_categories: dict | None = None,
+) -> list[dict]:
+    """Resolve per-site price, currency, shipping and category for a cross-listing.
+
+    The first marketplace is the source: category_id belongs to it and its
+    shipping services are reused for sites without a --site-shipping override.
+    """
+    unknown = [m for m in marketplaces if m not in SITE_ID_MAP]
+    if unknown or not marketplaces:
+        raise EbayApiError(f"Unknown marketplace(s): {', '.join(unknown) or '(none given)'}")
+    site_prices = site_prices or {}
+    site_currencies = site_currencies or {}
+    site_shipping = site_shipping or {}
+    site_categories = site_categories or {}
+    source = marketplaces[0]
+    source_tree = None
+
+    plans = []
+    for site in marketplaces:
+        site_id = SITE_ID_MAP[site]
+        if site in site_categories:
+            site_category = site_categories[site][-1]
+        elif site == source or not category_id:
+            site_category = category_id
+        else:
+            if source_tree is None:
+                source_tree = get_category_tree(auth_token, sandbox, SITE_ID_MAP[source])
+            site_category = map_category(category_id, source_tree, get_category_tree(auth_token, sandbox, site_id))
+            if not site_category:
+                raise EbayApiError(
+                    f"No matching category for {category_id} on {site}. Pass --site-category {site}=ID."
+                )
+        plans.append({
+            "marketplace": site,
+            "site_id": site_id,
+            "category_id": site_category,
+            "price": float(site_prices[site][-1]) if site in site_prices else price,
+            "currency": site_currencies[site][-1] if site in site_currencies else SITE_CURRENCY.get(site, "USD"),
+            "domestic_services": (
+                [_parse_domestic_service(spec) for spec in site_shipping[site]]
+                if site in site_shipping else domestic_services
+            ),
+        })
+    return plans
+
+
+def list_on_marketplaces(
+    plans: list[dict],
+    image_urls: list[str],
+    auth_token: str,
+    sandbox: bool = False,
+    draft: bool = False,
+    **listing,
+) -> dict[str, dict]:
+    """Submit one AddFixedPriceItem per planned site concurrently, reusing hosted image URLs.
+
+    Returns {marketplace: {"item_id": ...} or {"error": ...}}.
+    """
+    def submit(plan: dict) -> tuple[str, dict]:
+        try:
+            item_id = trading_add_fixed_price_item(
+                price=plan["price"],
+                image_urls=image_urls,
+                category_id=plan["category_id"],
+                currency=plan["currency"],
+                marketplace=plan["marketplace"],
+                domestic_services=plan["domestic_services"] or None,
+                auth_token=auth_token,
+                sandbox=sandbox,
+                draft=draft,
+                **listing,
+            )
+            return plan["marketplace"], {"item_id": item_id}
+        except (EbayApiError, requests.RequestException) as e:
+            return plan["marketplace"], {"error": str(e)}
+
+    return dict(_run_concurrently(submit, plans, max_workers=len(plans) or 1))
+
+
+# --- Selling overview (dashboard) ---
+
+
+def fetch_my_ebay_selling(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    page: int = 1,
+    include_sold: bool = True,
+) -> str:
+    """One page of GetMyeBaySelling: active listings, plus the last 30 days sold on request."""
+    body = f"""
+  <ActiveList>
+    <Include>true</Include>
+    <Pagination><EntriesPerPage>50</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>
+  </ActiveList>"""
+    if include_sold:
+        body += """
+  <SoldList>
+    <Include>true</Include>
+    <DurationInDays>30</DurationInDays>
+    <Pagination><EntriesPerPage>25</EntriesPerPage></Pagination>
+  </SoldList>"""
+    body += "\n  <DetailLevel>ReturnAll</DetailLevel>"
+    return trading_api_call("GetMyeBaySelling", body, auth_token, sandbox, site_id)
+
+
+def _parse_active_ids(result: str) -> tuple[list[str], int]:
+    """Return (unique active item IDs, total ActiveList pages) from a GetMyeBaySelling response."""
+    active_ids = []
+    total_pages = 1
+    active_block = re.search(r"<ActiveList>(.*?)</ActiveList>", result, re.DOTALL)
+    if active_block:
+        for m in re.finditer(r"<ItemID>(\d+)</ItemID>", active_block.group(1)):
+            if m.group(1) not in active_ids:
+                active_ids.append(m.group(1))
+        total_pages = int(_extract_xml_value(active_block.group(1), "TotalNumberOfPages") or "1")
+    return active_ids, total_pages
+
+
+def _parse_sold_list(result: str) -> list[dict]:
+    """One entry per sold line item. Lines of a combined order share its OrderID in "order"."""
+    sold = []
+    sold_block = re.search(r"<SoldList>(.*?)</SoldList>", result, re.DOTALL)
+    if sold_block:
+        for item in re.finditer(r"<OrderTransaction>(.*?)</OrderTransaction>", sold_block.group(1), re.DOTALL):
+            order = re.search(r"<Order>(.*?)</Order>", item.group(1), re.DOTALL)
+            order_id = _extract_xml_value(order.group(1), "OrderID") if order else ""
+            for tx in re.finditer(r"<Transaction>(.*?)</Transaction>", item.group(1), re.DOTALL):
+                c = tx.group(1)
+                sold.append({
+                    "item_id": _extract_xml_value(c, "ItemID"),
+                    "title": _extract_xml_value(c, "Title"),
+                    "price": _xml_float(c, "TransactionPrice"),
+                    "buyer": _extract_xml_value(c, "BuyerUserID"),
+                    "order_id": _extract_xml_value(c, "OrderLineItemID"),
+                    "order": order_id,
+                    "transaction_id": _extract_xml_value(c, "TransactionID"),
+                    "shipped": bool(_extract_xml_value(c, "ShippedTime")),
+                })
+    return sold
+
+
+def get_item_details(
+    item_id: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+) -> dict:
+    """Fetch one listing via GetItem. Errors are returned in an "error" key rather than raised."""
+    item_body = f"<ItemID>{_escape_xml(item_id)}</ItemID><DetailLevel>ReturnAll</DetailLevel>"
+    try:
+        result = trading_api_call("GetItem", item_body, auth_token, sandbox, site_id)
+    except EbayApiError as e:
+        return {"item_id": item_id, "error": str(e)}
+    currency = re.search(r'<StartPrice currencyID="(\w+)"', result)
+    return {
+        "item_id": item_id,
+        "title": _extract_xml_value(result, "Title"),
+        "price": _xml_float(result, "StartPrice"),
+        "currency": currency.group(1) if currency else "",
+        "quantity": int(_extract_xml_value(result, "Quantity") or "1"),
+        "watchers": int(_extract_xml_value(result, "WatchCount") or "0"),
+        "best_offer_count": int(_extract_xml_value(result, "BestOfferCount") or "0"),
+        "best_offer_enabled": _extract_xml_value(result, "BestOfferEnabled") == "true",
+        "best_offer_min": _xml_float(result, "MinimumBestOfferPrice"),
+        "best_offer_auto_accept": _xml_float(result, "BestOfferAutoAcceptPrice"),
+        "category_id": _extract_xml_value(_extract_xml_value(result, "PrimaryCategory"), "CategoryID"),
+        "start_time": _extract_xml_value(result, "StartTime"),
+    }
+
+
+def iter_active_listings(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    first_result: str | None = None,
+):
+    """Yield details for every active listing, page by page, as soon as each GetItem returns.
+
+    first_result lets callers reuse a GetMyeBaySelling page they already fetched.
+    """
+    page = 1
+    result = first_result
+    while True:
+        if result is None:
+            result = fetch_my_ebay_selling(auth_token, sandbox, site_id, page=page, include_sold=False)
+        active_ids, total_pages = _parse_active_ids(result)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+            futures = _submit_all(pool, lambda i: get_item_details(i, auth_token, sandbox, site_id), active_ids)
+            yield from _iter_results(futures)
+        if page >= total_pages:
+            break
+        page += 1
+        result = None
+
+
+def print_dashboard(active_items, sold: list[dict], ndjson: bool = False, account: str = ""):
+    """Print active and sold listings as tables or NDJSON. active_items may be a generator."""
+    extra = {"account": account} if account else {}
+    label = f" — {account}" if account else ""
+    if not ndjson:
+        print("=" * 90)
+        print(f"{'ACTIVE LISTINGS' + label:^90}")
+        print("=" * 90)
+        print(f"{'Title':<42} {'Price':>8}  {'Watch':>5}  {'Offers':>6}  {'BestOffer':>9}")
+        print("-" * 90)
+    for item in active_items:
+        if ndjson:
+            _emit_ndjson({"type": "active", **extra, **item})
+        elif "error" in item:
+            print(f"  #{item['item_id']} — error fetching details")
+        else:
+            price = item["price"] if item["price"] is not None else "?"
+            bo_str = "on" if item["best_offer_enabled"] else "off"
+            print(f"  {item['title'][:40]:<40} A${price:>7}  {item['watchers']:>5}  {item['best_offer_count']:>6}  {bo_str:>9}")
+
+    if ndjson:
+        for item in sold:
+            _emit_ndjson({"type": "sold", **extra, **item})
+        return
+    print()
+    print("=" * 90)
+    print(f"{'SOLD (last 30 days)' + label:^90}")
+    print("=" * 90)
+    for item in sold:
+        price = item["price"] if item["price"] is not None else "?"
+        print(f"  {item['title'][:40]:<40} A${price:>7}  buyer: {item['buyer']}  #{item['item_id']}")
+    if not sold:
+        print("  (none)")
+    print()
+
+
+def collect_dashboard(account: str) -> dict:
+    """Fetch one account's active and sold listings (for --account all).
+
+    A misconfigured profile or failed call is returned as {"account", "error"}
+    so the other accounts still report.
+    """
+    try:
+        with use_account(account):
+            env = get_env()
+            if env.get("mode") != "authnauth":
+                return {"account": account, "error": "dashboard requires Auth'n'Auth token."}
+            result = fetch_my_ebay_selling(env["auth_token"], env["sandbox"], "15")
+            active = list(iter_active_listings(env["auth_token"], env["sandbox"], "15", first_result=result))
+            return {"account": account, "active": active, "sold": _parse_sold_list(result)}
+    except (EbayApiError, requests.RequestException) as e:
+        return {"account": account, "error": str(e)}
+
+
+def _emit_ndjson(record: dict):
+    """Write one JSON record per line, flushed so downstream tools see it immediately."""
+    sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+
+
+# --- Best offers ---
+
+OFFER_RULE_DEFAULTS = {
+    "accept_pct": 90.0,  # accept offers at or above this % of the listing price
+    "decline_pct": 60.0,  # decline offers below this %
+    "counter_pct": None,  # counter offers in between at this % (None: leave them pending)
+    "aged_days": None,  # listings at least this old...
+    "aged_accept_pct": None,  # ...accept from this % instead of accept_pct
+}
+
+
+def open_offer_store() -> sqlite3.Connection:
+    """Open (and create if needed) the local best-offer store."""
+    conn = sqlite3.connect(_state_path("offers.db"))
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS offers (
+            offer_id TEXT PRIMARY KEY,
+            item_id TEXT,
+            item_title TEXT,
+            buyer TEXT,
+            price REAL,
+            currency TEXT,
+            quantity INTEGER,
+            message TEXT,
+            status TEXT,
+            expires_at TEXT,
+            received_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_offers_item ON offers(item_id, status);
+    """)
+    return conn
+
+
+def _parse_best_offers(xml_text: str, item_id: str) -> list[dict]:
+    offers = []
+    for block in re.finditer(r"<BestOffer>(.*?)</BestOffer>", xml_text, re.DOTALL):
+        c = block.group(1)
+        currency = re.search(r'<Price currencyID="(\w+)"', c)
+        offers.append({
+            "offer_id": _extract_xml_value(c, "BestOfferID"),
+            "item_id": item_id,
+            "buyer": _extract_xml_value(_extract_xml_value(c, "Buyer"), "UserID"),
+            "price": _xml_float(c, "Price"),
+            "currency": currency.group(1) if currency else "",
+            "quantity": int(_extract_xml_value(c, "Quantity") or "1"),
+            "message": _extract_xml_value(c, "BuyerMessage"),
+            "status": _extract_xml_value(c, "Status"),
+            "expires_at": _extract_xml_value(c, "ExpirationTime"),
+        })
+    return offers
+
+
+def fetch_best_offers(
+    item_id: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+) -> list[dict]:
+    """All active best offers on one listing, following pagination."""
+    offers = []
+    page = 1
+    while True:
+        body = f"""
+  <ItemID>{_escape_xml(item_id)}</ItemID>
+  <BestOfferStatus>Active</BestOfferStatus>
+  <DetailLevel>ReturnAll</DetailLevel>
+  <Pagination><EntriesPerPage>200</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>"""
+        result = trading_api_call("GetBestOffers", body, auth_token, sandbox, site_id)
+        offers += _parse_best_offers(result, item_id)
+        total_pages = int(_extract_xml_value(result, "TotalNumberOfPages") or "1")
+        if page >= total_pages:
+            return offers
+        page += 1
+
+
+def _listing_age_days(item: dict, now: datetime) -> float | None:
+    try:
+        started = datetime.strptime(item["start_time"][:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    except (KeyError, ValueError):
+        return None
+    return (now - started).total_seconds() / 86400
+
+
+def evaluate_offers(
+    item: dict,
+    offers: list[dict],
+    rules: dict,
+    now: datetime | None = None,
+) -> list[dict]:
+    """Decide Accept / Decline / Counter / hold for each offer on one listing.
+
+    The listing's own MinimumBestOfferPrice declines anything below it. At most
+    `quantity` offers are accepted per listing, best first, so a single item is
+    never sold twice. An offer already at or above the counter price is accepted
+    rather than countered below what the buyer offered.
+    """
+    rules = {**OFFER_RULE_DEFAULTS, **rules}
+    age = _listing_age_days(item, now or datetime.now(timezone.utc))
+    accept_pct = rules["accept_pct"]
+    if rules["aged_days"] is not None and rules["aged_accept_pct"] is not None and age is not None:
+        if age >= rules["aged_days"]:
+            accept_pct = rules["aged_accept_pct"]
+
+    list_price = item.get("price") or 0
+    remaining = item.get("quantity") or 1
+    decisions = []
+    for offer in sorted(offers, key=lambda o: o["price"] or 0, reverse=True):
+        price = offer["price"] or 0
+        pct = price / list_price * 100 if list_price else 0
+        decision = {**offer, "item_title": item.get("title", ""), "list_price": list_price,
+                    "pct": round(pct, 1), "action": "", "counter_price": None}
+        if item.get("best_offer_min") and price < item["best_offer_min"]:
+            decision["action"], decision["reason"] = "Decline", f"below listing minimum {item['best_offer_min']}"
+        elif pct >= accept_pct or (rules["counter_pct"] is not None and pct >= rules["counter_pct"]):
+            threshold = min(accept_pct, rules["counter_pct"] if rules["counter_pct"] is not None else accept_pct)
+            if offer["quantity"] <= remaining:
+                decision["action"], decision["reason"] = "Accept", f"{pct:.0f}% >= {threshold:g}%"
+                remaining -= offer["quantity"]
+            else:
+                decision["reason"] = "quantity already committed to a better offer"
+        elif pct < rules["decline_pct"]:
+            decision["action"], decision["reason"] = "Decline", f"{pct:.0f}% < {rules['decline_pct']:g}%"
+        elif rules["counter_pct"] is not None:
+            decision["action"] = "Counter"
+            decision["counter_price"] = round(list_price * rules["counter_pct"] / 100, 2)
+            decision["reason"] = f"counter at {rules['counter_pct']:g}%"
+        else:
+            decision["reason"] = "between thresholds"
+        decisions.append(decision)
+    return decisions
+
+
+def _offer_batches(decisions: list[dict]) -> list[list[dict]]:
+    """Group decisions into RespondToBestOffer calls.
+
+    eBay takes several BestOfferIDs per call only when declining; accepts and
+    counters go one offer per call.
+    """
+    declines: dict[str, list[dict]] = {}
+    batches = []
+    for d in decisions:
+        if d["action"] == "Decline":
+            declines.setdefault(d["item_id"], []).append(d)
+        elif d["action"]:
+            batches.append([d])
+    return batches + list(declines.values())
+
+
+def respond_to_offers(
+    decisions: list[dict],
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    seller_response: str = "",
+) -> list[dict]:
+    """Send the decisions with RespondToBestOffer, concurrently. Failures are marked with "error"."""
+
+    def send(batch: list[dict]) -> list[dict]:
+        first = batch[0]
+        ids_xml = "".join(f"<BestOfferID>{_escape_xml(d['offer_id'])}</BestOfferID>" for d in batch)
+        body = f"""
+  <ItemID>{_escape_xml(first['item_id'])}</ItemID>
+  {ids_xml}
+  <Action>{first['action']}</Action>"""
+        if first["action"] == "Counter":
+            body += f"""
+  <CounterOfferPrice currencyID="{first['currency']}">{first['counter_price']:.2f}</CounterOfferPrice>
+  <CounterOfferQuantity>{first['quantity']}</CounterOfferQuantity>"""
+        if seller_response:
+            body += f"\n  <SellerResponse>{_escape_xml(seller_response)}</SellerResponse>"
+        try:
+            result = trading_api_call("RespondToBestOffer", body, auth_token, sandbox, site_id)
+        except (EbayApiError, requests.RequestException) as e:
+            return [{**d, "error": str(e)} for d in batch]
+        if _extract_xml_value(result, "Ack") not in ("Success", "Warning"):
+            error = _extract_xml_value(result, "LongMessage") or _extract_xml_value(result, "ShortMessage")
+            return [{**d, "error": error} for d in batch]
+        return batch
+
+    sent = [d for batch in _run_concurrently(send, _offer_batches(decisions)) for d in batch]
+    count_event("offers_answered", sum("error" not in d for d in sent))
+    status = {"Accept": "Accepted", "Decline": "Declined", "Counter": "Countered"}
+    conn = open_offer_store()
+    with conn:
+        conn.executemany(
+            """INSERT INTO offers (offer_id, item_id, item_title, buyer, price, currency, quantity,
+                                   message, status, expires_at, received_at)
+               VALUES (:offer_id, :item_id, :item_title, :buyer, :price, :currency, :quantity,
+                       :message, :status, :expires_at, '')
+               ON CONFLICT(offer_id) DO UPDATE SET status = excluded.status""",
+            [{**d, "status": status[d["action"]]} for d in sent if "error" not in d],
+        )
+    conn.close()
+    return sent
+
+
+def process_best_offers(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    rules: dict | None = None,
+    dry_run: bool = False,
+    seller_response: str = "",
+) -> list[dict]:
+    """Fetch offers on every active listing that has any, decide, and (unless dry_run) respond."""
+    items = [
+        i for i in iter_active_listings(auth_token, sandbox, site_id)
+        if "error" not in i and i["best_offer_count"]
+    ]
+    offers = _run_concurrently(lambda i: fetch_best_offers(i["item_id"], auth_token, sandbox, site_id), items)
+    decisions = []
+    for item, item_offers in zip(items, offers):
+        decisions += evaluate_offers(item, item_offers, rules or {})
+    if dry_run:
+        return decisions
+    sent = {d["offer_id"]: d for d in respond_to_offers(
+        [d for d in decisions if d["action"]], auth_token, sandbox, site_id, seller_response,
+    )}
+    return [sent.get(d["offer_id"], d) for d in decisions]
+
+
+# --- Message store ---
+
+MESSAGE_BODY_BATCH = 10  # GetMyMessages accepts at most 10 MessageIDs with ReturnMessages
+
+
+def open_message_store() -> sqlite3.Connection:
+    """Open (and create if needed) the local message store."""
+    conn = sqlite3.connect(_state_path("messages.db"))
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id TEXT PRIMARY KEY,
+            sender TEXT,
+            subject TEXT,
+            receive_date TEXT,
+            read INTEGER,
+            item_id TEXT,
+            item_title TEXT,
+            body TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(receive_date);
+        CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    return conn
+
+
+def _get_sync_state(conn: sqlite3.Connection, key: str) -> str:
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else ""
+
+
+def _set_sync_state(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute(
+        "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def _parse_message_headers(xml_text: str) -> list[dict]:
+    msgs = []
+    for block in re.finditer(r"<Message>(.*?)</Message>", xml_text, re.DOTALL):
+        c = block.group(1)
+        msgs.append({
+            "message_id": _extract_xml_value(c, "MessageID"),
+            "sender": _extract_xml_value(c, "Sender"),
+            "subject": _extract_xml_value(c, "Subject"),
+            "receive_date": _extract_xml_value(c, "ReceiveDate"),
+            "read": _extract_xml_value(c, "Read") == "true",
+            "item_id": _extract_xml_value(c, "ItemID"),
+            "item_title": _extract_xml_value(c, "ItemTitle"),
+        })
+    return msgs
+
+
+def sync_messages(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    days: int = 14,
+    full: bool = False,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Pull new message headers into the local store. Returns the number of headers received.
+
+    Only headers newer than the stored high-water mark (latest ReceiveDate) are
+    requested, unless the --days window reaches further back than anything synced
+    so far or full=True. On an incremental sync, older messages in the window that
+    are still stored as unread get their Read flag re-checked.
+    """
+    conn = conn or open_message_store()
+    end = datetime.now(timezone.utc)
+    window_start = _ebay_time(end - timedelta(days=days))
+    high_water = _get_sync_state(conn, "high_water")
+    synced_from = _get_sync_state(conn, "synced_from")
+
+    if not full and high_water and synced_from and synced_from <= window_start:
+        start = high_water
+    else:
+        start = window_start
+
+    received = 0
+    page = 1
+    while True:
+        body = f"""
+  <FolderID>0</FolderID>
+  <StartCreationTime>{start}</StartCreationTime>
+  <EndCreationTime>{_ebay_time(end)}</EndCreationTime>
+  <DetailLevel>ReturnHeaders</DetailLevel>
+  <Pagination><EntriesPerPage>200</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>"""
+        result = trading_api_call("GetMyMessages", body, auth_token, sandbox, site_id)
+        headers = _parse_message_headers(result)
+        conn.executemany(
+            """INSERT INTO messages (message_id, sender, subject, receive_date, read, item_id, item_title)
+               VALUES (:message_id, :sender, :subject, :receive_date, :read, :item_id, :item_title)
+               ON CONFLICT(message_id) DO UPDATE SET read = excluded.read, subject = excluded.subject""",
+            headers,
+        )
+        received += len(headers)
+        for h in headers:
+            if h["receive_date"] > high_water:
+                high_water = h["receive_date"]
+        total_pages = int(_extract_xml_value(result, "TotalNumberOfPages") or "1")
+        if page >= total_pages:
+            break
+        page += 1
+
+    if start != window_start:
+        _refresh_read_flags(conn, window_start, start, auth_token, sandbox, site_id)
+    if high_water:
+        _set_sync_state(conn, "high_water", high_water)
+    if not synced_from or window_start < synced_from:
+        _set_sync_state(conn, "synced_from", window_start)
+    conn.commit()
+    return received
+
+
+def _refresh_read_flags(
+    conn: sqlite3.Connection,
+    since: str,
+    until: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+):
+    """Re-fetch headers for stored unread messages received in [since, until), 10 IDs per call."""
+    ids = [r["message_id"] for r in conn.execute(
+        "SELECT message_id FROM messages WHERE read = 0 AND receive_date >= ? AND receive_date < ?", (since, until),
+    )]
+    batches = [ids[i:i + MESSAGE_BODY_BATCH] for i in range(0, len(ids), MESSAGE_BODY_BATCH)]
+
+    def fetch(batch: list[str]) -> str:
+        ids_xml = "".join(f"<MessageID>{_escape_xml(mid)}</MessageID>" for mid in batch)
+        body = f"""
+  <MessageIDs>{ids_xml}</MessageIDs>
+  <DetailLevel>ReturnHeaders</DetailLevel>"""
+        return trading_api_call("GetMyMessages", body, auth_token, sandbox, site_id)
+
+    updates = []
+    for result in _run_concurrently(fetch, batches):
+        updates += [(h["read"], h["message_id"]) for h in _parse_message_headers(result)]
+    conn.executemany("UPDATE messages SET read = ? WHERE message_id = ?", updates)
+
+
+def fetch_message_bodies(
+    message_ids: list[str],
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    conn: sqlite3.Connection | None = None,
+) -> dict[str, str]:
+    """Fetch bodies for the given messages in batches of 10, concurrently, and store them."""
+    conn = conn or open_message_store()
+    batches = [
+        message_ids[i:i + MESSAGE_BODY_BATCH]
+        for i in range(0, len(message_ids), MESSAGE_BODY_BATCH)
+    ]
+
+    def fetch(batch: list[str]) -> str:
+        ids_xml = "".join(f"<MessageID>{_escape_xml(mid)}</MessageID>" for mid in batch)
+        body = f"""
+  <MessageIDs>{ids_xml}</MessageIDs>
+  <DetailLevel>ReturnMessages</DetailLevel>"""
+        return trading_api_call("GetMyMessages", body, auth_token, sandbox, site_id)
+
+    bodies = {}
+    for result in _run_concurrently(fetch, batches):
+        for block in re.finditer(r"<Message>(.*?)</Message>", result, re.DOTALL):
+            c = block.group(1)
+            message_id = _extract_xml_value(c, "MessageID")
+            if message_id:
+                bodies[message_id] = _extract_xml_value(c, "Text")
+
+    conn.executemany(
+        "UPDATE messages SET body = ? WHERE message_id = ?",
+        [(text, mid) for mid, text in bodies.items()],
+    )
+    conn.commit()
+    return bodies
+
+
+def query_messages(
+    conn: sqlite3.Connection,
+    days: int = 14,
+    unread_only: bool = False,
+    search: str = "",
+) -> list[dict]:
+    """Read messages from the local store, newest first."""
+    since = _ebay_time(datetime.now(timezone.utc) - timedelta(days=days))
+    sql = "SELECT * FROM messages WHERE receive_date >= ?"
+    params: list = [since]
+    if unread_only:
+        sql += " AND read = 0"
+    if search:
+        sql += " AND (subject LIKE ? OR sender LIKE ? OR item_title LIKE ? OR body LIKE ?)"
+        params += [f"%{search}%"] * 4
+    sql += " ORDER BY receive_date DESC"
+    return [dict(row) for row in conn.execute(sql, params)]
+
+
+def _html_to_text(html: str) -> str:
+    text = re.sub(r"<br\s*/?>|</p>|</div>", "\n", html, flags=re.IGNORECASE)
+    text = re.sub(r"<[^>]+>", "", text)
+    for entity, char in (("&nbsp;", " "), ("&lt;", "<"), ("&gt;", ">"), ("&quot;", '"'), ("&#39;", "'"), ("&amp;", "&")):
+        text = text.replace(entity, char)
+    return re.sub(r"\n\s*\n+", "\n", text).strip()
+
+
+# --- Sales history warehouse ---
+
+SALES_WINDOW_DAYS = 30  # GetSellerTransactions accepts at most a 30-day ModTime window
+SALES_BACKFILL_DAYS = 90  # eBay only returns transactions from the last 90 days
+
+
+def open_sales_store() -> sqlite3.Connection:
+    """Open (and create if needed) the local sold-transaction warehouse."""
+    conn = sqlite3.connect(_state_path("sales.db"))
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS sales (
+            transaction_key TEXT PRIMARY KEY,
+            item_id TEXT,
+            transaction_id TEXT,
+            order_id TEXT,
+            title TEXT,
+            category_id TEXT,
+            quantity INTEGER,
+            price REAL,
+            currency TEXT,
+            start_price REAL,
+            listed_at TEXT,
+            sold_at TEXT,
+            buyer TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sales_sold_at ON sales(sold_at);
+        CREATE INDEX IF NOT EXISTS idx_sales_category ON sales(category_id, price);
+        CREATE TABLE IF NOT EXISTS shipments (
+            order_id TEXT,
+            carrier TEXT,
+            tracking TEXT,
+            uploaded_at TEXT,
+            PRIMARY KEY (order_id, tracking)
+        );
+        CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT);
+    """)
+    return conn
+
+
+def _parse_seller_transactions(xml_text: str) -> list[dict]:
+    rows = []
+    for block in re.finditer(r"<Transaction>(.*?)</Transaction>", xml_text, re.DOTALL):
+        c = block.group(1)
+        item_xml = _extract_xml_value(c, "Item")
+        item_id = _extract_xml_value(item_xml, "ItemID") or _extract_xml_value(c, "ItemID")
+        transaction_id = _extract_xml_value(c, "TransactionID")
+        if not item_id:
+            continue
+        category_xml = _extract_xml_value(item_xml, "PrimaryCategory")
+        currency = re.search(r'<TransactionPrice currencyID="(\w+)"', c)
+        rows.append({
+            "transaction_key": f"{item_id}-{transaction_id}",
+            "item_id": item_id,
+            "transaction_id": transaction_id,
+            "order_id": _extract_xml_value(c, "OrderID") or _extract_xml_value(c, "OrderLineItemID"),
+            "title": _extract_xml_value(item_xml, "Title"),
+            "category_id": _extract_xml_value(category_xml, "CategoryID"),
+            "quantity": int(_extract_xml_value(c, "QuantityPurchased") or "1"),
+            "price": _xml_float(c, "TransactionPrice"),
+            "currency": currency.group(1) if currency else "",
+            "start_price": _xml_float(item_xml, "StartPrice"),
+            "listed_at": _extract_xml_value(item_xml, "StartTime"),
+            "sold_at": _extract_xml_value(c, "CreatedDate"),
+            "buyer": _extract_xml_value(_extract_xml_value(c, "Buyer"), "UserID"),
+        })
+    return rows
+
+
+def sync_sales(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    days: int = SALES_BACKFILL_DAYS,
+    conn: sqlite3.Connection | None = None,
+) -> int:
+    """Page GetSellerTransactions into the warehouse. Returns the number of rows received.
+
+    Resumes from the end of the last synced window; the first run backfills `days`.
+    """
+    conn = conn or open_sales_store()
+    now = datetime.now(timezone.utc)
+    synced_to = _get_sync_state(conn, "synced_to")
+    if synced_to:
+        start = datetime.strptime(synced_to, "%Y-%m-%dT%H:%M:%S.000Z").replace(tzinfo=timezone.utc)
+        oldest = now - timedelta(days=SALES_BACKFILL_DAYS)
+        if start < oldest:
+            print(
+                f"Warning: last sync reached {start:%Y-%m-%d}, but eBay only returns the last {SALES_BACKFILL_DAYS} days; "
+                f"sales from {start:%Y-%m-%d} to {oldest:%Y-%m-%d} can't be recovered.",
+                file=sys.stderr,
+            )
+            start = oldest
+    else:
+        start = now - timedelta(days=days)
+
+    received = 0
+    while start < now:
+        end = min(start + timedelta(days=SALES_WINDOW_DAYS), now)
+        page = 1
+        while True:
+            body = f"""
+  <ModTimeFrom>{_ebay_time(start)}</ModTimeFrom>
+  <ModTimeTo>{_ebay_time(end)}</ModTimeTo>
+  <DetailLevel>ReturnAll</DetailLevel>
+  <Pagination><EntriesPerPage>200</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>"""
+            result = trading_api_call("GetSellerTransactions", body, auth_token, sandbox, site_id)
+            rows = _parse_seller_transactions(result)
+            conn.executemany(
+                """INSERT OR REPLACE INTO sales VALUES (
+                    :transaction_key, :item_id, :transaction_id, :order_id, :title, :category_id,
+                    :quantity, :price, :currency, :start_price, :listed_at, :sold_at, :buyer)""",
+                rows,
+            )
+            received += len(rows)
+            total_pages = int(_extract_xml_value(result, "TotalNumberOfPages") or "1")
+            if page >= total_pages:
+                break
+            page += 1
+        _set_sync_state(conn, "synced_to", _ebay_time(end))
+        conn.commit()
+        start = end
+    return received
+
+
+def sync_account_sales(account: str, days: int = SALES_BACKFILL_DAYS) -> dict:
+    """Run sales sync for one account (for --account all); errors as in collect_dashboard."""
+    try:
+        with use_account(account):
+            env = get_env()
+            if env.get("mode") != "authnauth":
+                return {"account": account, "error": "sales sync requires Auth'n'Auth token."}
+            return {"account": account, "synced": sync_sales(env["auth_token"], env["sandbox"], "15", days=days)}
+    except (EbayApiError, requests.RequestException) as e:
+        return {"account": account, "error": str(e)}
+
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def sales_monthly_revenue(conn: sqlite3.Connection) -> list[dict]:
+    rows = conn.execute("""
+        SELECT substr(sold_at, 1, 7) AS month,
+               COUNT(*) AS sales,
+               SUM(quantity) AS units,
+               ROUND(SUM(price * quantity), 2) AS revenue
+        FROM sales GROUP BY month ORDER BY month""")
+    return [dict(r) for r in rows]
+
+
+def sales_by_category(conn: sqlite3.Connection) -> list[dict]:
+    rows = conn.execute("""
+        SELECT category_id,
+               COUNT(*) AS sales,
+               ROUND(SUM(price * quantity), 2) AS revenue,
+               ROUND(AVG(price), 2) AS avg_price
+        FROM sales GROUP BY category_id ORDER BY revenue DESC""")
+    return [dict(r) for r in rows]
+
+
+def sales_percentiles(
+    conn: sqlite3.Connection,
+    category_id: str = "",
+    quantiles: tuple = (25, 50, 75, 90),
+) -> list[dict]:
+    """Per-category price, days-to-sell and realised/start-price percentiles."""
+    sql = """
+        SELECT category_id, price,
+               julianday(sold_at) - julianday(listed_at) AS days_to_sell,
+               price / NULLIF(start_price, 0) AS realised
+        FROM sales"""
+    params: tuple = ()
+    if category_id:
+        sql += " WHERE category_id = ?"
+        params = (category_id,)
+    sql += " ORDER BY category_id"
+
+    groups: dict[str, dict[str, list]] = {}
+    for row in conn.execute(sql, params):
+        g = groups.setdefault(row["category_id"], {"price": [], "days_to_sell": [], "realised": []})
+        for key in g:
+            if row[key] is not None:
+                g[key].append(row[key])
+
+    results = []
+    for cat, g in groups.items():
+        entry = {"category_id": cat, "sales": len(g["price"])}
+        for key, values in g.items():
+            values.sort()
+            for q in quantiles:
+                value = _percentile(values, q)
+                entry[f"{key}_p{q}"] = round(value, 2) if value is not None else None
+        results.append(entry)
+    return results
+
+
+# --- Shipment upload ---
+
+SOLD_LIST_MAX_DAYS = 60  # GetMyeBaySelling's SoldList reaches back at most 60 days
+
+
+def fetch_sold_orders(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    days: int = SOLD_LIST_MAX_DAYS,
+) -> list[dict]:
+    """Every sold line item from GetMyeBaySelling's SoldList, following pagination."""
+    sold = []
+    page = 1
+    while True:
+        body = f"""
+  <ActiveList><Include>false</Include></ActiveList>
+  <SoldList>
+    <Include>true</Include>
+    <DurationInDays>{days}</DurationInDays>
+    <Pagination><EntriesPerPage>200</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>
+  </SoldList>
+  <DetailLevel>ReturnAll</DetailLevel>"""
+        result = trading_api_call("GetMyeBaySelling", body, auth_token, sandbox, site_id)
+        sold += _parse_sold_list(result)
+        sold_block = re.search(r"<SoldList>(.*?)</SoldList>", result, re.DOTALL)
+        total_pages = int(_extract_xml_value(sold_block.group(1) if sold_block else "", "TotalNumberOfPages") or "1")
+        if page >= total_pages:
+            return sold
+        page += 1
+
+
+_SHIPMENT_COLUMNS = {
+    "order_id": ("order_id", "orderid", "order", "order_line_item_id"),
+    "carrier": ("carrier", "shipping_carrier", "carrier_used"),
+    "tracking": ("tracking", "tracking_number", "tracking_no"),
+}
+
+
+def load_shipments_csv(csv_path: str) -> list[dict]:
+    """Read order_id, carrier, tracking rows (common header spellings accepted)."""
+    with open(csv_path, newline="") as f:
+        reader = csv.DictReader(f)
+        headers = {h.strip().lower().replace(" ", "_"): h for h in reader.fieldnames or []}
+        columns = {}
+        for field, aliases in _SHIPMENT_COLUMNS.items():
+            found = next((headers[a] for a in aliases if a in headers), None)
+            if not found:
+                raise EbayApiError(f"{csv_path}: missing a {field} column (one of: {', '.join(aliases)})")
+            columns[field] = found
+        return [
+            {field: (row[col] or "").strip() for field, col in columns.items()}
+            for row in reader
+            if (row[columns["order_id"]] or "").strip()
+        ]
+
+
+def match_shipments(
+    rows: list[dict],
+    sold: list[dict],
+    conn: sqlite3.Connection,
+) -> list[dict]:
+    """Attach item_id / transaction_id to each row from the SoldList, falling back to the sales warehouse.
+
+    A row's order ID matches either one line item (OrderLineItemID, or ITEM-TRANSACTION)
+    or a whole order's OrderID. An order match sets "order", so every line of a
+    combined order is marked shipped by a single CompleteSale.
+    """
+    lines, orders = {}, {}
+    for s in sold:
+        lines[s["order_id"]] = s
+        lines[f"{s['item_id']}-{s['transaction_id']}"] = s
+        if s.get("order"):
+            orders.setdefault(s["order"], []).append(s)
+    matched = []
+    for row in rows:
+        key = row["order_id"]
+        if key in lines:
+            sale = lines[key]
+            match = {"item_id": sale["item_id"], "transaction_id": sale["transaction_id"], "shipped": sale["shipped"]}
+        elif key in orders:
+            group = orders[key]
+            match = {"order": key, "item_id": group[0]["item_id"], "transaction_id": "",
+                     "shipped": all(s["shipped"] for s in group)}
+        else:
+            stored = conn.execute(
+                "SELECT item_id, transaction_id, transaction_key FROM sales WHERE transaction_key = ? OR order_id = ? "
+                "ORDER BY transaction_key = ? DESC LIMIT 1",
+                (key, key, key),
+            ).fetchone()
+            if stored is None:
+                match = {}
+            elif stored["transaction_key"] == key:
+                match = {"item_id": stored["item_id"], "transaction_id": stored["transaction_id"], "shipped": False}
+            else:
+                match = {"order": key, "item_id": stored["item_id"], "transaction_id": "", "shipped": False}
+        matched.append({**row, **match})
+    return matched
+
+
+def complete_sale(
+    entry: dict,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+):
+    """Mark one sold line item, or a whole order, shipped with its tracking number (CompleteSale)."""
+    if entry.get("order"):
+        target = f"<OrderID>{_escape_xml(entry['order'])}</OrderID>"
+    else:
+        target = f"""<ItemID>{_escape_xml(entry['item_id'])}</ItemID>
+  <TransactionID>{_escape_xml(entry['transaction_id'])}</TransactionID>"""
+    body = f"""
+  {target}
+  <Shipped>true</Shipped>
+  <Shipment>
+    <ShipmentTrackingDetails>
+      <ShippingCarrierUsed>{_escape_xml(entry['carrier'])}</ShippingCarrierUsed>
+      <ShipmentTrackingNumber>{_escape_xml(entry['tracking'])}</ShipmentTrackingNumber>
+    </ShipmentTrackingDetails>
+  </Shipment>"""
+    result = trading_api_call("CompleteSale", body, auth_token, sandbox, site_id)
+    if _extract_xml_value(result, "Ack") not in ("Success", "Warning"):
+        error = _extract_xml_value(result, "LongMessage") or _extract_xml_value(result, "ShortMessage")
+        raise EbayApiError(error or "CompleteSale failed")
+
+
+def ship_batch(
+    csv_path: str,
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    force: bool = False,
+) -> list[dict]:
+    """Upload tracking for every row in the CSV. Returns one result per row, in file order.
+
+    Each row ends up with a status of uploaded, skipped, unmatched or failed.
+    Uploaded tracking numbers are kept in a ledger (the shipments table in
+    sales.db, one row per order and tracking number, so split shipments are
+    tracked separately) and committed as each upload succeeds, so re-running the
+    same file only retries what didn't go through. Orders eBay already shows as
+    shipped are skipped unless force is set, or the ledger shows we shipped part
+    of them.
+    """
+    rows = load_shipments_csv(csv_path)
+    conn = open_sales_store()
+    ledger = {(r["order_id"], r["tracking"]) for r in conn.execute("SELECT order_id, tracking FROM shipments")}
+    ours = {order_id for order_id, _ in ledger}
+    pending = [(n, r) for n, r in enumerate(rows) if (r["order_id"], r["tracking"]) not in ledger]
+    sold = fetch_sold_orders(auth_token, sandbox, site_id) if pending else []
+    results = {}
+    to_send = []
+    for (n, _), entry in zip(pending, match_shipments([r for _, r in pending], sold, conn)):
+        if not entry.get("item_id"):
+            results[n] = {**entry, "status": "unmatched", "detail": "not found in sold orders"}
+        elif entry["shipped"] and not force and entry["order_id"] not in ours:
+            results[n] = {**entry, "status": "skipped", "detail": "already marked shipped on eBay"}
+        else:
+            to_send.append((n, entry))
+
+    def send(task: tuple[int, dict]) -> tuple[int, dict]:
+        n, entry = task
+        try:
+            complete_sale(entry, auth_token, sandbox, site_id)
+        except (EbayApiError, requests.RequestException) as e:
+            return n, {**entry, "status": "failed", "detail": str(e).splitlines()[0]}
+        count_event("orders_shipped")
+        return n, {**entry, "status": "uploaded", "detail": f"{entry['carrier']} {entry['tracking']}"}
+
+    uploaded_at = _ebay_time(datetime.now(timezone.utc))
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for n, result in _iter_results(_submit_all(pool, send, to_send)):
+            results[n] = result
+            if result["status"] == "uploaded":
+                # Committed one by one: if the run dies later, what eBay already has stays recorded
+                conn.execute(
+                    "INSERT OR REPLACE INTO shipments VALUES (?, ?, ?, ?)",
+                    (result["order_id"], result["carrier"], result["tracking"], uploaded_at),
+                )
+                conn.commit()
+    return [results.get(n) or {**r, "status": "skipped", "detail": "already uploaded"} for n, r in enumerate(rows)]
+
+
+# --- Bulk end / relist ---
+
+END_ITEMS_BATCH = 10  # EndItems accepts at most 10 EndItemRequestContainers per call
+ENDING_REASONS = ["NotAvailable", "Incorrect", "LostOrBroken", "OtherListingError", "SellToHighBidder", "Sold"]
+
+
+def read_item_ids(path: str) -> list[str]:
+    """Item IDs from a file: the first field of each line, skipping blanks and # comments."""
+    ids = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item_id = re.split(r"[,\s]", line, 1)[0]
+            if item_id.isdigit() and item_id not in ids:
+                ids.append(item_id)
+    return ids
+
+
+def listing_matches(item: dict, filters: dict, now: datetime | None = None) -> bool:
+    """Check a get_item_details() dict against filters.
+
+    Supported keys: older_than_days, min_watchers, max_watchers, min_price,
+    max_price, title (substring) and category_id.
+    """
+    if "error" in item:
+        return False
+    if filters.get("older_than_days") is not None:
+        age = _listing_age_days(item, now or datetime.now(timezone.utc))
+        if age is None or age < filters["older_than_days"]:
+            return False
+    if filters.get("max_watchers") is not None and item["watchers"] > filters["max_watchers"]:
+        return False
+    if filters.get("min_watchers") is not None and item["watchers"] < filters["min_watchers"]:
+        return False
+    if filters.get("min_price") is not None and (item["price"] or 0) < filters["min_price"]:
+        return False
+    if filters.get("max_price") is not None and (item["price"] or 0) > filters["max_price"]:
+        return False
+    if filters.get("title") and filters["title"].lower() not in item["title"].lower():
+        return False
+    if filters.get("category_id") and item["category_id"] != filters["category_id"]:
+        return False
+    return True
+
+
+def fetch_unsold_item_ids(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    days: int = SOLD_LIST_MAX_DAYS,
+) -> list[str]:
+    """IDs of listings that ended without selling (GetMyeBaySelling UnsoldList), following pagination."""
+    ids = []
+    page = 1
+    while True:
+        body = f"""
+  <ActiveList><Include>false</Include></ActiveList>
+  <UnsoldList>
+    <Include>true</Include>
+    <DurationInDays>{days}</DurationInDays>
+    <Pagination><EntriesPerPage>200</EntriesPerPage><PageNumber>{page}</PageNumber></Pagination>
+  </UnsoldList>
+  <DetailLevel>ReturnAll</DetailLevel>"""
+        result = trading_api_call("GetMyeBaySelling", body, auth_token, sandbox, site_id)
+        block = re.search(r"<UnsoldList>(.*?)</UnsoldList>", result, re.DOTALL)
+        block_xml = block.group(1) if block else ""
+        for m in re.finditer(r"<ItemID>(\d+)</ItemID>", block_xml):
+            if m.group(1) not in ids:
+                ids.append(m.group(1))
+        if page >= int(_extract_xml_value(block_xml, "TotalNumberOfPages") or "1"):
+            return ids
+        page += 1
+
+
+def select_listings(
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    filters: dict | None = None,
+    unsold: bool = False,
+) -> list[dict]:
+    """Active listings (or, with unsold=True, recently ended unsold ones) matching the filters."""
+    if unsold:
+        ids = fetch_unsold_item_ids(auth_token, sandbox, site_id)
+        items = _run_concurrently(lambda i: get_item_details(i, auth_token, sandbox, site_id), ids)
+    else:
+        items = iter_active_listings(auth_token, sandbox, site_id)
+    now = datetime.now(timezone.utc)
+    return [i for i in items if listing_matches(i, filters or {}, now)]
+
+
+def end_items(
+    item_ids: list[str],
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    reason: str = "NotAvailable",
+) -> list[dict]:
+    """End listings with EndItems, 10 per call, calls in parallel. One result per item, in order."""
+    batches = [item_ids[i:i + END_ITEMS_BATCH] for i in range(0, len(item_ids), END_ITEMS_BATCH)]
+
+    def end_batch(batch: list[str]) -> list[dict]:
+        containers = "".join(
+            f"""
+  <EndItemRequestContainer>
+    <MessageID>{n}</MessageID>
+    <ItemID>{_escape_xml(item_id)}</ItemID>
+    <EndingReason>{reason}</EndingReason>
+  </EndItemRequestContainer>"""
+            for n, item_id in enumerate(batch)
+        )
+        try:
+            result = trading_api_call("EndItems", containers, auth_token, sandbox, site_id)
+        except (EbayApiError, requests.RequestException) as e:
+            return [{"item_id": i, "error": str(e).splitlines()[0]} for i in batch]
+        # Success/Warning means every item ended; only PartialFailure/Failure carry per-item errors
+        all_ended = _extract_xml_value(result, "Ack") in ("Success", "Warning")
+        outcomes = {}
+        for block in re.finditer(r"<EndItemResponseContainer>(.*?)</EndItemResponseContainer>", result, re.DOTALL):
+            c = block.group(1)
+            n = _extract_xml_value(c, "CorrelationID")
+            if n.isdigit() and int(n) < len(batch):
+                errors = [] if all_ended else [
+                    e for e in re.findall(r"<Errors>(.*?)</Errors>", c, re.DOTALL)
+                    if _extract_xml_value(e, "SeverityCode") != "Warning"
+                ]
+                error = errors and (_extract_xml_value(errors[0], "LongMessage") or _extract_xml_value(errors[0], "ShortMessage"))
+                outcomes[batch[int(n)]] = {"error": error} if error else {"end_time": _extract_xml_value(c, "EndTime")}
+        fallback = _extract_xml_value(result, "LongMessage") or "no response for this item"
+        return [{"item_id": i, **outcomes.get(i, {"error": fallback})} for i in batch]
+
+    results = [r for batch in _run_concurrently(end_batch, batches) for r in batch]
+    count_event("listings_ended", sum("error" not in r for r in results))
+    return results
+
+
+def relist_items(
+    item_ids: list[str],
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    price: float | None = None,
+    quantity: int | None = None,
+    currency: str = "",
+) -> list[dict]:
+    """Relist ended listings with RelistFixedPriceItem, concurrently, optionally at a new price/quantity.
+
+    A new price is in `currency`, by default the site's own.
+    """
+    overrides = ""
+    if price is not None:
+        currency = currency or SITE_CURRENCY.get(_marketplace_for_site(site_id), "USD")
+        overrides += f'\n    <StartPrice currencyID="{_escape_xml(currency)}">{price:.2f}</StartPrice>'
+    if quantity is not None:
+        overrides += f"\n    <Quantity>{quantity}</Quantity>"
+
+    def relist(item_id: str) -> dict:
+        body = f"""
+  <Item>
+    <ItemID>{_escape_xml(item_id)}</ItemID>{overrides}
+  </Item>"""
+        try:
+            result = trading_api_call("RelistFixedPriceItem", body, auth_token, sandbox, site_id)
+        except (EbayApiError, requests.RequestException) as e:
+            return {"item_id": item_id, "error": str(e).splitlines()[0]}
+        if _extract_xml_value(result, "Ack") not in ("Success", "Warning"):
+            return {"item_id": item_id, "error": _extract_xml_value(result, "LongMessage") or "relist failed"}
+        return {"item_id": item_id, "new_item_id": _extract_xml_value(result, "ItemID")}
+
+    results = _run_concurrently(relist, item_ids)
+    count_event("listings_relisted", sum("error" not in r for r in results))
+    return results
+
+
+# --- Repricing ---
+
+# A rule file is a JSON list of rules; the first rule whose "when" matches a
+# listing decides its new values. Example:
+#   [{"name": "stale", "when": {"older_than_days": 30, "max_watchers": 0},
+#     "price_pct": -5, "floor": 20, "round_to": 0.05,
+#     "best_offer_min_pct": 70, "best_offer_auto_accept_pct": 90}]
+REPRICE_CONDITIONS = {"older_than_days", "max_watchers", "min_watchers", "title", "category_id", "min_price", "max_price"}
+REPRICE_ACTIONS = {"price_pct", "price_delta", "floor", "round_to", "best_offer_min_pct", "best_offer_auto_accept_pct"}
+
+
+def load_reprice_rules(path: str) -> list[dict]:
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, list):
+        raise EbayApiError(f"{path}: expected a JSON list of rules")
+    for n, rule in enumerate(rules, 1):
+        label = rule.get("name") or f"rule {n}"
+        unknown = set(rule.get("when", {})) - REPRICE_CONDITIONS
+        unknown |= set(rule) - REPRICE_ACTIONS - {"name", "when"}
+        if unknown:
+            raise EbayApiError(f"{path}: {label} has unknown keys: {', '.join(sorted(unknown))}")
+        rule.setdefault("name", label)
+    return rules
+
+
+def _round_price(value: float, step: float | None) -> float:
+    if step:
+        value = round(value / step) * step
+    return round(value, 2)
+
+
+def plan_reprice(item: dict, rules: list[dict], now: datetime | None = None) -> dict | None:
+    """New price / best-offer values for one listing, or None if no rule matches.
+
+    The returned plan's "changes" holds only the values that differ from the
+    listing; "error" is set when the result would be rejected by eBay, and
+    "skipped" when the listing is already priced below the rule's floor.
+    Best-offer values are only planned for listings that have best offer on.
+    """
+    rule = next((r for r in rules if listing_matches(item, r.get("when", {}), now)), None)
+    if rule is None:
+        return None
+    old_price = item["price"] or 0
+    floor = rule.get("floor", 0)
+    current = {
+        "price": old_price,
+        "best_offer_min": item.get("best_offer_min"),
+        "best_offer_auto_accept": item.get("best_offer_auto_accept"),
+    }
+    plan = {
+        "item_id": item["item_id"],
+        "title": item.get("title", ""),
+        "currency": item.get("currency", ""),
+        "rule": rule["name"],
+        "old": current,
+        "new": current,
+        "changes": {},
+    }
+    if old_price < floor:
+        # Priced under the floor by hand: the floor only limits cuts, it never raises a price
+        return {**plan, "skipped": f"price {old_price:.2f} is below the floor {floor:.2f}"}
+
+    new_price = old_price * (1 + rule.get("price_pct", 0) / 100) + rule.get("price_delta", 0)
+    new_price = max(_round_price(new_price, rule.get("round_to")), floor)
+    target = dict(current, price=new_price)
+    if item.get("best_offer_enabled"):
+        if "best_offer_min_pct" in rule:
+            target["best_offer_min"] = _round_price(new_price * rule["best_offer_min_pct"] / 100, rule.get("round_to"))
+        if "best_offer_auto_accept_pct" in rule:
+            target["best_offer_auto_accept"] = _round_price(new_price * rule["best_offer_auto_accept_pct"] / 100, rule.get("round_to"))
+    plan.update(new=target, changes={k: v for k, v in target.items() if v != current[k]})
+
+    auto_accept, minimum = target["best_offer_auto_accept"], target["best_offer_min"]
+    if new_price <= 0:
+        plan["error"] = f"new price {new_price} must be above zero (set a floor)"
+    elif auto_accept is not None and auto_accept >= new_price:
+        plan["error"] = f"auto-accept {auto_accept} must be below the price {new_price}"
+    elif minimum is not None and minimum >= new_price:
+        plan["error"] = f"best-offer minimum {minimum} must be below the price {new_price}"
+    elif minimum is not None and auto_accept is not None and minimum >= auto_accept:
+        plan["error"] = f"best-offer minimum {minimum} must be below auto-accept {auto_accept}"
+    return plan
+
+
+def reprice_listings(
+    rules: list[dict],
+    auth_token: str,
+    sandbox: bool = False,
+    site_id: str = "15",
+    dry_run: bool = False,
+) -> list[dict]:
+    """Evaluate the rules over all active listings and revise the ones whose values change.
+
+    Returns every matched plan; pushed plans carry "revised": True or an "error".
+    """
+    now = datetime.now(timezone.utc)
+    plans = [
+        p for p in (plan_reprice(i, rules, now) for i in iter_active_listings(auth_token, sandbox, site_id) if "error" not in i)
+        if p is not None
+    ]
+    if dry_run:
+        return plans
+
+    def push(plan: dict) -> dict:
+        changes = plan["changes"]
+        save_snapshot(plan["item_id"], plan["old"])  # the live values just fetched are the truth
+        try:
+            revise_fixed_price_item(
+                plan["item_id"], auth_token, sandbox, site_id,
+                price=changes.get("price"),
+                best_offer_min=changes.get("best_offer_min"),
+                best_offer_auto_accept=changes.get("best_offer_auto_accept"),
+                currency=plan["currency"] or "AUD",
+            )
+        except (EbayApiError, requests.RequestException) as e:
+            return {**plan, "error": str(e).splitlines()[-1]}
+        return {**plan, "revised": True}
+
+    to_push = [p for p in plans if p["changes"] and "error" not in p]
+    pushed = {p["item_id"]: p for p in _run_concurrently(push, to_push)}
+    return [pushed.get(p["item_id"], p) for p in plans]
+
+
+# --- Platform Notifications ---
+
+# ItemSold fires when an auction ends with a winner (TransactionID 0);
+# fixed-price sales arrive as FixedPriceTransaction.
+NOTIFICATION_EVENTS = ["ItemSold", "FixedPriceTransaction", "BestOffer", "AskSellerQuestion"]
+NOTIFICATION_MAX_AGE = 600  # eBay: reject payloads whose signed timestamp is over 10 minutes old
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+EBL_NS = "urn:ebay:apis:eBLBaseComponents"
+
+
+def notification_keys() -> dict:
+    """DevID / AppID / CertID used to sign notifications, from the account profile or env vars."""
+    name = current_account()
+    source = load_accounts().get(name, {}) if name else {
+        "dev_id": os.environ.get("EBAY_DEV_ID", ""),
+        "app_id": os.environ.get("EBAY_APP_ID") or os.environ.get("EBAY_CLIENT_ID", ""),
+        "cert_id": os.environ.get("EBAY_CERT_ID") or os.environ.get("EBAY_CLIENT_SECRET", ""),
+    }
+    keys = {k: source.get(k, "") for k in ("dev_id", "app_id", "cert_id")}
+    missing = [k for k, v in keys.items() if not v]
+    if missing:
+        raise EbayApiError(
+            f"Notification signatures need {', '.join(missing)} "
+            "(EBAY_DEV_ID, EBAY_APP_ID, EBAY_CERT_ID or the account profile)."
+        )
+    return keys
+
+
+def notification_signature(timestamp: str, keys: dict) -> str:
+    digest = hashlib.md5(f"{timestamp}{keys['dev_id']}{keys['app_id']}{keys['cert_id']}".encode()).digest()
+    return base64.b64encode(digest).decode()
+
+
+def parse_notification(stream) -> dict:
+    """Stream-parse a notification SOAP envelope.
+
+    Returns {"event", "timestamp", "signature", "fields"} where fields maps the
+    first occurrence of each element path below the response element (e.g.
+    "Item/ItemID", "BestOfferArray/BestOffer/Price") to its text. Currency
+    attributes are kept as "<path>@currencyID". Elements are discarded as soon as
+    they close, so large payloads never sit in memory as a tree.
+    """
+    note = {"event": "", "timestamp": "", "signature": "", "fields": {}}
+    path: list[str] = []
+    in_body = False
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if event == "start":
+            if in_body:
+                path.append(tag)
+            elif tag == "Body":
+                in_body = True
+            continue
+        if tag == "NotificationSignature":
+            note["signature"] = (elem.text or "").strip()
+        elif in_body and path:
+            rel = "/".join(path[1:])
+            if rel and len(elem) == 0:
+                note["fields"].setdefault(rel, (elem.text or "").strip())
+                if "currencyID" in elem.attrib:
+                    note["fields"].setdefault(f"{rel}@currencyID", elem.attrib["currencyID"])
+            path.pop()
+        elem.clear()
+    note["event"] = note["fields"].get("NotificationEventName", "")
+    note["timestamp"] = note["fields"].get("Timestamp", "")
+    return note
+
+
+def verify_notification(note: dict, keys: dict, now: datetime | None = None) -> str:
+    """Return "" if the signature and timestamp check out, else the reason to reject."""
+    if not note["timestamp"]:
+        return "missing Timestamp"
+    expected = notification_signature(note["timestamp"], keys)
+    if not hmac.compare_digest(expected, note["signature"]):
+        return "bad signature"
+    try:
+        sent = datetime.strptime(note["timestamp"][:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return f"unparseable Timestamp {note['timestamp']}"
+    if abs(((now or datetime.now(timezone.utc)) - sent).total_seconds()) > NOTIFICATION_MAX_AGE:
+        return "stale Timestamp"
+    return ""
+
+
+def _field_float(fields: dict, path: str) -> float | None:
+    try:
+        return float(fields[path])
+    except (KeyError, ValueError):
+        return None
+
+
+def apply_notification(note: dict) -> str:
+    """Fold one verified notification into the local stores. Returns a one-line summary."""
+    f = note["fields"]
+    event = note["event"]
+    item_id = f.get("Item/ItemID", "")
+
+    if event in ("ItemSold", "FixedPriceTransaction"):
+        tx = "TransactionArray/Transaction/"
+        transaction_id = f.get(f"{tx}TransactionID", "0")
+        price_path = f"{tx}TransactionPrice" if f"{tx}TransactionPrice" in f else "Item/SellingStatus/CurrentPrice"
+        row = {
+            "transaction_key": f"{item_id}-{transaction_id}",
+            "item_id": item_id,
+            "transaction_id": transaction_id,
+            "order_id": f.get(f"{tx}ContainingOrder/OrderID", ""),
+            "title": f.get("Item/Title", ""),
+            "category_id": f.get("Item/PrimaryCategory/CategoryID", ""),
+            "quantity": int(f.get(f"{tx}QuantityPurchased") or "1"),
+            "price": _field_float(f, price_path),
+            "currency": f.get(f"{price_path}@currencyID", ""),
+            "start_price": _field_float(f, "Item/StartPrice"),
+            "listed_at": f.get("Item/ListingDetails/StartTime", ""),
+            "sold_at": f.get(f"{tx}CreatedDate") or f.get("Item/ListingDetails/EndTime") or note["timestamp"],
+            "buyer": f.get(f"{tx}Buyer/UserID") or f.get("Item/SellingStatus/HighBidder/UserID", ""),
+        }
+        conn = open_sales_store()
+        with conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO sales VALUES (
+                    :transaction_key, :item_id, :transaction_id, :order_id, :title, :category_id,
+                    :quantity, :price, :currency, :start_price, :listed_at, :sold_at, :buyer)""",
+                row,
+            )
+        conn.close()
+        return f"{event}: item {item_id} sold to {row['buyer']} for {row['currency']} {row['price']}"
+
+    if event == "BestOffer":
+        bo = "BestOfferArray/BestOffer/"
+        row = {
+            "offer_id": f.get(f"{bo}BestOfferID", ""),
+            "item_id": item_id,
+            "item_title": f.get("Item/Title", ""),
+            "buyer": f.get(f"{bo}Buyer/UserID", ""),
+            "price": _field_float(f, f"{bo}Price"),
+            "currency": f.get(f"{bo}Price@currencyID", ""),
+            "quantity": int(f.get(f"{bo}Quantity") or "1"),
+            "message": f.get(f"{bo}BuyerMessage", ""),
+            "status": f.get(f"{bo}Status", "Pending"),
+            "expires_at": f.get(f"{bo}ExpirationTime", ""),
+            "received_at": note["timestamp"],
+        }
+        conn = open_offer_store()
+        with conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO offers VALUES (
+                    :offer_id, :item_id, :item_title, :buyer, :price, :currency, :quantity,
+                    :message, :status, :expires_at, :received_at)""",
+                row,
+            )
+        conn.close()
+        return f"BestOffer: {row['currency']} {row['price']} from {row['buyer']} on item {item_id}"
+
+    if event == "AskSellerQuestion":
+        ex = "MemberMessage/MemberMessageExchange/"
+        row = {
+            "message_id": f.get(f"{ex}Question/MessageID", ""),
+            "sender": f.get(f"{ex}Question/SenderID", ""),
+            "subject": f.get(f"{ex}Question/Subject", ""),
+            "receive_date": f.get(f"{ex}CreationDate") or note["timestamp"],
+            "item_id": f.get(f"{ex}Item/ItemID", ""),
+            "item_title": f.get(f"{ex}Item/Title", ""),
+            "body": f.get(f"{ex}Question/Body", ""),
+        }
+        # The high-water mark is left alone so the next sync still fills any gaps
+        conn = open_message_store()
+        with conn:
+            conn.execute(
+                """INSERT INTO messages (message_id, sender, subject, receive_date, read, item_id, item_title, body)
+                   VALUES (:message_id, :sender, :subject, :receive_date, 0, :item_id, :item_title, :body)
+                   ON CONFLICT(message_id) DO NOTHING""",
+                row,
+            )
+        conn.close()
+        return f"AskSellerQuestion: {row['sender']} on item {row['item_id']}: {row['subject']}"
+
+    return f"{event or 'unknown event'}: ignored"
+
+
+class _BoundedReader:
+    """File-like view of the first `remaining` bytes of a request body."""
+
+    def __init__(self, raw, remaining: int):
+        self.raw = raw
+        self.remaining = remaining
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.raw.read(size)
+        self.remaining -= len(data)
+        return data
+
+
+def make_notification_server(
+    host: str = "0.0.0.0",
+    port: int = 8443,
+    certfile: str = "",
+    keyfile: str = "",
+    keys: dict | None = None,
+    on_event=print,
+) -> http.server.ThreadingHTTPServer:
+    """Build the notification receiver. Each POST is verified, parsed and applied on its own thread."""
+    account = current_account()
+    keys = keys or notification_keys()
+
+    class NotificationHandler(http.server.BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            with use_account(account):
+                try:
+                    note = parse_notification(_BoundedReader(self.rfile, length))
+                except ET.ParseError as e:
+                    self._reply(400, f"malformed payload: {e}")
+                    return
+                problem = verify_notification(note, keys)
+                if problem:
+                    self._reply(403, problem)
+                    on_event(f"Rejected {note['event'] or 'notification'}: {problem}")
+                    return
+                on_event(apply_notification(note))
+            self._reply(200, "OK")
+
+        def _reply(self, status: int, text: str):
+            self.send_response(status)
+            self.send_header("Content-Type", "text/plain")
+            self.end_headers()
+            self.wfile.write(text.encode())
+
+        def log_message(self, format, *args):
+            pass  # Suppress server logs
+
+    server = http.server.ThreadingHTTPServer((host, port), NotificationHandler)
+    server.daemon_threads = True
+    if certfile:
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(certfile, keyfile or None)
+        server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    return server
+
+
+def subscribe_notifications(
+    url: str,
+    auth_token: str,
+    sandbox: bool = False,
+    events: list[str] | None = None,
+    enable: bool = True,
+) -> str:
+    """Point the application's Platform Notifications at `url` and enable events for this user."""
+    state = "Enable" if enable else "Disable"
+    prefs = "".join(
+        f"<NotificationEnable><EventType>{e}</EventType><EventEnable>{state}</EventEnable></NotificationEnable>"
+        for e in (events or NOTIFICATION_EVENTS)
+    )
+    body = f"""
+  <ApplicationDeliveryPreferences>
+    <ApplicationURL>{_escape_xml(url)}</ApplicationURL>
+    <ApplicationEnable>{state}</ApplicationEnable>
+    <DeviceType>Platform</DeviceType>
+  </ApplicationDeliveryPreferences>
+  <UserDeliveryPreferenceArray>{prefs}</UserDeliveryPreferenceArray>"""
+    result = trading_api_call("SetNotificationPreferences", body, auth_token, sandbox)
+    ack = _extract_xml_value(result, "Ack")
+    if ack not in ("Success", "Warning"):
+        error = _extract_xml_value(result, "LongMessage") or _extract_xml_value(result, "ShortMessage")
+        raise EbayApiError(f"SetNotificationPreferences failed: {error}")
+    return ack
+
+
+# Minimal payloads for `notify send-test`, shaped like the real notifications
+_SAMPLE_NOTIFICATIONS = {
+    "ItemSold": ("GetItemResponse", """
+    <Item><ItemID>110000000001</ItemID><Title>Test auction item</Title>
+      <PrimaryCategory><CategoryID>31388</CategoryID></PrimaryCategory>
+      <StartPrice currencyID="AUD">50.0</StartPrice>
+      <ListingDetails><StartTime>2026-01-01T00:00:00.000Z</StartTime></ListingDetails>
+      <SellingStatus><CurrentPrice currencyID="AUD">75.0</CurrentPrice>
+        <HighBidder><UserID>test_buyer</UserID></HighBidder></SellingStatus></Item>"""),
+    "FixedPriceTransaction": ("GetItemTransactionsResponse", """
+    <Item><ItemID>110000000002</ItemID><Title>Test fixed price item</Title>
+      <PrimaryCategory><CategoryID>31388</CategoryID></PrimaryCategory>
+      <StartPrice currencyID="AUD">120.0</StartPrice></Item>
+    <TransactionArray><Transaction><TransactionID>900000000001</TransactionID>
+      <TransactionPrice currencyID="AUD">120.0</TransactionPrice><QuantityPurchased>1</QuantityPurchased>
+      <Buyer><UserID>test_buyer</UserID></Buyer></Transaction></TransactionArray>"""),
+    "BestOffer": ("GetBestOffersResponse", """
+    <Item><ItemID>110000000003</ItemID><Title>Test best offer item</Title></Item>
+    <BestOfferArray><BestOffer><BestOfferID>5000000001</BestOfferID>
+      <Buyer><UserID>test_buyer</UserID></Buyer><Price currencyID="AUD">85.0</Price>
+      <Quantity>1</Quantity><Status>Pending</Status><BuyerMessage>Would you take 85?</BuyerMessage>
+    </BestOffer></BestOfferArray>"""),
+    "AskSellerQuestion": ("GetMemberMessagesResponse", """
+    <MemberMessage><MemberMessageExchange>
+      <Item><ItemID>110000000004</ItemID><Title>Test question item</Title></Item>
+      <Question><MessageID>7000000001</MessageID><SenderID>test_buyer</SenderID>
+        <Subject>Is this still available?</Subject><Body>Can you post to 2000?</Body></Question>
+    </MemberMessageExchange></MemberMessage>"""),
+}
+
+
+def build_notification(event: str, keys: dict, timestamp: str = "") -> bytes:
+    """Build a signed SOAP notification envelope for one of the sample events."""
+    if event not in _SAMPLE_NOTIFICATIONS:
+        raise EbayApiError(f"No sample payload for {event}. Choose from: {', '.join(_SAMPLE_NOTIFICATIONS)}")
+    response_tag, payload = _SAMPLE_NOTIFICATIONS[event]
+    timestamp = timestamp or _ebay_time(datetime.now(timezone.utc))
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="{SOAP_ENV_NS}">
+  <soapenv:Header>
+    <ebl:RequesterCredentials soapenv:mustUnderstand="0" xmlns:ebl="{EBL_NS}">
+      <ebl:NotificationSignature>{notification_signature(timestamp, keys)}</ebl:NotificationSignature>
+    </ebl:RequesterCredentials>
+  </soapenv:Header>
+  <soapenv:Body>
+    <{response_tag} xmlns="{EBL_NS}">
+    <Timestamp>{timestamp}</Timestamp>
+    <Ack>Success</Ack>
+    <NotificationEventName>{event}</NotificationEventName>{payload}
+    </{response_tag}>
+  </soapenv:Body>
+</soapenv:Envelope>""".encode()
+
+
+def send_test_notification(url: str, event: str, keys: dict) -> int:
+    """POST a signed sample notification to a receiver, as eBay would. Returns the HTTP status."""
+    resp = _http_request(
+        "POST", url, "Notification",
+        headers={"Content-Type": "text/xml;charset=utf-8", "SOAPAction": f'"{EBL_NS}/{event}"'},
+        data=build_notification(event, keys),
+        timeout=30,
+    )
+    return resp.status_code
+
+
+# --- CLI ---
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List items on eBay via Inventory API",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+conditions: NEW, LIKE_NEW, NEW_OTHER, USED_EXCELLENT, USED_VERY_GOOD,
+  USED_GOOD, USED_ACCEPTABLE, CERTIFIED_REFURBISHED, SELLER_REFURBISHED,
+  FOR_PARTS_OR_NOT_WORKING
+
+marketplaces: US, UK, AU, CA, DE, FR, IT, ES
+
+examples:
+  ebay_list.py auth
+  ebay_list.py list --title "GoPro Hero 12" --price 299.99 --condition NEW \\
+    --image "https://example.com/photo.jpg" --category 31388
+        """,
+    )
+    parser.add_argument("--stats", action="store_true", help="Print per-call bytes sent/received after the command")
+    parser.add_argument("--record", default="", metavar="CASSETTE", help="Record all HTTP exchanges to a cassette file")
+    parser.add_argument("--replay", default="", metavar="CASSETTE", help="Answer HTTP calls from a cassette (no network)")
+    parser.add_argument("--replay-latency", default="recorded", choices=["recorded", "zero"],
+                        help="Replay with the recorded response times (default) or instantly")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS",
+                        help="Overall time budget for the command; requests time out and pending work is cancelled when it runs out")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Duplicate read-only calls that run past their p95 latency; first answer wins")
+    parser.add_argument("--metrics-textfile", default=os.environ.get("EBAY_METRICS_TEXTFILE", ""), metavar="PATH",
+                        help="After the run, write cumulative metrics as a Prometheus textfile (env: EBAY_METRICS_TEXTFILE)")
+    parser.add_argument("--profile", default="", metavar="DIR",
+                        help="Profile the command (cProfile + tracemalloc); writes pstats, collapsed stacks and allocations to DIR")
+    parser.add_argument("--account", default="",
+                        help="Named account profile from accounts.json ('all' runs dashboard / sales sync for every profile)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("auth", help="Authenticate with eBay (opens browser)")
+    sub.add_parser("refresh", help="Refresh access token")
+    sub.add_parser("accounts", help="List configured account profiles")
+    met_p = sub.add_parser("metrics", help="Show, export or reset the cumulative metrics store")
+    met_p.add_argument("action", choices=["show", "export", "reset"], nargs="?", default="show",
+                       help="show: summary table; export: Prometheus text (stdout or --textfile); reset: clear")
+    met_p.add_argument("--textfile", default="", help="With export: write to this file (atomically) instead of stdout")
+    brk_p = sub.add_parser("breakers", help="Show or reset per-endpoint circuit breakers")
+    brk_p.add_argument("--reset", nargs="?", const="*", default="", metavar="CALL",
+                       help="Close the breaker for CALL (or all breakers)")
+    dash_p = sub.add_parser("dashboard", help="Show all active/sold listings with prices and metrics")
+    msg_p = sub.add_parser("messages", help="Show recent eBay messages")
+    msg_p.add_argument("--days", type=int, default=14, help="Number of days to look back (default: 14)")
+    msg_p.add_argument("--unread", action="store_true", help="Only show unread messages")
+    msg_p.add_argument("--search", default="", help="Only show messages containing this text")
+    msg_p.add_argument("--body", action="store_true", help="Show message bodies (fetched on demand)")
+    msg_p.add_argument("--no-sync", action="store_true", help="Read the local store only, don't contact eBay")
+    msg_p.add_argument("--full", action="store_true", help="Re-sync the whole --days window (refreshes read flags)")
+
+    sales_p = sub.add_parser("sales", help="Sync and query the local sold-history warehouse")
+    sales_p.add_argument("action", choices=["sync", "monthly", "categories", "percentiles"],
+                         help="sync: pull new transactions; others: aggregate reports (offline)")
+    sales_p.add_argument("--days", type=int, default=SALES_BACKFILL_DAYS,
+                         help=f"Backfill window on first sync (default: {SALES_BACKFILL_DAYS}, eBay's maximum)")
+    sales_p.add_argument("--category", default="", help="Limit percentiles to one category ID")
+
+    offers_p = sub.add_parser("offers", help="Accept, decline or counter best offers on all active listings by rule")
+    offers_p.add_argument("--accept-pct", type=float, default=OFFER_RULE_DEFAULTS["accept_pct"],
+                          help="Accept offers at or above this %% of the listing price (default: 90)")
+    offers_p.add_argument("--decline-pct", type=float, default=OFFER_RULE_DEFAULTS["decline_pct"],
+                          help="Decline offers below this %% of the listing price (default: 60)")
+    offers_p.add_argument("--counter-pct", type=float, default=None,
+                          help="Counter offers between the thresholds at this %% (default: leave pending)")
+    offers_p.add_argument("--aged-days", type=float, default=None, help="Listings at least this many days old...")
+    offers_p.add_argument("--aged-accept-pct", type=float, default=None, help="...accept from this %% instead")
+    offers_p.add_argument("--message", default="", help="Seller response sent with each decision")
+    offers_p.add_argument("--dry-run", action="store_true", help="Show decisions without responding")
+
+    ship_p = sub.add_parser("ship-batch", help="Upload tracking numbers for sold orders from a CSV")
+    ship_p.add_argument("csv", help="CSV with order_id, carrier and tracking columns")
+    ship_p.add_argument("--force", action="store_true", help="Also send orders eBay already shows as shipped")
+
+    end_p = sub.add_parser("end-batch", help="End many listings at once (EndItems)")
+    end_p.add_argument("--reason", default="NotAvailable", choices=ENDING_REASONS, help="Ending reason (default: NotAvailable)")
+    relist_p = sub.add_parser("relist-batch", help="Relist ended unsold listings (RelistFixedPriceItem)")
+    relist_p.add_argument("--price", type=float, default=None, help="New price for every relisted item")
+    relist_p.add_argument("--quantity", type=int, default=None, help="New quantity for every relisted item")
+    for p in [end_p, relist_p]:
+        p.add_argument("--ids-file", default="", help="File of item IDs, one per line")
+        p.add_argument("--older-than", type=float, default=None, metavar="DAYS", help="Only listings started at least DAYS ago")
+        p.add_argument("--max-watchers", type=int, default=None, help="Only listings with at most this many watchers")
+        p.add_argument("--title-contains", default="", help="Only listings whose title contains this text")
+        p.add_argument("--category", default="", help="Only listings in this category ID")
+        p.add_argument("--all", action="store_true", help="Select every listing (no filter)")
+        p.add_argument("--dry-run", action="store_true", help="Show the selected listings without changing anything")
+
+    reprice_p = sub.add_parser("reprice", help="Apply a repricing rule file to all active listings")
+    reprice_p.add_argument("rules", help="JSON rule file (see SKILL.md)")
+    reprice_p.add_argument("--dry-run", action="store_true", help="Report the new prices without revising anything")
+
+    cat_p = sub.add_parser("categories", help="Search for eBay category IDs (built-in)")
+    cat_p.add_argument("query", nargs="+", help="Keywords to search (e.g. 'gimbal stabilizer')")
+
+    cls_p = sub.add_parser("classify", help="Train or query the offline category classifier")
+    cls_p.add_argument("action", choices=["train", "predict"], help="train: build model from sales history; predict: suggest categories")
+    cls_p.add_argument("title", nargs="*", help="Item title (for predict)")
+    cls_p.add_argument("--data", default="", help="Extra training CSV with title,category_id[,category_name] columns")
+    cls_p.add_argument("--top", type=int, default=5, help="Number of suggestions (default: 5)")
+
+    notify_p = sub.add_parser("notify", help="Receive eBay Platform Notifications (sales, offers, questions)")
+    notify_p.add_argument("action", choices=["serve", "subscribe", "send-test"],
+                          help="serve: run the receiver; subscribe: point eBay at it; send-test: post a signed sample")
+    notify_p.add_argument("--host", default="0.0.0.0", help="Address to listen on (default: 0.0.0.0)")
+    notify_p.add_argument("--port", type=int, default=8443, help="Port to listen on (default: 8443)")
+    notify_p.add_argument("--cert", default="", help="TLS certificate (PEM) to serve HTTPS directly")
+    notify_p.add_argument("--key", default="", help="TLS private key (PEM), if not bundled with --cert")
+    notify_p.add_argument("--url", default="", help="Public receiver URL (subscribe) or receiver to test (send-test)")
+    notify_p.add_argument("--event", action="append", dest="events", choices=NOTIFICATION_EVENTS,
+                          help="Event to subscribe to / send (repeatable, default: all)")
+    notify_p.add_argument("--disable", action="store_true", help="With subscribe: turn the events off")
+
+    fc_p = sub.add_parser("find-category", help="Search eBay site for category IDs (live API)")
+    fc_p.add_argument("query", nargs="+", help="Keywords to search (e.g. 'mobile phones')")
+    fc_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
+    fc_p.add_argument("--parent", default="", help="Parent category ID to search within")
+
+    sp_p = sub.add_parser("specifics", help="Show required item specifics for a category")
+    sp_p.add_argument("category_id", help="eBay category ID")
+    sp_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
+
+    asp_p = sub.add_parser("aspects", help="Download / query the offline item-aspects index (Taxonomy API)")
+    asp_p.add_argument("action", choices=["sync", "show"], help="sync: download and index; show: print a category's aspects")
+    asp_p.add_argument("category_id", nargs="?", default="", help="With show: category ID (omit for index info)")
+    asp_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
+    pol_p = sub.add_parser("policies", help="List your business policies (shipping, return, payment profiles)")
+    pol_p.add_argument("--marketplace", default="AU", choices=MARKETPLACES.keys(), help="Marketplace (default: AU)")
+    pol_p.add_argument("--refresh", action="store_true", help="Ignore the cached copy and fetch from eBay")
+
+    for p in [dash_p, msg_p, offers_p, ship_p, end_p, relist_p, reprice_p, cat_p, fc_p, sp_p, pol_p, asp_p]:
+        p.add_argument("--format", dest="output_format", default="table", choices=["table", "ndjson"],
+                       help="Output format: human table (default) or one JSON record per line")
+
+    verify_p = sub.add_parser("verify", help="Dry-run a listing (VerifyAddFixedPriceItem)")
+
+    list_p = sub.add_parser("list", help="Create and publish a listing")
+
+    # Add shared args to both list and verify
+    for p in [list_p, verify_p]:
+        p.add_argument("--title", required=True, help="Item title (max 80 chars)")
+        p.add_argument("--description", required=True, help="Item description (max 4000 chars)")
+        p.add_argument("--price", required=True, type=float, help="Listing price")
+        p.add_argument("--condition", required=True, choices=CONDITIONS, help="Item condition")
+        p.add_argument("--image", required=True, action="append", dest="images", help="Image URL or local file path (repeatable)")
+        p.add_argument("--quantity", type=int, default=1, help="Quantity available (default: 1)")
+        p.add_argument("--category", default="", help="eBay category ID (auto-suggested from title if omitted)")
+        p.add_argument("--marketplace", default="US", choices=MARKETPLACES.keys(), help="Marketplace (default: US)")
         p.add_argument("--currency", default="USD", help="Currency code (default: USD)")
         p.add_argument("--sku", default="", help="Unique SKU (auto-generated if omitted)")
         p.add_argument("--brand", default="", help="Brand name")
@@ -1413,6 +5493,10 @@ examples:
         p.add_argument("--no-returns", action="store_true", help="Don't accept returns")
         p.add_argument("--return-days", type=int, default=30, help="Return period in days (default: 30)")
         p.add_argument("--return-paid-by", default="Buyer", choices=["Buyer", "Seller"], help="Who pays return shipping (default: Buyer)")
+        # Business policies (see 'policies')
+        p.add_argument("--shipping-profile", default="", help="Shipping business policy name or ID (replaces inline shipping)")
+        p.add_argument("--return-profile", default="", help="Return business policy name or ID (replaces inline returns)")
+        p.add_argument("--payment-profile", default="", help="Payment business policy name or ID")
         # Item details
         p.add_argument("--specific", action="append", dest="specifics", metavar="Name=Value", help="Item specific (repeatable, e.g. --specific 'Brand=Sony')")
         p.add_argument("--condition-description", default="", help="Describe item condition details")
@@ -1424,15 +5508,126 @@ examples:
         p.add_argument("--best-offer-auto-accept", type=float, default=None, help="Auto-accept offers at or above this price")
         # Display
         p.add_argument("--gallery-plus", action="store_true", help="Enable Gallery Plus for larger images in search")
+        p.add_argument("--skip-validation", action="store_true", help="Skip local pre-submit checks")
+        p.add_argument("--picture-mode", default="passthrough", choices=PICTURE_MODES,
+                       help="passthrough: link remote URLs as-is; external: have eBay fetch and host them")
+        p.add_argument("--probe-images", action="store_true", help="Check remote image URLs (status, type, size) before uploading anything")
+        # Cross-listing
+        p.add_argument("--marketplaces", default="", help="List on several sites at once, e.g. AU,UK,US (first is the source for --category)")
+        p.add_argument("--site-price", action="append", metavar="SITE=PRICE", help="Per-site price override (repeatable)")
+        p.add_argument("--site-currency", action="append", metavar="SITE=CUR", help="Per-site currency override (repeatable)")
+        p.add_argument("--site-shipping", action="append", metavar="SITE=SERVICE[:COST|free]", help="Per-site domestic shipping (repeatable)")
+        p.add_argument("--site-category", action="append", metavar="SITE=ID", help="Per-site category override (repeatable)")
 
     args = parser.parse_args()
 
+    _RUN.update(command=args.command, account=args.account, textfile=args.metrics_textfile)
+    if args.profile:
+        start_profiling(args.profile, args.command)
+        atexit.register(stop_profiling)
+    if args.stats:
+        atexit.register(print_transfer_stats)
+    if args.deadline is not None:
+        set_deadline(args.deadline)
+    if args.hedge:
+        enable_hedging()
+        atexit.register(print_hedge_stats)
+    if args.replay:
+        start_replay(args.replay, args.replay_latency)
+    elif args.record:
+        start_recording(args.record)
+
+    if args.command == "accounts":
+        accounts = load_accounts()
+        if not accounts:
+            print(f"No account profiles. Define them in {os.path.join(STATE_DIR, 'accounts.json')}.")
+        for name, profile in accounts.items():
+            mode = "oauth" if profile.get("client_id") else "authnauth"
+            print(f"  {name:<20} {mode:<10} {'sandbox' if profile.get('sandbox') else 'production'}")
+        return
+
+    if args.command == "metrics":
+        if args.action == "reset":
+            with _metrics_file_lock():
+                if os.path.exists(_metrics_path()):
+                    os.remove(_metrics_path())
+            print("Metrics store cleared.")
+        elif args.action == "export":
+            if args.textfile:
+                write_prometheus_textfile(args.textfile)
+                print(f"Wrote {args.textfile}")
+            else:
+                sys.stdout.write(format_prometheus(load_metrics()))
+        else:
+            store = load_metrics()
+            print(f"{'Call':<40} {'Requests':>9} {'Errors':>7} {'Mean':>7} {'Sent':>10} {'Received':>10}")
+            for key, m in sorted(store["calls"].items()):
+                account, call = key.split("|", 1)
+                total = sum(m["status"].values())
+                errors = sum(n for st, n in m["status"].items() if not st.isdigit() or int(st) >= 500)
+                mean = m["latency"]["sum"] / m["latency"]["count"] if m["latency"]["count"] else 0
+                label = f"{account}/{call}" if account else call
+                print(f"{label[:40]:<40} {total:>9} {errors:>7} {mean:>6.2f}s "
+                      f"{_format_bytes(m['sent']):>10} {_format_bytes(m['received']):>10}")
+            for key, n in sorted(store["events"].items()):
+                account, event = key.split("|", 1)
+                print(f"  {event}: {n}" + (f" ({account})" if account else ""))
+        return
+
+    if args.command == "breakers":
+        if args.reset:
+            reset = reset_breakers("" if args.reset == "*" else args.reset)
+            print(f"Reset: {', '.join(reset)}" if reset else "Nothing to reset.")
+            return
+        status = breaker_status()
+        if not status:
+            print("All endpoints healthy (no failures recorded).")
+        for b in status:
+            retry = f"  retry in {math.ceil(b['retry_in'] / 60)} min" if b["state"] == "open" else ""
+            print(f"  {b['scope']:<20} {b['call']:<30} {b['state']:<10} {b['failures']} failures, tripped {b['trips']}x{retry}")
+        return
+
+    if args.account == "all":
+        names = list(load_accounts())
+        if not names:
+            print("No account profiles configured.", file=sys.stderr)
+            sys.exit(1)
+        if args.command == "dashboard":
+            for data in _run_concurrently(collect_dashboard, names, max_workers=len(names)):
+                if "error" in data:
+                    print(f"[{data['account']}] {data['error']}", file=sys.stderr)
+                    continue
+                print_dashboard(data["active"], data["sold"], ndjson=args.output_format == "ndjson", account=data["account"])
+        elif args.command == "sales" and args.action == "sync":
+            results = _run_concurrently(lambda name: sync_account_sales(name, args.days), names, max_workers=len(names))
+            for data in results:
+                if "error" in data:
+                    print(f"[{data['account']}] {data['error']}", file=sys.stderr)
+                    continue
+                print(f"[{data['account']}] Synced {data['synced']} transactions.")
+        else:
+            print("--account all is supported for 'dashboard' and 'sales sync'.", file=sys.stderr)
+            sys.exit(1)
+        return
+
+    # Everything below runs as the selected profile (or the env var credentials)
+    _ACCOUNT.set(args.account)
+    if args.account:
+        try:
+            account_env(args.account)
+        except EbayApiError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
     # --- Commands that don't need env/auth ---
 
     if args.command == "categories":
         query = " ".join(args.query)
         results = search_categories(query)
-        if results:
+        if args.output_format == "ndjson":
+            for r in results[:10]:
+                _emit_ndjson(r)
+        elif results:
             print(f"Categories matching '{query}':")
             for r in results[:10]:
                 print(f"  {r['id']:>8}  {r['name']}")
@@ -1443,6 +5638,188 @@ examples:
                 print(f"  {cat_id:>8}  {name}")
         return
 
+    if args.command == "classify":
+        if args.action == "train":
+            examples, names = load_training_examples(args.data)
+            if not examples:
+                print("No training data. Run 'sales sync' or pass --data FILE.", file=sys.stderr)
+                sys.exit(1)
+            model = train_category_model(examples, names)
+            save_category_model(model)
+            print(f"Trained on {model['examples']} titles across {len(model['classes'])} categories.")
+        else:
+            model = load_category_model()
+            if not model:
+                print("No model trained yet. Run 'classify train' first.", file=sys.stderr)
+                sys.exit(1)
+            for p in predict_category(model, " ".join(args.title), k=args.top):
+                print(f"  {p['id']:>8}  {p['confidence']:>6.1%}  {p['name']}")
+        return
+
+    # --- sales reports: read the local warehouse only ---
+
+    if args.command == "sales" and args.action != "sync":
+        conn = open_sales_store()
+        if args.action == "monthly":
+            print(f"{'Month':<8} {'Sales':>6} {'Units':>6} {'Revenue':>11}")
+            for r in sales_monthly_revenue(conn):
+                print(f"{r['month']:<8} {r['sales']:>6} {r['units']:>6} {r['revenue']:>11.2f}")
+        elif args.action == "categories":
+            print(f"{'Category':<42} {'Sales':>6} {'Revenue':>11} {'Avg':>9}")
+            for r in sales_by_category(conn):
+                name = f"{r['category_id']} {CATEGORY_KEYWORDS.get(r['category_id'], '')}".strip()
+                print(f"{name[:42]:<42} {r['sales']:>6} {r['revenue']:>11.2f} {r['avg_price']:>9.2f}")
+        else:
+            for r in sales_percentiles(conn, args.category):
+                name = CATEGORY_KEYWORDS.get(r["category_id"], "")
+                print(f"{r['category_id']} {name} ({r['sales']} sales)")
+                for key, label in (("price", "Price"), ("days_to_sell", "Days to sell"), ("realised", "Realised/start")):
+                    cells = "  ".join(
+                        f"p{q}={r[f'{key}_p{q}']}" for q in (25, 50, 75, 90)
+                    )
+                    print(f"  {label:<15} {cells}")
+        return
+
+    # --- aspects show: read the offline item-aspects index ---
+
+    if args.command == "aspects" and args.action == "show":
+        index = open_aspect_index(args.marketplace)
+        if index is None:
+            print(f"No aspects index for {args.marketplace}. Run 'aspects sync --marketplace {args.marketplace}'.", file=sys.stderr)
+            sys.exit(1)
+        if not args.category_id:
+            age_days = (time.time() - index.meta.get("synced_at", 0)) / 86400
+            print(f"{index.path}: {index.count} categories, tree {index.meta.get('categoryTreeId')} "
+                  f"version {index.meta.get('categoryTreeVersion', '?')}, synced {age_days:.1f} days ago")
+            return
+        record = index.get(args.category_id)
+        if record is None:
+            print(f"Category {args.category_id} is not in the index (not a leaf category?).", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format == "ndjson":
+            for aspect in record["aspects"]:
+                _emit_ndjson({"category_id": args.category_id, **aspect})
+        else:
+            print(f"Category {args.category_id}: {record['name']}")
+            for aspect in record["aspects"]:
+                req = "REQUIRED" if aspect["required"] else aspect["usage"].lower() or "optional"
+                vals = ", ".join(aspect["values"][:5])
+                if len(aspect["values"]) > 5:
+                    vals += f" (+{len(aspect['values']) - 5} more)"
+                closed = " [fixed list]" if aspect["mode"] == "SELECTION_ONLY" else ""
+                print(f"  {req:11s} {aspect['name']}{closed}: {vals}")
+        return
+
+    # --- specifics: show required item specifics for a category ---
+
+    if args.command == "specifics":
+        site_id = SITE_ID_MAP.get(args.marketplace, "15")
+        # A synced aspects index answers offline; eBay is only asked on a miss (and for conditions)
+        indexed = lookup_aspects(args.category_id, site_id)
+        auth_token, sandbox = "", False
+        if args.account or get_auth_mode() == "authnauth":
+            env = get_env()
+            auth_token, sandbox = env.get("auth_token", ""), env["sandbox"]
+        if indexed is None and not auth_token:
+            print("specifics requires Auth'n'Auth token (or an offline index: run 'aspects sync').", file=sys.stderr)
+            sys.exit(1)
+
+        ndjson = args.output_format == "ndjson"
+
+        # First validate the category
+        if indexed is not None:
+            is_leaf, cat_name = True, indexed["name"]  # the aspects file only covers leaf categories
+        else:
+            is_leaf, cat_name = validate_leaf_category(args.category_id, auth_token, sandbox, site_id)
+        if ndjson:
+            _emit_ndjson({"type": "category", "id": args.category_id, "name": cat_name, "leaf": is_leaf})
+        elif cat_name:
+            print(f"Category {args.category_id}: {cat_name}" + (" (leaf)" if is_leaf else " (NOT leaf — cannot list here)"))
+        if not is_leaf:
+            if not ndjson:
+                print("This category has subcategories. Use 'find-category' to find leaf categories.")
+            # Show subcategories
+            try:
+                subs = find_categories_online("", auth_token, sandbox, site_id, parent_id=args.category_id)
+                for s in subs[:20]:
+                    if ndjson:
+                        _emit_ndjson({"type": "subcategory", **s})
+                    else:
+                        leaf = " (leaf)" if s.get("leaf") else ""
+                        print(f"  {s['id']:>8}  {s['name']}{leaf}")
+            except EbayApiError:
+                pass
+            return
+
+        # Show valid conditions (not part of the aspects file, so only with credentials)
+        if auth_token:
+            conditions = get_valid_conditions(args.category_id, auth_token, sandbox, site_id)
+            if ndjson:
+                for c in conditions:
+                    _emit_ndjson({"type": "condition", **c})
+            else:
+                print(f"\nValid conditions for category {args.category_id}:")
+                if conditions:
+                    for c in conditions:
+                        print(f"  {c['id']:>6}  {c['name']}")
+                else:
+                    print("  (could not fetch — try using standard condition IDs)")
+
+        # Item specifics: the synced aspects index if there is one, else GetCategorySpecifics (may 503)
+        try:
+            specs = indexed["aspects"] if indexed else get_category_specifics(args.category_id, auth_token, sandbox, site_id)
+            if ndjson:
+                for s in specs:
+                    _emit_ndjson({"type": "specific", **s})
+            elif specs:
+                print(f"\nItem specifics for category {args.category_id}:")
+                for s in specs:
+                    req = "REQUIRED" if s["required"] else "optional"
+                    vals = ", ".join(s["values"][:5]) if s["values"] else ""
+                    if s["values"] and len(s["values"]) > 5:
+                        vals += f" (+{len(s['values'])-5} more)"
+                    print(f"  {req:10s} {s['name']}: {vals}")
+        except EbayApiError:
+            if ndjson:
+                _emit_ndjson({"type": "error", "error": "GetCategorySpecifics unavailable"})
+            else:
+                print("\n  (GetCategorySpecifics unavailable — this API may be deprecated)")
+                print("  Tip: run 'aspects sync' for an offline copy, or list with --preset and eBay will tell you what's missing.")
+        return
+
+    if args.command == "notify":
+        try:
+            if args.action == "serve":
+                server = make_notification_server(args.host, args.port, args.cert, args.key)
+                scheme = "https" if args.cert else "http"
+                print(f"Listening for eBay notifications on {scheme}://{args.host}:{args.port}/ (Ctrl-C to stop)")
+                try:
+                    server.serve_forever()
+                except KeyboardInterrupt:
+                    pass
+                finally:
+                    server.server_close()
+            elif args.action == "send-test":
+                url = args.url or f"http://localhost:{args.port}/"
+                keys = notification_keys()
+                for event in args.events or NOTIFICATION_EVENTS:
+                    print(f"  {event:<22} HTTP {send_test_notification(url, event, keys)}")
+            else:
+                if not args.url:
+                    print("notify subscribe requires --url (the public address of 'notify serve').", file=sys.stderr)
+                    sys.exit(1)
+                env = get_env()
+                if env.get("mode") != "authnauth":
+                    print("notify subscribe requires Auth'n'Auth token.", file=sys.stderr)
+                    sys.exit(1)
+                subscribe_notifications(args.url, env["auth_token"], env["sandbox"], args.events, enable=not args.disable)
+                state = "Disabled" if args.disable else "Subscribed"
+                print(f"{state}: {', '.join(args.events or NOTIFICATION_EVENTS)} -> {args.url}")
+        except EbayApiError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        return
+
     env = get_env()
     sandbox = env["sandbox"]
 
@@ -1469,66 +5846,13 @@ examples:
             print("dashboard requires Auth'n'Auth token.", file=sys.stderr)
             sys.exit(1)
 
-        body = """
-  <ActiveList>
-    <Include>true</Include>
-    <Pagination><EntriesPerPage>50</EntriesPerPage></Pagination>
-  </ActiveList>
-  <SoldList>
-    <Include>true</Include>
-    <DurationInDays>30</DurationInDays>
-    <Pagination><EntriesPerPage>25</EntriesPerPage></Pagination>
-  </SoldList>
-  <DetailLevel>ReturnAll</DetailLevel>"""
-        result = trading_api_call("GetMyeBaySelling", body, auth_token, sandbox, "15")
-
-        # Collect active item IDs
-        active_ids = []
-        active_block = re.search(r"<ActiveList>(.*?)</ActiveList>", result, re.DOTALL)
-        if active_block:
-            for m in re.finditer(r"<ItemID>(\d+)</ItemID>", active_block.group(1)):
-                if m.group(1) not in active_ids:
-                    active_ids.append(m.group(1))
-
-        # Fetch full details for each active item
-        print("=" * 90)
-        print(f"{'ACTIVE LISTINGS':^90}")
-        print("=" * 90)
-        print(f"{'Title':<42} {'Price':>8}  {'Watch':>5}  {'Offers':>6}  {'BestOffer':>9}")
-        print("-" * 90)
-        for item_id in active_ids:
-            item_body = f"<ItemID>{item_id}</ItemID><DetailLevel>ReturnAll</DetailLevel>"
-            try:
-                item_result = trading_api_call("GetItem", item_body, auth_token, sandbox, "15")
-                title = _extract_xml_value(item_result, "Title")
-                price_m = re.search(r"<StartPrice[^>]*>([\d.]+)</StartPrice>", item_result)
-                price = price_m.group(1) if price_m else "?"
-                watchers = _extract_xml_value(item_result, "WatchCount") or "0"
-                bo_count = _extract_xml_value(item_result, "BestOfferCount") or "0"
-                bo_on = _extract_xml_value(item_result, "BestOfferEnabled")
-                bo_str = "on" if bo_on == "true" else "off"
-                print(f"  {title[:40]:<40} A${price:>7}  {watchers:>5}  {bo_count:>6}  {bo_str:>9}")
-            except EbayApiError:
-                print(f"  #{item_id} — error fetching details")
-
-        # Sold items
-        print()
-        print("=" * 90)
-        print(f"{'SOLD (last 30 days)':^90}")
-        print("=" * 90)
-        sold_block = re.search(r"<SoldList>(.*?)</SoldList>", result, re.DOTALL)
-        if sold_block:
-            for item in re.finditer(r"<OrderTransaction>(.*?)</OrderTransaction>", sold_block.group(1), re.DOTALL):
-                c = item.group(1)
-                title = _extract_xml_value(c, "Title")
-                price_m = re.search(r"<TransactionPrice[^>]*>([\d.]+)</TransactionPrice>", c)
-                price = price_m.group(1) if price_m else "?"
-                buyer = _extract_xml_value(c, "BuyerUserID")
-                item_id = _extract_xml_value(c, "ItemID")
-                print(f"  {title[:40]:<40} A${price:>7}  buyer: {buyer}  #{item_id}")
-        else:
-            print("  (none)")
-        print()
+        result = fetch_my_ebay_selling(auth_token, sandbox, "15")
+        # Active items stream as each GetItem returns
+        print_dashboard(
+            iter_active_listings(auth_token, sandbox, "15", first_result=result),
+            _parse_sold_list(result),
+            ndjson=args.output_format == "ndjson",
+        )
 
     # --- messages: show recent eBay messages ---
 
@@ -1538,35 +5862,211 @@ examples:
             print("messages requires Auth'n'Auth token.", file=sys.stderr)
             sys.exit(1)
 
-        from datetime import datetime, timedelta, timezone
-        end = datetime.now(timezone.utc)
-        start = end - timedelta(days=args.days)
-        body = f"""
-  <FolderID>0</FolderID>
-  <StartCreationTime>{start.strftime('%Y-%m-%dT%H:%M:%S.000Z')}</StartCreationTime>
-  <EndCreationTime>{end.strftime('%Y-%m-%dT%H:%M:%S.000Z')}</EndCreationTime>
-  <DetailLevel>ReturnHeaders</DetailLevel>"""
-        result = trading_api_call("GetMyMessages", body, auth_token, sandbox, "15")
-
-        msgs = []
-        for block in re.finditer(r"<Message>(.*?)</Message>", result, re.DOTALL):
-            c = block.group(1)
-            sender = _extract_xml_value(c, "Sender")
-            subject = _extract_xml_value(c, "Subject")
-            date = _extract_xml_value(c, "ReceiveDate")[:10]
-            read = _extract_xml_value(c, "Read")
-            item_title = _extract_xml_value(c, "ItemTitle")
-            marker = "  " if read == "true" else "* "
-            msgs.append((date, marker, sender, subject[:70], item_title))
-
-        if msgs:
+        conn = open_message_store()
+        if not args.no_sync:
+            sync_messages(auth_token, sandbox, "15", days=args.days, full=args.full, conn=conn)
+        msgs = query_messages(conn, days=args.days, unread_only=args.unread, search=args.search)
+
+        if args.body:
+            missing = [m["message_id"] for m in msgs if m["body"] is None]
+            if missing and not args.no_sync:
+                bodies = fetch_message_bodies(missing, auth_token, sandbox, "15", conn=conn)
+                for m in msgs:
+                    if m["message_id"] in bodies:
+                        m["body"] = bodies[m["message_id"]]
+
+        if args.output_format == "ndjson":
+            for m in msgs:
+                if not args.body:
+                    m.pop("body")
+                m["read"] = bool(m["read"])
+                _emit_ndjson(m)
+        elif msgs:
             print(f"Messages (last {args.days} days)  (* = unread)")
             print("-" * 90)
-            for date, marker, sender, subject, item_title in msgs:
-                print(f"{marker}{date}  {sender:<20} {subject}")
+            for m in msgs:
+                marker = "  " if m["read"] else "* "
+                print(f"{marker}{m['receive_date'][:10]}  {m['sender']:<20} {m['subject'][:70]}")
+                if args.body and m["body"]:
+                    for line in _html_to_text(m["body"]).splitlines():
+                        print(f"      {line}")
+                    print()
         else:
             print("No messages.")
 
+    # --- offers: rule-based best-offer responses ---
+
+    elif args.command == "offers":
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print("offers requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
+        rules = {
+            "accept_pct": args.accept_pct,
+            "decline_pct": args.decline_pct,
+            "counter_pct": args.counter_pct,
+            "aged_days": args.aged_days,
+            "aged_accept_pct": args.aged_accept_pct,
+        }
+        decisions = process_best_offers(
+            auth_token, sandbox, "15", rules, dry_run=args.dry_run, seller_response=args.message,
+        )
+        if args.output_format == "ndjson":
+            for d in decisions:
+                _emit_ndjson(d)
+        elif decisions:
+            print(f"{'Item':<14} {'Buyer':<18} {'Offer':>9} {'List':>9} {'%':>5}  Decision")
+            print("-" * 90)
+            for d in decisions:
+                action = d["action"] or "hold"
+                if d.get("counter_price"):
+                    action += f" {d['counter_price']:.2f}"
+                outcome = f"FAILED: {d['error']}" if "error" in d else d["reason"]
+                print(f"{d['item_id']:<14} {d['buyer'][:18]:<18} {d['price'] or 0:>9.2f} {d['list_price']:>9.2f} "
+                      f"{d['pct']:>5.0f}  {action:<16} {outcome}")
+            counts = collections.Counter(d["action"] or "hold" for d in decisions)
+            summary = ", ".join(f"{n} {a.lower()}" for a, n in counts.items())
+            print(f"\n{len(decisions)} offers: {summary}" + (" (dry run, nothing sent)" if args.dry_run else ""))
+        else:
+            print("No active best offers.")
+        if any("error" in d for d in decisions):
+            sys.exit(1)
+
+    # --- ship-batch: bulk tracking upload ---
+
+    elif args.command == "ship-batch":
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print("ship-batch requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            results = ship_batch(args.csv, auth_token, sandbox, "15", force=args.force)
+        except (EbayApiError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format == "ndjson":
+            for r in results:
+                _emit_ndjson(r)
+        else:
+            for r in results:
+                print(f"  {r['order_id']:<22} {r['status']:<10} {r['detail']}")
+            counts = collections.Counter(r["status"] for r in results)
+            print(f"\n{len(results)} orders: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+        if any(r["status"] in ("failed", "unmatched") for r in results):
+            sys.exit(1)
+
+    # --- end-batch / relist-batch: bulk listing lifecycle ---
+
+    elif args.command in ("end-batch", "relist-batch"):
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print(f"{args.command} requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
+        relist = args.command == "relist-batch"
+        filters = {
+            "older_than_days": args.older_than,
+            "max_watchers": args.max_watchers,
+            "title": args.title_contains,
+            "category_id": args.category,
+        }
+        has_filter = any(v not in (None, "") for v in filters.values())
+        if not (args.ids_file or has_filter or args.all):
+            print("Choose listings with --ids-file, a filter (--older-than, --max-watchers, "
+                  "--title-contains, --category) or --all.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            if args.ids_file:
+                item_ids = read_item_ids(args.ids_file)
+            else:
+                selected = select_listings(auth_token, sandbox, "15", filters, unsold=relist)
+                item_ids = [i["item_id"] for i in selected]
+        except (EbayApiError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not item_ids:
+            print("No listings selected.")
+            return
+        if args.dry_run:
+            results = [{"item_id": i} for i in item_ids]
+        elif relist:
+            results = relist_items(item_ids, auth_token, sandbox, "15", price=args.price, quantity=args.quantity)
+        else:
+            results = end_items(item_ids, auth_token, sandbox, "15", reason=args.reason)
+        if args.output_format == "ndjson":
+            for r in results:
+                _emit_ndjson(r)
+        else:
+            verb = "relist" if relist else "end"
+            for r in results:
+                if "error" in r:
+                    outcome = f"FAILED  {r['error']}"
+                elif args.dry_run:
+                    outcome = f"would {verb}"
+                elif relist:
+                    outcome = f"relisted as {r['new_item_id']}"
+                else:
+                    outcome = f"ended {r['end_time']}"
+                print(f"  {r['item_id']:<14} {outcome}")
+            failed = sum("error" in r for r in results)
+            print(f"\n{len(results) - failed} of {len(results)} listings " + ("selected (dry run)" if args.dry_run else "done"))
+        if any("error" in r for r in results):
+            sys.exit(1)
+
+    # --- reprice: rule-based price revisions ---
+
+    elif args.command == "reprice":
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print("reprice requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
+        try:
+            rules = load_reprice_rules(args.rules)
+        except (EbayApiError, OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        with contextlib.redirect_stdout(sys.stderr):  # keep per-revision chatter out of the report
+            plans = reprice_listings(rules, auth_token, sandbox, "15", dry_run=args.dry_run)
+
+        def fmt(value):
+            return "-" if value is None else f"{value:.2f}"
+
+        if args.output_format == "ndjson":
+            for p in plans:
+                _emit_ndjson(p)
+        elif plans:
+            print(f"{'Item':<14} {'Rule':<12} {'Price':>17} {'Offer min':>17} {'Auto-accept':>17}  Result")
+            print("-" * 100)
+            for p in plans:
+                cols = [f"{fmt(p['old'][k])}->{fmt(p['new'][k])}" if k in p["changes"] else fmt(p["old"][k])
+                        for k in ("price", "best_offer_min", "best_offer_auto_accept")]
+                if "error" in p:
+                    result = f"FAILED: {p['error']}"
+                elif "skipped" in p:
+                    result = f"skipped: {p['skipped']}"
+                elif not p["changes"]:
+                    result = "unchanged"
+                else:
+                    result = "would revise" if args.dry_run else "revised"
+                print(f"{p['item_id']:<14} {p['rule'][:12]:<12} {cols[0]:>17} {cols[1]:>17} {cols[2]:>17}  {result}")
+            changed = sum(1 for p in plans if p["changes"] and "error" not in p)
+            print(f"\n{len(plans)} listings matched, {changed} " + ("to revise (dry run)" if args.dry_run else "revised"))
+        else:
+            print("No listings matched any rule.")
+        if any("error" in p for p in plans):
+            sys.exit(1)
+
+    # --- sales: sold-history warehouse ---
+
+    elif args.command == "sales":  # sync; the reports are handled before get_env()
+        conn = open_sales_store()
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print("sales sync requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
+        count = sync_sales(auth_token, sandbox, "15", days=args.days, conn=conn)
+        total = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+        print(f"Synced {count} transactions ({total} in warehouse).")
+
     # --- find-category: live eBay API category search ---
 
     elif args.command == "find-category":
@@ -1583,7 +6083,10 @@ examples:
         except EbayApiError as e:
             print(f"Error: {e}", file=sys.stderr)
             sys.exit(1)
-        if results:
+        if args.output_format == "ndjson":
+            for r in results[:20]:
+                _emit_ndjson(r)
+        elif results:
             print(f"eBay {args.marketplace} categories matching '{query}':")
             for r in results[:20]:
                 leaf = " (leaf)" if r.get("leaf") else ""
@@ -1591,56 +6094,43 @@ examples:
         else:
             print(f"No categories found for '{query}' on {args.marketplace}.")
 
-    # --- specifics: show required item specifics for a category ---
+    # --- aspects sync: download and index the Taxonomy item-aspects file ---
 
-    elif args.command == "specifics":
-        site_id = SITE_ID_MAP.get(args.marketplace, "15")
-        auth_token = env.get("auth_token", "")
-        if not auth_token:
-            print("specifics requires Auth'n'Auth token.", file=sys.stderr)
+    elif args.command == "aspects":  # sync; 'aspects show' is handled before get_env()
+        print(f"Downloading item aspects for {args.marketplace}...", file=sys.stderr)
+        try:
+            meta = sync_aspect_index(args.marketplace, sandbox)
+        except EbayApiError as e:
+            print(f"Error: {e}", file=sys.stderr)
             sys.exit(1)
+        path = _aspect_index_path(args.marketplace)
+        print(f"Indexed {meta['categories']} categories (tree {meta.get('categoryTreeId')} "
+              f"version {meta.get('categoryTreeVersion', '?')}) -> {path} ({_format_bytes(os.path.getsize(path))})")
+        return
 
-        # First validate the category
-        is_leaf, cat_name = validate_leaf_category(
-            args.category_id, auth_token, sandbox, site_id
-        )
-        if cat_name:
-            print(f"Category {args.category_id}: {cat_name}" + (" (leaf)" if is_leaf else " (NOT leaf — cannot list here)"))
-        if not is_leaf:
-            print("This category has subcategories. Use 'find-category' to find leaf categories.")
-            # Show subcategories
-            try:
-                subs = find_categories_online("", auth_token, sandbox, site_id, parent_id=args.category_id)
-                for s in subs[:20]:
-                    leaf = " (leaf)" if s.get("leaf") else ""
-                    print(f"  {s['id']:>8}  {s['name']}{leaf}")
-            except EbayApiError:
-                pass
-            return
-
-        # Show valid conditions
-        print(f"\nValid conditions for category {args.category_id}:")
-        conditions = get_valid_conditions(args.category_id, auth_token, sandbox, site_id)
-        if conditions:
-            for c in conditions:
-                print(f"  {c['id']:>6}  {c['name']}")
-        else:
-            print("  (could not fetch — try using standard condition IDs)")
+    # --- policies: list business policies (seller profiles) ---
 
-        # Try to fetch item specifics (may 503 if API is deprecated)
+    elif args.command == "policies":
+        auth_token = env.get("auth_token", "")
+        if not auth_token:
+            print("policies requires Auth'n'Auth token.", file=sys.stderr)
+            sys.exit(1)
         try:
-            specs = get_category_specifics(args.category_id, auth_token, sandbox, site_id)
-            if specs:
-                print(f"\nItem specifics for category {args.category_id}:")
-                for s in specs:
-                    req = "REQUIRED" if s["required"] else "optional"
-                    vals = ", ".join(s["values"][:5]) if s["values"] else ""
-                    if s["values"] and len(s["values"]) > 5:
-                        vals += f" (+{len(s['values'])-5} more)"
-                    print(f"  {req:10s} {s['name']}: {vals}")
-        except EbayApiError:
-            print("\n  (GetCategorySpecifics unavailable — this API may be deprecated)")
-            print("  Tip: try listing with --preset and eBay will tell you what's missing.")
+            profiles = fetch_seller_profiles(auth_token, sandbox, SITE_ID_MAP.get(args.marketplace, "15"), refresh=args.refresh)
+        except EbayApiError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if args.output_format == "ndjson":
+            for profile in profiles:
+                _emit_ndjson(profile)
+        elif not profiles:
+            print("No business policies. Opt in and create them under Account > Business policies on eBay.")
+        else:
+            for profile in sorted(profiles, key=lambda p: (p["type"], p["name"])):
+                default = " (default)" if profile["default"] else ""
+                print(f"  {profile['type']:<14} {profile['id']:>14}  {profile['name']}{default}")
+                if profile["summary"]:
+                    print(f"  {'':<14} {'':>14}  {profile['summary'][:80]}")
 
     # --- list / verify: create or dry-run a listing ---
 
@@ -1668,6 +6158,9 @@ examples:
                 args.no_returns = True
             if preset.get("best_offer"):
                 args.best_offer = True
+            for kind, value in preset.get("seller_profiles", {}).items():
+                if not getattr(args, f"{kind}_profile"):
+                    setattr(args, f"{kind}_profile", value)
 
         if env.get("mode") == "authnauth":
             auth_token = env["auth_token"]
@@ -1678,21 +6171,6 @@ examples:
             else:
                 print("Using Trading API (Auth'n'Auth)...")
 
-            # Validate leaf category before uploading images
-            if args.category:
-                is_leaf, cat_name = validate_leaf_category(
-                    args.category, auth_token, sandbox, site_id
-                )
-                if not is_leaf:
-                    print(f"Error: Category {args.category} ({cat_name}) is NOT a leaf category.", file=sys.stderr)
-                    print("Use 'find-category' or 'specifics' to find the right leaf category.", file=sys.stderr)
-                    sys.exit(1)
-                if cat_name:
-                    print(f"Category: {args.category} ({cat_name})")
-
-            # Upload local images if needed
-            image_urls = resolve_images(args.images, auth_token, sandbox)
-
             # Parse item specifics from "Name=Value" pairs
             item_specifics = {}
             if args.specifics:
@@ -1707,14 +6185,7 @@ examples:
             domestic_services = []
             if args.domestic_services:
                 for ds in args.domestic_services:
-                    parts = ds.split(":")
-                    svc = {"service": parts[0]}
-                    if len(parts) > 1:
-                        if parts[1].lower() == "free":
-                            svc["free"] = True
-                        else:
-                            svc["cost"] = float(parts[1])
-                    domestic_services.append(svc)
+                    domestic_services.append(_parse_domestic_service(ds))
             elif hasattr(args, "preset") and args.preset:
                 # Use preset domestic services
                 preset = LISTING_PRESETS.get(args.preset, {})
@@ -1732,6 +6203,129 @@ examples:
                         svc["ship_to"] = parts[2]
                     international_services.append(svc)
 
+            seller_profiles = {kind: getattr(args, f"{kind}_profile") for kind in POLICY_TYPES
+                               if getattr(args, f"{kind}_profile")} or None
+
+            # Per-site plan: one entry normally, several with --marketplaces
+            if args.marketplaces:
+                try:
+                    plans = plan_marketplaces(
+                        [m.strip().upper() for m in args.marketplaces.split(",") if m.strip()],
+                        category_id=args.category,
+                        price=args.price,
+                        domestic_services=domestic_services,
+                        auth_token=auth_token,
+                        sandbox=sandbox,
+                        site_prices=_parse_site_overrides(args.site_price, "--site-price"),
+                        site_currencies=_parse_site_overrides(args.site_currency, "--site-currency"),
+                        site_shipping=_parse_site_overrides(args.site_shipping, "--site-shipping"),
+                        site_categories=_parse_site_overrides(args.site_category, "--site-category"),
+                    )
+                    # A profile belongs to one site: make sure each site has it before anything is uploaded
+                    if seller_profiles:
+                        for plan in plans:
+                            resolve_seller_profiles(seller_profiles, auth_token, sandbox, plan["site_id"], check_ids=True)
+                except (EbayApiError, ValueError) as e:
+                    print(f"Error: {e}", file=sys.stderr)
+                    sys.exit(1)
+            else:
+                plans = [{
+                    "marketplace": args.marketplace,
+                    "site_id": site_id,
+                    "category_id": args.category,
+                    "price": args.price,
+                    "currency": args.currency,
+                    "domestic_services": domestic_services,
+                }]
+
+            # Check everything we can locally before uploading images
+            if not args.skip_validation:
+                problems = []
+                for plan in plans:
+                    prefix = f"[{plan['marketplace']}] " if len(plans) > 1 else ""
+                    problems += [prefix + p for p in validate_listing(
+                        title=args.title,
+                        description=args.description,
+                        price=plan["price"],
+                        image_count=len(args.images),
+                        quantity=args.quantity,
+                        category_id=plan["category_id"],
+                        item_specifics=item_specifics,
+                        domestic_services=plan["domestic_services"],
+                        international_services=international_services,
+                        condition_description=args.condition_description,
+                        best_offer_min=args.best_offer_min,
+                        best_offer_auto_accept=args.best_offer_auto_accept,
+                        auth_token=auth_token,
+                        sandbox=sandbox,
+                        site_id=plan["site_id"],
+                    )]
+                if problems:
+                    print(f"Listing failed validation ({len(problems)} problem{'s' if len(problems) != 1 else ''}):", file=sys.stderr)
+                    for problem in problems:
+                        print(f"  - {problem}", file=sys.stderr)
+                    print("Use 'find-category' or 'specifics' to find the right leaf category and specifics.", file=sys.stderr)
+                    sys.exit(1)
+                for plan in plans:
+                    if plan["category_id"]:
+                        info = get_category_info(plan["category_id"], auth_token, sandbox, plan["site_id"])
+                        if info:
+                            print(f"Category ({plan['marketplace']}): {plan['category_id']} ({info['name']})")
+
+            # Upload local images if needed (once, shared by every site)
+            try:
+                image_urls = resolve_images(
+                    args.images, auth_token, sandbox,
+                    probe_remote=args.probe_images, picture_mode=args.picture_mode,
+                )
+            except EbayApiError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+
+            if len(plans) > 1:
+                results = list_on_marketplaces(
+                    plans,
+                    image_urls,
+                    auth_token,
+                    sandbox,
+                    draft=is_verify or args.draft,
+                    title=args.title,
+                    description=args.description,
+                    condition=args.condition,
+                    quantity=args.quantity,
+                    shipping_type=args.shipping_type,
+                    international_services=international_services or None,
+                    dispatch_days=args.dispatch_days,
+                    ship_to_locations=args.ship_to,
+                    package_type=args.package_type,
+                    package_length=args.package_length,
+                    package_width=args.package_width,
+                    package_depth=args.package_depth,
+                    weight_kg=args.weight,
+                    returns_accepted=not args.no_returns,
+                    return_days=args.return_days,
+                    return_shipping_paid_by=args.return_paid_by,
+                    item_specifics=item_specifics or None,
+                    condition_description=args.condition_description,
+                    postcode=args.postcode,
+                    location=args.location,
+                    best_offer=args.best_offer,
+                    best_offer_min=args.best_offer_min,
+                    best_offer_auto_accept=args.best_offer_auto_accept,
+                    gallery_type="Plus" if args.gallery_plus else "",
+                    seller_profiles=seller_profiles,
+                )
+                print()
+                for plan in plans:
+                    outcome = results[plan["marketplace"]]
+                    if "error" in outcome:
+                        print(f"  {plan['marketplace']:<3} FAILED  {outcome['error'].splitlines()[0]}")
+                    else:
+                        print(f"  {plan['marketplace']:<3} {plan['currency']} {plan['price']:<9} item {outcome['item_id']}")
+                if any("error" in r for r in results.values()):
+                    sys.exit(1)
+                return
+
             try:
                 trading_add_fixed_price_item(
                     title=args.title,
@@ -1767,6 +6361,7 @@ examples:
                     best_offer_min=args.best_offer_min,
                     best_offer_auto_accept=args.best_offer_auto_accept,
                     gallery_type="Plus" if args.gallery_plus else "",
+                    seller_profiles=seller_profiles,
                 )
             except EbayApiError as e:
                 print(f"\n{e}", file=sys.stderr)
@@ -1811,5 +6406,36 @@ examples:
                 sys.exit(1)
 
 
+def run():
+    """Script entry point: main() plus recording the run in the metrics store."""
+    started = time.monotonic()
+    code = 0
+    try:
+        main()
+    except DeadlineExceeded as e:
+        print(f"Error: {e}", file=sys.stderr)
+        code = 1
+    except SystemExit as e:
+        code = e.code
+    except BaseException:
+        code = 1
+        raise
+    finally:
+        stop_profiling()
+        if _RUN["command"]:
+            try:
+                save_latencies()
+            except OSError as e:
+                print(f"Warning: could not save latency samples: {e}", file=sys.stderr)
+        if _RUN["command"] and os.environ.get("EBAY_METRICS", "on").lower() not in ("0", "off"):
+            try:
+                store = flush_metrics(_RUN["command"], _RUN["account"], ok=not code, seconds=time.monotonic() - started)
+                if _RUN["textfile"]:
+                    write_prometheus_textfile(_RUN["textfile"], store)
+            except OSError as e:
+                print(f"Warning: could not update metrics: {e}", file=sys.stderr)
+    sys.exit(code)
+
+
 if __name__ == "__main__":
-    main()
+    run()
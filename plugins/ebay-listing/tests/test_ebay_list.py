@@ -1,4 +1,5 @@
 """Tests for ebay_list.py — covers pure functions, XML building, and mocked API calls."""
+import json
 import os
 import re
 import pytest
@@ -7,6 +8,13 @@ from unittest.mock import patch, MagicMock
 import ebay_list
 
 
+@pytest.fixture(autouse=True)
+def _isolated_breakers(tmp_path):
+    """Give every test its own circuit-breaker file, outside the real state directory."""
+    with patch.object(ebay_list, "_breaker_path", return_value=str(tmp_path / "breakers.json")):
+        yield
+
+
 # ---- Pure functions ----
 
 
@@ -429,6 +437,72 @@ class TestTradingApiCall:
             assert mock_post.call_args[1]["headers"]["X-EBAY-API-SITEID"] == "15"
 
 
+def _streamed_response(payload: bytes, gzipped: bool = True):
+    """Build a real requests.Response backed by a urllib3 stream, as stream=True would."""
+    import gzip
+    import io
+    import requests
+    from urllib3.response import HTTPResponse
+
+    headers = {"Content-Type": "text/xml"}
+    body = payload
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        body = gzip.compress(payload)
+    resp = requests.models.Response()
+    resp.status_code = 200
+    resp.headers = requests.structures.CaseInsensitiveDict(headers)
+    resp.raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=200, preload_content=False)
+    return resp
+
+
+class TestHttpTransport:
+    def setup_method(self):
+        ebay_list.TRANSFER_STATS.clear()
+
+    def test_requests_gzip(self):
+        with patch("requests.post", return_value=_streamed_response(b"<Ack>Success</Ack>")) as mock_post:
+            ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "tok")
+            assert mock_post.call_args[1]["headers"]["Accept-Encoding"] == "gzip"
+            assert mock_post.call_args[1]["stream"] is True
+
+    def test_decompresses_and_records_wire_bytes(self):
+        payload = b"<GetCategoriesResponse>" + b"<Category><CategoryName>Cameras</CategoryName></Category>" * 500 + b"</GetCategoriesResponse>"
+        with patch("requests.post", return_value=_streamed_response(payload)):
+            result = ebay_list.trading_api_call("GetCategories", "", "tok")
+        assert result == payload.decode()
+        stats = ebay_list.TRANSFER_STATS["GetCategories"]
+        assert stats["calls"] == 1
+        assert stats["decoded"] == len(payload)
+        assert stats["wire"] < len(payload) / 10
+        assert stats["sent"] > 0
+
+    def test_uncompressed_response(self):
+        with patch("requests.post", return_value=_streamed_response(b"<Ack>Success</Ack>", gzipped=False)):
+            ebay_list._trading_api_call_safe("GetItem", "", "tok")
+        stats = ebay_list.TRANSFER_STATS["GetItem"]
+        assert stats["wire"] == stats["decoded"] == len(b"<Ack>Success</Ack>")
+
+    def test_sent_counts_bytes_of_text_bodies(self):
+        with patch("requests.post", return_value=_streamed_response(b"<Ack>Success</Ack>")):
+            ebay_list._http_request("POST", "https://api.ebay.com/ws/api.dll", "Notify", data="café")
+        assert ebay_list.TRANSFER_STATS["Notify"]["sent"] == 5
+
+    def test_sent_counts_json_bodies(self):
+        body = {"sku": "A1", "product": {"title": "Objectif"}}
+        with patch("requests.put", return_value=_streamed_response(b"", gzipped=False)) as mock_put:
+            ebay_list._http_request("PUT", "https://api.ebay.com/sell/inventory/v1/inventory_item/A1", "InventoryItem", json=body)
+        assert mock_put.call_args[1]["json"] == body
+        assert ebay_list.TRANSFER_STATS["InventoryItem"]["sent"] == len(json.dumps(body).encode())
+
+    def test_print_stats(self, capsys):
+        ebay_list._record_transfer("GetItem", 100, 250, 1000)
+        ebay_list.print_transfer_stats()
+        err = capsys.readouterr().err
+        assert "GetItem" in err
+        assert "75%" in err
+
+
 class TestFindCategoriesOnline:
     def test_keyword_filter(self):
         fake_xml = """<GetCategoriesResponse><Ack>Success</Ack>
@@ -505,6 +579,10 @@ class TestGetCategorySpecifics:
 
 
 class TestTradingAddFixedPriceItem:
+    @pytest.fixture(autouse=True)
+    def _isolated_state(self, state_dir):
+        yield
+
     def _mock_success(self, item_id="287190999999"):
         return f"""<AddFixedPriceItemResponse>
             <Ack>Success</Ack>
@@ -594,3 +672,1870 @@ class TestEbayApiError:
     def test_catchable(self):
         with pytest.raises(ebay_list.EbayApiError):
             raise ebay_list.EbayApiError("boom")
+
+
+# ---- Local stores ----
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    with patch.object(ebay_list, "STATE_DIR", str(tmp_path)):
+        yield tmp_path
+
+
+def _messages_xml(*msgs):
+    blocks = "".join(
+        f"""<Message><MessageID>{mid}</MessageID><Sender>{sender}</Sender><Subject>{subject}</Subject>
+            <ReceiveDate>{date}</ReceiveDate><Read>{read}</Read><ItemID>1</ItemID><ItemTitle>Drone</ItemTitle></Message>"""
+        for mid, sender, subject, date, read in msgs
+    )
+    return f"<GetMyMessagesResponse><Ack>Success</Ack><Messages>{blocks}</Messages></GetMyMessagesResponse>"
+
+
+def _recent(days_ago=0):
+    from datetime import datetime, timedelta, timezone
+    return ebay_list._ebay_time(datetime.now(timezone.utc) - timedelta(days=days_ago))
+
+
+def _extract_date(xml):
+    return re.search(r"<ReceiveDate>(.*?)</ReceiveDate>", xml).group(1)
+
+
+class TestMessageStore:
+    def test_sync_uses_high_water_mark(self, state_dir):
+        first = _messages_xml(("m1", "bob", "Is this available?", _recent(2), "false"))
+        with patch.object(ebay_list, "trading_api_call", return_value=first):
+            assert ebay_list.sync_messages("tok", days=14) == 1
+
+        with patch.object(ebay_list, "trading_api_call", return_value=_messages_xml()) as mock_call:
+            ebay_list.sync_messages("tok", days=14)
+            body = mock_call.call_args_list[0][0][1]
+            start = re.search(r"<StartCreationTime>(.*?)</StartCreationTime>", body).group(1)
+            assert start == _extract_date(first)
+
+    def test_incremental_sync_refreshes_read_flags(self, state_dir):
+        conn = ebay_list.open_message_store()
+        with patch.object(ebay_list, "trading_api_call", return_value=_messages_xml(
+            ("m1", "bob", "Is this available?", _recent(3), "false"),
+            ("m2", "amy", "Thanks", _recent(2), "true"),
+            ("m3", "cal", "Offer?", _recent(1), "false"),
+        )):
+            ebay_list.sync_messages("tok", days=14, conn=conn)
+
+        def fake_call(call_name, body, *args):
+            if "<MessageIDs>" not in body:
+                return _messages_xml()  # nothing new since the high-water mark
+            assert re.findall(r"<MessageID>(.*?)</MessageID>", body) == ["m1"]  # m3 is at the mark: already re-fetched
+            assert "<DetailLevel>ReturnHeaders</DetailLevel>" in body
+            return _messages_xml(("m1", "bob", "Is this available?", _recent(3), "true"))
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            ebay_list.sync_messages("tok", days=14, conn=conn)
+        assert mock_call.call_count == 2
+        assert [m["message_id"] for m in ebay_list.query_messages(conn, unread_only=True)] == ["m3"]
+
+    def test_wider_window_resyncs(self, state_dir):
+        with patch.object(ebay_list, "trading_api_call", return_value=_messages_xml(("m1", "a", "s", _recent(1), "true"))):
+            ebay_list.sync_messages("tok", days=7)
+        with patch.object(ebay_list, "trading_api_call", return_value=_messages_xml()) as mock_call:
+            ebay_list.sync_messages("tok", days=30)
+            start = re.search(r"<StartCreationTime>(.*?)</StartCreationTime>", mock_call.call_args[0][1]).group(1)
+            assert start < _recent(29)
+
+    def test_query_filters_locally(self, state_dir):
+        xml = _messages_xml(
+            ("m1", "alice", "Shipping question", _recent(1), "false"),
+            ("m2", "bob", "Thanks!", _recent(2), "true"),
+        )
+        conn = ebay_list.open_message_store()
+        with patch.object(ebay_list, "trading_api_call", return_value=xml):
+            ebay_list.sync_messages("tok", conn=conn)
+        assert [m["message_id"] for m in ebay_list.query_messages(conn)] == ["m1", "m2"]
+        assert [m["message_id"] for m in ebay_list.query_messages(conn, unread_only=True)] == ["m1"]
+        assert [m["message_id"] for m in ebay_list.query_messages(conn, search="thanks")] == ["m2"]
+
+    def test_bodies_fetched_in_batches_of_ten(self, state_dir):
+        ids = [f"m{i}" for i in range(23)]
+
+        def fake_call(call_name, body, *args):
+            requested = re.findall(r"<MessageID>(.*?)</MessageID>", body)
+            assert len(requested) <= 10
+            assert "<DetailLevel>ReturnMessages</DetailLevel>" in body
+            return "".join(f"<Message><MessageID>{m}</MessageID><Text>body {m}</Text></Message>" for m in requested)
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            bodies = ebay_list.fetch_message_bodies(ids, "tok")
+        assert mock_call.call_count == 3
+        assert bodies["m22"] == "body m22"
+
+    def test_html_to_text(self):
+        assert ebay_list._html_to_text("Hi<br/>Is it &amp; <b>new</b>?") == "Hi\nIs it & new?"
+
+
+def _transaction_xml(item_id, txn_id, price, sold_at, category="179697", start_price=None, listed_at="2024-01-01T00:00:00.000Z"):
+    start = f'<StartPrice currencyID="AUD">{start_price}</StartPrice>' if start_price else ""
+    return f"""<Transaction>
+        <Item><ItemID>{item_id}</ItemID><Title>Item {item_id}</Title>
+            <PrimaryCategory><CategoryID>{category}</CategoryID></PrimaryCategory>{start}
+            <ListingDetails><StartTime>{listed_at}</StartTime></ListingDetails></Item>
+        <TransactionID>{txn_id}</TransactionID><QuantityPurchased>1</QuantityPurchased>
+        <TransactionPrice currencyID="AUD">{price}</TransactionPrice>
+        <CreatedDate>{sold_at}</CreatedDate><Buyer><UserID>buyer1</UserID></Buyer>
+    </Transaction>"""
+
+
+class TestSalesWarehouse:
+    def _load(self, *transactions):
+        conn = ebay_list.open_sales_store()
+        rows = ebay_list._parse_seller_transactions("".join(transactions))
+        conn.executemany(
+            "INSERT INTO sales VALUES (:transaction_key, :item_id, :transaction_id, :order_id, :title, :category_id,"
+            " :quantity, :price, :currency, :start_price, :listed_at, :sold_at, :buyer)",
+            rows,
+        )
+        return conn
+
+    def test_parse_transaction(self):
+        rows = ebay_list._parse_seller_transactions(_transaction_xml("111", "0", 80.0, "2024-02-01T00:00:00.000Z", start_price=100.0))
+        assert rows[0]["transaction_key"] == "111-0"
+        assert rows[0]["price"] == 80.0
+        assert rows[0]["start_price"] == 100.0
+        assert rows[0]["currency"] == "AUD"
+        assert rows[0]["category_id"] == "179697"
+        assert rows[0]["buyer"] == "buyer1"
+
+    def test_sync_walks_30_day_windows_and_resumes(self, state_dir):
+        page = f"<GetSellerTransactionsResponse>{_transaction_xml('1', '0', 10, _recent(5))}</GetSellerTransactionsResponse>"
+        with patch.object(ebay_list, "trading_api_call", return_value=page) as mock_call:
+            ebay_list.sync_sales("tok", days=90)
+            assert mock_call.call_count == 3
+        with patch.object(ebay_list, "trading_api_call", return_value=page) as mock_call:
+            ebay_list.sync_sales("tok", days=90)
+            assert mock_call.call_count == 1
+        conn = ebay_list.open_sales_store()
+        assert conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 1
+
+    def test_resume_older_than_90_days_warns_and_skips_gap(self, state_dir, capsys):
+        conn = ebay_list.open_sales_store()
+        long_ago = ebay_list.datetime.now(ebay_list.timezone.utc) - ebay_list.timedelta(days=200)
+        ebay_list._set_sync_state(conn, "synced_to", ebay_list._ebay_time(long_ago))
+        page = "<GetSellerTransactionsResponse></GetSellerTransactionsResponse>"
+        with patch.object(ebay_list, "trading_api_call", return_value=page) as mock_call:
+            ebay_list.sync_sales("tok", conn=conn)
+        assert mock_call.call_count == 3  # only the 90 days eBay still has
+        assert "can't be recovered" in capsys.readouterr().err
+
+    def test_reports_need_no_credentials(self, state_dir, capsys):
+        self._load(_transaction_xml("1", "0", 10, "2024-01-05T00:00:00.000Z")).commit()
+        env = {k: v for k, v in os.environ.items() if not k.startswith("EBAY_")}
+        with patch("sys.argv", ["ebay_list.py", "sales", "monthly"]), patch.dict(os.environ, env, clear=True):
+            ebay_list.main()
+        assert "2024-01" in capsys.readouterr().out
+
+    def test_monthly_revenue(self, state_dir):
+        conn = self._load(
+            _transaction_xml("1", "0", 10, "2024-01-05T00:00:00.000Z"),
+            _transaction_xml("2", "0", 20, "2024-01-20T00:00:00.000Z"),
+            _transaction_xml("3", "0", 5, "2024-02-01T00:00:00.000Z"),
+        )
+        months = ebay_list.sales_monthly_revenue(conn)
+        assert months == [
+            {"month": "2024-01", "sales": 2, "units": 2, "revenue": 30.0},
+            {"month": "2024-02", "sales": 1, "units": 1, "revenue": 5.0},
+        ]
+
+    def test_percentiles_by_category(self, state_dir):
+        conn = self._load(
+            *[_transaction_xml(str(i), "0", p, "2024-01-11T00:00:00.000Z", start_price=100.0) for i, p in enumerate([60, 70, 80, 90, 100])],
+            _transaction_xml("9", "0", 500, "2024-01-03T00:00:00.000Z", category="9394"),
+        )
+        stats = {r["category_id"]: r for r in ebay_list.sales_percentiles(conn)}
+        assert stats["179697"]["price_p50"] == 80
+        assert stats["179697"]["days_to_sell_p50"] == 10
+        assert stats["179697"]["realised_p50"] == 0.8
+        assert stats["9394"]["sales"] == 1
+        only = ebay_list.sales_percentiles(conn, category_id="9394")
+        assert [r["category_id"] for r in only] == ["9394"]
+
+    def test_percentile_helper(self):
+        assert ebay_list._percentile([1, 2, 3, 4], 50) == 2.5
+        assert ebay_list._percentile([], 50) is None
+
+
+# ---- Active listings / NDJSON output ----
+
+
+def _selling_xml(item_ids, page=1, total_pages=1, sold=""):
+    ids = "".join(f"<Item><ItemID>{i}</ItemID></Item>" for i in item_ids)
+    return f"""<GetMyeBaySellingResponse>
+        <ActiveList><ItemArray>{ids}</ItemArray>
+            <PaginationResult><TotalNumberOfPages>{total_pages}</TotalNumberOfPages></PaginationResult></ActiveList>
+        <SoldList>{sold}</SoldList>
+    </GetMyeBaySellingResponse>"""
+
+
+def _item_xml(item_id, price=100.0, watchers=0, start_time="2024-01-01T00:00:00.000Z"):
+    return f"""<GetItemResponse><Item><ItemID>{item_id}</ItemID><Title>Item {item_id}</Title>
+        <StartPrice currencyID="AUD">{price}</StartPrice><Quantity>1</Quantity><WatchCount>{watchers}</WatchCount>
+        <ListingDetails><StartTime>{start_time}</StartTime></ListingDetails>
+        <BestOfferDetails><BestOfferEnabled>true</BestOfferEnabled><BestOfferCount>2</BestOfferCount></BestOfferDetails>
+        <PrimaryCategory><CategoryID>179697</CategoryID></PrimaryCategory></Item></GetItemResponse>"""
+
+
+class TestActiveListings:
+    def test_parse_active_ids(self):
+        ids, pages = ebay_list._parse_active_ids(_selling_xml(["1", "2", "1"], total_pages=3))
+        assert ids == ["1", "2"]
+        assert pages == 3
+
+    def test_parse_sold_list(self):
+        sold = """<OrderTransaction><Transaction><Buyer><UserID>x</UserID></Buyer><BuyerUserID>bob</BuyerUserID>
+            <Item><ItemID>9</ItemID><Title>Lens</Title></Item><TransactionPrice currencyID="AUD">45.5</TransactionPrice>
+            <OrderLineItemID>9-0</OrderLineItemID></Transaction></OrderTransaction>"""
+        items = ebay_list._parse_sold_list(_selling_xml([], sold=sold))
+        assert items[0]["item_id"] == "9"
+        assert items[0]["price"] == 45.5
+        assert items[0]["buyer"] == "bob"
+        assert items[0]["shipped"] is False
+
+    def test_iter_pages_and_details(self):
+        def fake_call(call_name, body, *args):
+            if call_name == "GetMyeBaySelling":
+                assert "<PageNumber>2</PageNumber>" in body
+                return _selling_xml(["3"], page=2, total_pages=2)
+            item_id = re.search(r"<ItemID>(\d+)</ItemID>", body).group(1)
+            return _item_xml(item_id, watchers=int(item_id))
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            items = list(ebay_list.iter_active_listings("tok", first_result=_selling_xml(["1", "2"], total_pages=2)))
+        assert [i["item_id"] for i in items] == ["1", "2", "3"]
+        assert items[2]["watchers"] == 3
+        assert items[0]["price"] == 100.0
+        assert items[0]["best_offer_enabled"] is True
+        assert items[0]["start_time"] == "2024-01-01T00:00:00.000Z"
+
+    def test_item_error_is_reported_not_raised(self):
+        with patch.object(ebay_list, "trading_api_call", side_effect=ebay_list.EbayApiError("boom")):
+            item = ebay_list.get_item_details("5", "tok")
+        assert item == {"item_id": "5", "error": "boom"}
+
+    def test_categories_ndjson(self, capsys):
+        import json
+        with patch("sys.argv", ["ebay_list.py", "categories", "drone", "--format", "ndjson"]):
+            ebay_list.main()
+        lines = capsys.readouterr().out.strip().splitlines()
+        records = [json.loads(line) for line in lines]
+        assert any(r["id"] == "179697" for r in records)
+
+
+# ---- Category classifier ----
+
+
+TRAINING_TITLES = [
+    ("DJI Mini 3 Pro drone with RC", "179697"),
+    ("DJI Mavic Air 2 drone fly more combo", "179697"),
+    ("Autel EVO drone 4K camera", "179697"),
+    ("Sony WH-1000XM4 wireless headphones", "112529"),
+    ("Bose QC35 noise cancelling headphones", "112529"),
+    ("Sennheiser HD 600 headphones", "112529"),
+    ("Ubiquiti UniFi switch 24 port", "11175"),
+    ("Netgear GS108 gigabit switch", "11175"),
+]
+
+
+class TestCategoryClassifier:
+    def test_predicts_trained_category(self):
+        model = ebay_list.train_category_model(TRAINING_TITLES)
+        predictions = ebay_list.predict_category(model, "DJI Mini 2 drone", k=3)
+        assert predictions[0]["id"] == "179697"
+        assert predictions[0]["name"] == "Camera Drones"
+        assert predictions[0]["confidence"] > 0.6
+        assert len(predictions) == 3
+        assert sum(p["confidence"] for p in predictions) <= 1.0001
+
+    def test_unknown_title(self):
+        model = ebay_list.train_category_model(TRAINING_TITLES)
+        assert ebay_list.predict_category(model, "zzzz qqqq") == []
+
+    def test_save_and_load(self, state_dir):
+        model = ebay_list.train_category_model(TRAINING_TITLES)
+        ebay_list.save_category_model(model)
+        assert (state_dir / "category_model.json.gz").exists()
+        loaded = ebay_list.load_category_model()
+        assert ebay_list.predict_category(loaded, "bose headphones")[0]["id"] == "112529"
+
+    def test_no_model(self, state_dir):
+        assert ebay_list.load_category_model() is None
+
+    def test_confident_prediction_used(self, state_dir):
+        ebay_list.save_category_model(ebay_list.train_category_model(TRAINING_TITLES))
+        with patch.object(ebay_list, "find_categories_online") as mock_live:
+            assert ebay_list._auto_select_category("Sennheiser headphones", "tok") == "112529"
+            mock_live.assert_not_called()
+
+    def test_low_confidence_falls_back_to_live_lookup(self, state_dir):
+        ebay_list.save_category_model(ebay_list.train_category_model(TRAINING_TITLES))
+        live = [{"id": "1", "name": "Branch", "leaf": False}, {"id": "48446", "name": "3D Printers", "leaf": True}]
+        with patch.object(ebay_list, "CLASSIFIER_MIN_CONFIDENCE", 1.1):
+            with patch.object(ebay_list, "find_categories_online", return_value=live):
+                assert ebay_list._auto_select_category("Prusa 3D printer", "tok") == "48446"
+
+
+# ---- Pre-submit validation ----
+
+
+class TestValidateListing:
+    def _validate(self, **overrides):
+        kwargs = dict(title="Sony A7 III body", description="Great camera", price=1500.0, image_count=3)
+        kwargs.update(overrides)
+        return ebay_list.validate_listing(**kwargs)
+
+    def test_valid_offline(self):
+        assert self._validate() == []
+
+    def test_reports_all_problems_at_once(self):
+        problems = self._validate(title="x" * 81, description="", price=0, image_count=0, best_offer_min=10.0)
+        assert len(problems) == 5
+        assert any("81 characters" in p for p in problems)
+        assert any("Description is empty" in p for p in problems)
+
+    def test_category_and_specifics_checks(self, state_dir):
+        specs = [{"name": "Brand", "required": True, "values": []}, {"name": "Colour", "required": False, "values": []}]
+        with patch.object(ebay_list, "validate_leaf_category", return_value=(True, "Digital Cameras")):
+            with patch.object(ebay_list, "get_category_specifics", return_value=specs):
+                problems = self._validate(category_id="31388", auth_token="tok", site_id="15")
+                assert problems == ["Missing required item specifics: Brand."]
+                assert self._validate(category_id="31388", item_specifics={"brand": "Sony"}, auth_token="tok", site_id="15") == []
+
+    def test_non_leaf_category(self, state_dir):
+        with patch.object(ebay_list, "validate_leaf_category", return_value=(False, "Cameras & Photo")):
+            problems = self._validate(category_id="625", auth_token="tok")
+        assert problems == ["Category 625 (Cameras & Photo) is not a leaf category."]
+
+    def test_metadata_is_cached(self, state_dir):
+        with patch.object(ebay_list, "validate_leaf_category", return_value=(True, "Digital Cameras")) as mock_leaf:
+            with patch.object(ebay_list, "get_category_specifics", return_value=[]) as mock_specs:
+                self._validate(category_id="31388", auth_token="tok")
+                self._validate(category_id="31388", auth_token="tok")
+        assert mock_leaf.call_count == 1
+        assert mock_specs.call_count == 1
+
+    def test_unavailable_metadata_does_not_block(self, state_dir):
+        with patch.object(ebay_list, "validate_leaf_category", return_value=(True, "")):
+            with patch.object(ebay_list, "_trading_api_call_safe", return_value=None):
+                assert self._validate(
+                    category_id="31388", auth_token="tok", domestic_services=[{"service": "AU_Made_Up"}]
+                ) == []
+
+    def test_unknown_shipping_service(self, state_dir):
+        details = """<GeteBayDetailsResponse>
+            <ShippingServiceDetails><ShippingService>AU_Regular</ShippingService><ValidForSellingFlow>true</ValidForSellingFlow></ShippingServiceDetails>
+            <ShippingServiceDetails><ShippingService>AU_Old</ShippingService><ValidForSellingFlow>false</ValidForSellingFlow></ShippingServiceDetails>
+        </GeteBayDetailsResponse>"""
+        with patch.object(ebay_list, "_trading_api_call_safe", return_value=details):
+            problems = self._validate(
+                auth_token="tok", site_id="15",
+                domestic_services=[{"service": "AU_Regular"}, {"service": "AU_Old"}],
+            )
+        assert problems == ["Unknown shipping service for this site: AU_Old."]
+
+
+# ---- Multi-marketplace listing ----
+
+
+AU_TREE = {
+    "625": {"name": "Cameras", "parent_id": "625", "leaf": False},
+    "179697": {"name": "Camera Drones", "parent_id": "625", "leaf": True},
+}
+UK_TREE = {
+    "1": {"name": "Toys", "parent_id": "1", "leaf": False},
+    "2": {"name": "Camera Drones", "parent_id": "1", "leaf": True},
+    "625": {"name": "Cameras & Photography", "parent_id": "625", "leaf": False},
+    "179697": {"name": "Camera Drones", "parent_id": "625", "leaf": False},
+    "9999": {"name": "Camera Drones", "parent_id": "625", "leaf": True},
+}
+
+
+class TestMultiMarketplace:
+    def test_map_category_by_name_and_parent(self):
+        tree_us = {"100": {"name": "Toys", "parent_id": "100", "leaf": False},
+                   "200": {"name": "Camera Drones", "parent_id": "100", "leaf": True},
+                   "300": {"name": "Cameras", "parent_id": "300", "leaf": False},
+                   "400": {"name": "Camera Drones", "parent_id": "300", "leaf": True}}
+        assert ebay_list.map_category("179697", AU_TREE, tree_us) == "400"
+
+    def test_map_category_name_only(self):
+        assert ebay_list.map_category("179697", AU_TREE, UK_TREE) in ("2", "9999")
+
+    def test_map_category_no_match(self):
+        assert ebay_list.map_category("179697", AU_TREE, {"5": {"name": "Books", "parent_id": "5", "leaf": True}}) == ""
+
+    def test_plan_with_overrides(self):
+        trees = {"15": AU_TREE, "3": UK_TREE, "0": {}}
+        with patch.object(ebay_list, "get_category_tree", side_effect=lambda tok, sb, site: trees[site]):
+            plans = ebay_list.plan_marketplaces(
+                ["AU", "UK", "US"], "179697", 500.0, [{"service": "AU_Regular", "cost": 15.0}], "tok",
+                site_prices={"UK": ["260"]},
+                site_shipping={"UK": ["UK_RoyalMailTracked:free"]},
+                site_categories={"US": ["179697"]},
+            )
+        au, uk, us = plans
+        assert (au["currency"], au["price"], au["category_id"]) == ("AUD", 500.0, "179697")
+        assert (uk["currency"], uk["price"], uk["site_id"]) == ("GBP", 260.0, "3")
+        assert uk["category_id"] in ("2", "9999")
+        assert uk["domestic_services"] == [{"service": "UK_RoyalMailTracked", "free": True}]
+        assert (us["currency"], us["category_id"]) == ("USD", "179697")
+        assert us["domestic_services"] == [{"service": "AU_Regular", "cost": 15.0}]
+
+    def test_plan_unmapped_category_raises(self):
+        with patch.object(ebay_list, "get_category_tree", return_value={}):
+            with pytest.raises(ebay_list.EbayApiError, match="--site-category UK="):
+                ebay_list.plan_marketplaces(["AU", "UK"], "179697", 10.0, [], "tok")
+
+    def test_parse_site_overrides(self):
+        assert ebay_list._parse_site_overrides(["uk=GBP", "UK=EUR"], "--site-currency") == {"UK": ["GBP", "EUR"]}
+        with pytest.raises(ebay_list.EbayApiError):
+            ebay_list._parse_site_overrides(["XX=1"], "--site-price")
+
+    def test_list_on_marketplaces_reports_per_site(self):
+        plans = [
+            {"marketplace": "AU", "site_id": "15", "category_id": "1", "price": 10.0, "currency": "AUD", "domestic_services": []},
+            {"marketplace": "UK", "site_id": "3", "category_id": "2", "price": 6.0, "currency": "GBP", "domestic_services": []},
+        ]
+
+        def fake_add(**kwargs):
+            if kwargs["marketplace"] == "UK":
+                raise ebay_list.EbayApiError("bad shipping")
+            assert kwargs["image_urls"] == ["https://i.ebayimg.com/1.jpg"]
+            return "111"
+
+        with patch.object(ebay_list, "trading_add_fixed_price_item", side_effect=fake_add):
+            results = ebay_list.list_on_marketplaces(plans, ["https://i.ebayimg.com/1.jpg"], "tok", title="T")
+        assert results == {"AU": {"item_id": "111"}, "UK": {"error": "bad shipping"}}
+
+    def test_list_on_marketplaces_network_error_fails_one_site(self):
+        import requests
+        plans = [
+            {"marketplace": "AU", "site_id": "15", "category_id": "1", "price": 10.0, "currency": "AUD", "domestic_services": []},
+            {"marketplace": "US", "site_id": "0", "category_id": "3", "price": 7.0, "currency": "USD", "domestic_services": []},
+        ]
+
+        def fake_add(**kwargs):
+            if kwargs["marketplace"] == "US":
+                raise requests.ConnectionError("connection reset")
+            return "111"
+
+        with patch.object(ebay_list, "trading_add_fixed_price_item", side_effect=fake_add):
+            results = ebay_list.list_on_marketplaces(plans, [], "tok", title="T")
+        assert results == {"AU": {"item_id": "111"}, "US": {"error": "connection reset"}}
+
+
+# ---- Accounts ----
+
+
+@pytest.fixture
+def accounts(state_dir):
+    import json
+    (state_dir / "accounts.json").write_text(json.dumps({
+        "shop-a": {"auth_token": "tok-a", "rate_per_second": 0},
+        "shop-b": {"auth_token_env": "SHOP_B_TOKEN", "sandbox": True},
+        "shop-c": {"client_id": "cid"},
+    }))
+    ebay_list._ACCOUNT_RUNTIME.clear()
+    yield state_dir
+    ebay_list._ACCOUNT_RUNTIME.clear()
+
+
+class TestAccounts:
+    def test_account_env(self, accounts):
+        assert ebay_list.account_env("shop-a") == {"mode": "authnauth", "auth_token": "tok-a", "sandbox": False, "account": "shop-a"}
+        with patch.dict(os.environ, {"SHOP_B_TOKEN": "tok-b"}):
+            env = ebay_list.get_env("shop-b")
+        assert env["auth_token"] == "tok-b"
+        assert env["sandbox"] is True
+
+    def test_bad_profiles(self, accounts):
+        with pytest.raises(ebay_list.EbayApiError, match="Unknown account"):
+            ebay_list.account_env("nope")
+        with pytest.raises(ebay_list.EbayApiError, match="client_secret, runame"):
+            ebay_list.account_env("shop-c")
+
+    def test_state_and_tokens_are_per_account(self, accounts):
+        assert ebay_list._state_path("sales.db") == str(accounts / "sales.db")
+        with ebay_list.use_account("shop-a"):
+            assert ebay_list.current_account() == "shop-a"
+            assert ebay_list._state_path("sales.db") == str(accounts / "accounts" / "shop-a" / "sales.db")
+            assert ebay_list._token_file().endswith(os.path.join("shop-a", "tokens.json"))
+        assert ebay_list.current_account() == ""
+
+    def test_account_follows_work_onto_threads(self, accounts):
+        with ebay_list.use_account("shop-a"):
+            seen = ebay_list._run_concurrently(lambda _: ebay_list.current_account(), [1, 2, 3])
+        assert seen == ["shop-a"] * 3
+
+    def test_named_account_uses_its_own_session(self, accounts):
+        session = MagicMock()
+        session.post.return_value = _streamed_response(b"<Ack>Success</Ack>")
+        ebay_list._ACCOUNT_RUNTIME["shop-a"] = {"session": session, "limiter": ebay_list.RateLimiter()}
+        with patch("requests.post") as module_post:
+            with ebay_list.use_account("shop-a"):
+                ebay_list.trading_api_call("GetItem", "", "tok-a")
+        session.post.assert_called_once()
+        module_post.assert_not_called()
+
+    def test_all_accounts_report_errors_per_account(self, accounts):
+        import requests
+
+        def fake_fetch(auth_token, *args, **kwargs):
+            raise requests.ConnectionError("connection reset")
+
+        with patch.object(ebay_list, "fetch_my_ebay_selling", side_effect=fake_fetch), \
+                patch.object(ebay_list, "sync_sales", side_effect=ebay_list.EbayApiError("PLAT_ERROR")):
+            dashboards = ebay_list._run_concurrently(ebay_list.collect_dashboard, ["shop-a", "shop-c"])
+            synced = ebay_list._run_concurrently(ebay_list.sync_account_sales, ["shop-a", "shop-c"])
+        assert dashboards[0] == {"account": "shop-a", "error": "connection reset"}
+        assert synced[0] == {"account": "shop-a", "error": "PLAT_ERROR"}
+        assert "client_secret, runame" in dashboards[1]["error"]
+        assert "client_secret, runame" in synced[1]["error"]
+
+    def test_token_refresh_uses_account_session_with_timeout(self, accounts):
+        import json
+        (accounts / "accounts.json").write_text(json.dumps({"shop-o": {"client_id": "cid", "client_secret": "sec", "runame": "ru"}}))
+        session = MagicMock()
+        session.post.return_value = MagicMock(status_code=200, json=lambda: {"access_token": "new", "expires_in": 7200})
+        ebay_list._ACCOUNT_RUNTIME["shop-o"] = {"session": session, "limiter": ebay_list.RateLimiter()}
+        with ebay_list.use_account("shop-o"):
+            tokens = ebay_list.refresh_token({"refresh_token": "r1"})
+        assert tokens["refresh_token"] == "r1"
+        kwargs = session.post.call_args[1]
+        assert kwargs["timeout"]
+        assert "grant_type=refresh_token&refresh_token=r1" in kwargs["data"]
+
+    def test_rate_limiter(self):
+        import time
+        limiter = ebay_list.RateLimiter(rate_per_second=50, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        assert time.monotonic() - start >= 0.09
+
+
+# ---- Record / replay ----
+
+
+class TestCassette:
+    def teardown_method(self):
+        ebay_list.stop_cassette()
+
+    def test_record_then_replay_offline(self, tmp_path):
+        cassette = str(tmp_path / "run.jsonl.gz")
+        responses = [_streamed_response(b"<Ack>Success</Ack><Title>First</Title>"),
+                     _streamed_response(b"<Ack>Success</Ack><Title>Second</Title>")]
+        ebay_list.start_recording(cassette)
+        with patch("requests.post", side_effect=responses):
+            ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "real-token")
+            ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "real-token")
+        ebay_list.stop_cassette()
+
+        ebay_list.start_replay(cassette, latency="zero")
+        with patch("requests.post", side_effect=AssertionError("network used")):
+            first = ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "other-token")
+            second = ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "other-token")
+            third = ebay_list.trading_api_call("GetItem", "<ItemID>1</ItemID>", "other-token")
+        assert "First" in first
+        assert "Second" in second and "Second" in third
+
+    def test_recorded_tokens_are_redacted(self, tmp_path):
+        import gzip
+        cassette = str(tmp_path / "run.jsonl.gz")
+        ebay_list.start_recording(cassette)
+        with patch("requests.post", side_effect=[
+                _streamed_response(b'{"access_token": "v^1.1#secret", "expires_in": 7200}'),
+                _streamed_response(b"<Ack>Success</Ack><eBayAuthToken>AgAAAA-secret</eBayAuthToken>")]), \
+                patch.object(ebay_list, "_app_credentials", return_value=("cid", "sec")):
+            assert ebay_list.get_application_token() == "v^1.1#secret"
+            ebay_list.trading_api_call("FetchToken", "", "")
+        ebay_list.stop_cassette()
+        with gzip.open(cassette, "rt") as f:
+            recorded = f.read()
+        assert "secret" not in recorded
+        assert recorded.count("REDACTED") == 2
+
+    def test_fingerprint_ignores_volatile_fields(self):
+        a = ebay_list._request_fingerprint("POST", "https://api.ebay.com/ws/api.dll", "GetMyMessages",
+                                           b"<eBayAuthToken>a</eBayAuthToken><StartCreationTime>2024-01-01T00:00:00.000Z</StartCreationTime>")
+        b = ebay_list._request_fingerprint("POST", "https://api.ebay.com/ws/api.dll", "GetMyMessages",
+                                           b"<eBayAuthToken>b</eBayAuthToken><StartCreationTime>2025-06-01T10:11:12.000Z</StartCreationTime>")
+        c = ebay_list._request_fingerprint("POST", "https://api.ebay.com/ws/api.dll", "GetMyMessages",
+                                           b"<FolderID>1</FolderID>")
+        assert a == b != c
+        assert a.startswith("GetMyMessages:")
+
+    def test_replay_miss_raises(self, tmp_path):
+        import gzip
+        cassette = tmp_path / "empty.jsonl.gz"
+        with gzip.open(cassette, "wt") as f:
+            f.write("")
+        ebay_list.start_replay(str(cassette), latency="zero")
+        with pytest.raises(ebay_list.EbayApiError, match="No recorded response for GetItem"):
+            ebay_list.trading_api_call("GetItem", "", "tok")
+
+    def test_replayed_main_flow(self, tmp_path, state_dir, capsys):
+        cassette = str(tmp_path / "dash.jsonl.gz")
+        ebay_list.start_recording(cassette)
+
+        def fake_post(url, headers, **kwargs):
+            if headers["X-EBAY-API-CALL-NAME"] == "GetMyeBaySelling":
+                return _streamed_response(_selling_xml(["42"]).encode())
+            return _streamed_response(_item_xml("42", price=12.5).encode())
+
+        with patch("requests.post", side_effect=fake_post):
+            with patch("sys.argv", ["ebay_list.py", "dashboard"]), patch.dict(os.environ, {"EBAY_AUTH_TOKEN": "t"}):
+                ebay_list.main()
+        ebay_list.stop_cassette()
+        recorded = capsys.readouterr().out
+
+        with patch("requests.post", side_effect=AssertionError("network used")):
+            argv = ["ebay_list.py", "--replay", cassette, "--replay-latency", "zero", "dashboard"]
+            with patch("sys.argv", argv), patch.dict(os.environ, {"EBAY_AUTH_TOKEN": "t"}):
+                ebay_list.main()
+        assert capsys.readouterr().out == recorded
+        assert "Item 42" in recorded
+
+
+# ---- Remote image probes ----
+
+
+def _probe_resp(status=200, content_type="image/jpeg", length="1000", content_range=""):
+    resp = MagicMock()
+    resp.status_code = status
+    headers = {"Content-Type": content_type}
+    if length:
+        headers["Content-Length"] = length
+    if content_range:
+        headers["Content-Range"] = content_range
+    resp.headers = headers
+    return resp
+
+
+class TestImageProbe:
+    def test_good_image_is_cached(self, state_dir):
+        with patch("requests.head", return_value=_probe_resp()) as mock_head:
+            assert ebay_list.probe_image_url("https://a.com/1.jpg")["ok"] is True
+            assert ebay_list.probe_image_url("https://a.com/1.jpg")["ok"] is True
+        assert mock_head.call_count == 1
+
+    def test_head_not_allowed_falls_back_to_range_get(self, state_dir):
+        with patch("requests.head", return_value=_probe_resp(status=405, content_type="")):
+            with patch("requests.get", return_value=_probe_resp(status=206, length="1", content_range="bytes 0-0/2048")) as mock_get:
+                result = ebay_list.probe_image_url("https://a.com/2.jpg")
+        assert mock_get.call_args[1]["headers"]["Range"] == "bytes=0-0"
+        assert result["ok"] is True
+        assert result["size"] == 2048
+
+    def test_bad_urls(self, state_dir):
+        cases = {
+            "https://a.com/404.jpg": _probe_resp(status=404),
+            "https://a.com/page.html": _probe_resp(content_type="text/html"),
+            "https://a.com/huge.jpg": _probe_resp(length=str(20 * 1024 * 1024)),
+        }
+        with patch("requests.head", side_effect=lambda url, **kw: cases[url]):
+            results = ebay_list.probe_image_urls(list(cases))
+        assert [r["ok"] for r in results] == [False, False, False]
+        assert results[0]["error"] == "HTTP 404"
+        assert "not an image" in results[1]["error"]
+        assert "too large" in results[2]["error"]
+
+    def test_resolve_images_fails_before_uploading(self, state_dir):
+        import requests
+        with patch("requests.head", side_effect=requests.ConnectionError("down")):
+            with patch("os.path.isfile", return_value=True):
+                with patch.object(ebay_list, "upload_picture") as mock_upload:
+                    with pytest.raises(ebay_list.EbayApiError, match="unreachable"):
+                        ebay_list.resolve_images(["local.jpg", "https://dead.example/x.jpg"], "tok", probe_remote=True)
+        mock_upload.assert_not_called()
+
+    def test_external_picture_mode_hosts_remote_urls(self):
+        def fake_call(call_name, body, token, sandbox):
+            url = re.search(r"<ExternalPictureURL>(.*?)</ExternalPictureURL>", body).group(1)
+            return f"<Ack>Success</Ack><FullURL>https://i.ebayimg.com/{url[-5:]}</FullURL>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            with patch.object(ebay_list, "upload_picture", return_value="https://i.ebayimg.com/local") as mock_upload:
+                with patch("os.path.isfile", return_value=True):
+                    urls = ebay_list.resolve_images(
+                        ["https://a.com/1.jpg", "local.jpg", "https://a.com/2.jpg"], "tok", picture_mode="external",
+                    )
+        assert urls == ["https://i.ebayimg.com/1.jpg", "https://i.ebayimg.com/local", "https://i.ebayimg.com/2.jpg"]
+        assert mock_call.call_count == 2
+        assert all(c[0][0] == "UploadSiteHostedPictures" for c in mock_call.call_args_list)
+        mock_upload.assert_called_once()
+
+    def test_external_picture_failure_raises(self):
+        failure = "<Ack>Failure</Ack><LongMessage>Unable to fetch image</LongMessage>"
+        with patch.object(ebay_list, "trading_api_call", return_value=failure):
+            with pytest.raises(ebay_list.EbayApiError, match="Unable to fetch image"):
+                ebay_list.resolve_images(["https://a.com/1.jpg"], "tok", picture_mode="external")
+
+
+NOTIFY_KEYS = {"dev_id": "dev", "app_id": "app", "cert_id": "cert"}
+
+
+def _parsed(event, keys=NOTIFY_KEYS, timestamp=""):
+    import io
+    return ebay_list.parse_notification(io.BytesIO(ebay_list.build_notification(event, keys, timestamp)))
+
+
+class TestNotifications:
+    def test_signature_matches_ebay_scheme(self):
+        import base64, hashlib
+        expected = base64.b64encode(hashlib.md5(b"2026-10-19T10:00:00.000Zdevappcert").digest()).decode()
+        assert ebay_list.notification_signature("2026-10-19T10:00:00.000Z", NOTIFY_KEYS) == expected
+
+    def test_parse_extracts_paths_and_signature(self):
+        note = _parsed("BestOffer")
+        assert note["event"] == "BestOffer"
+        assert note["fields"]["Item/ItemID"] == "110000000003"
+        assert note["fields"]["BestOfferArray/BestOffer/Price@currencyID"] == "AUD"
+        assert ebay_list.verify_notification(note, NOTIFY_KEYS) == ""
+
+    def test_rejects_forged_and_stale(self):
+        assert ebay_list.verify_notification(_parsed("ItemSold"), {**NOTIFY_KEYS, "cert_id": "other"}) == "bad signature"
+        stale = _parsed("ItemSold", timestamp="2020-01-01T00:00:00.000Z")
+        assert ebay_list.verify_notification(stale, NOTIFY_KEYS) == "stale Timestamp"
+
+    def test_apply_updates_local_stores(self, state_dir):
+        for event in ebay_list.NOTIFICATION_EVENTS:
+            ebay_list.apply_notification(_parsed(event))
+        sales = {r["transaction_key"]: dict(r) for r in ebay_list.open_sales_store().execute("SELECT * FROM sales")}
+        assert sales["110000000001-0"]["price"] == 75.0
+        assert sales["110000000002-900000000001"]["buyer"] == "test_buyer"
+        offer = ebay_list.open_offer_store().execute("SELECT * FROM offers").fetchone()
+        assert (offer["offer_id"], offer["price"], offer["status"]) == ("5000000001", 85.0, "Pending")
+        msg = ebay_list.open_message_store().execute("SELECT * FROM messages").fetchone()
+        assert msg["subject"] == "Is this still available?"
+        assert msg["read"] == 0
+
+    def test_server_round_trip(self, state_dir):
+        import threading
+        events = []
+        server = ebay_list.make_notification_server("127.0.0.1", 0, keys=NOTIFY_KEYS, on_event=events.append)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        try:
+            assert ebay_list.send_test_notification(url, "BestOffer", NOTIFY_KEYS) == 200
+            assert ebay_list.send_test_notification(url, "BestOffer", {**NOTIFY_KEYS, "dev_id": "x"}) == 403
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert events[0].startswith("BestOffer: AUD 85.0")
+        assert events[1] == "Rejected BestOffer: bad signature"
+
+    def test_subscribe_enables_events(self):
+        with patch.object(ebay_list, "trading_api_call", return_value="<Ack>Success</Ack>") as mock_call:
+            ebay_list.subscribe_notifications("https://hooks.example/ebay", "tok", events=["BestOffer"])
+        call_name, body = mock_call.call_args[0][:2]
+        assert call_name == "SetNotificationPreferences"
+        assert "<ApplicationURL>https://hooks.example/ebay</ApplicationURL>" in body
+        assert "<EventType>BestOffer</EventType><EventEnable>Enable</EventEnable>" in body
+
+
+def _offer(offer_id, price, item_id="1", quantity=1):
+    return {"offer_id": offer_id, "item_id": item_id, "buyer": f"buyer{offer_id}", "price": price,
+            "currency": "AUD", "quantity": quantity, "message": "", "status": "Pending", "expires_at": ""}
+
+
+def _best_offers_xml(*offers):
+    blocks = "".join(
+        f"""<BestOffer><BestOfferID>{o}</BestOfferID><Buyer><UserID>b{o}</UserID></Buyer>
+            <Price currencyID="AUD">{p}</Price><Quantity>1</Quantity><Status>Pending</Status></BestOffer>"""
+        for o, p in offers
+    )
+    return f"<GetBestOffersResponse><Ack>Success</Ack><BestOfferArray>{blocks}</BestOfferArray></GetBestOffersResponse>"
+
+
+class TestBestOffers:
+    ITEM = {"item_id": "1", "title": "Lens", "price": 100.0, "quantity": 1,
+            "best_offer_min": None, "start_time": "2026-10-01T00:00:00.000Z"}
+    NOW = ebay_list.datetime(2026, 10, 19, tzinfo=ebay_list.timezone.utc)
+
+    def test_threshold_rules(self):
+        offers = [_offer("a", 95), _offer("b", 50), _offer("c", 75)]
+        decisions = ebay_list.evaluate_offers(self.ITEM, offers, {"counter_pct": 85}, now=self.NOW)
+        by_id = {d["offer_id"]: d for d in decisions}
+        assert by_id["a"]["action"] == "Accept"
+        assert by_id["b"]["action"] == "Decline"
+        assert by_id["c"]["action"] == "Counter"
+        assert by_id["c"]["counter_price"] == 85.0
+
+    def test_offer_above_counter_price_accepted_not_countered(self):
+        decisions = ebay_list.evaluate_offers(self.ITEM, [_offer("a", 80)], {"counter_pct": 70}, now=self.NOW)
+        assert decisions[0]["action"] == "Accept"
+        assert decisions[0]["counter_price"] is None
+
+    def test_accepts_capped_at_quantity_and_listing_minimum(self):
+        item = {**self.ITEM, "best_offer_min": 80.0}
+        decisions = ebay_list.evaluate_offers(item, [_offer("a", 92), _offer("b", 97), _offer("c", 79)], {}, now=self.NOW)
+        by_id = {d["offer_id"]: d for d in decisions}
+        assert by_id["b"]["action"] == "Accept"
+        assert by_id["a"]["action"] == ""
+        assert by_id["c"]["action"] == "Decline"
+        assert "minimum" in by_id["c"]["reason"]
+
+    def test_aged_listings_accept_lower(self):
+        rules = {"aged_days": 14, "aged_accept_pct": 80}
+        fresh = {**self.ITEM, "start_time": "2026-10-15T00:00:00.000Z"}
+        assert ebay_list.evaluate_offers(fresh, [_offer("a", 82)], rules, now=self.NOW)[0]["action"] == ""
+        assert ebay_list.evaluate_offers(self.ITEM, [_offer("a", 82)], rules, now=self.NOW)[0]["action"] == "Accept"
+
+    def test_declines_batched_per_item(self):
+        decisions = [
+            {**_offer("a", 10), "action": "Decline"}, {**_offer("b", 10), "action": "Decline"},
+            {**_offer("c", 99), "action": "Accept"}, {**_offer("d", 10, item_id="2"), "action": "Decline"},
+            {**_offer("e", 80), "action": ""},
+        ]
+        batches = ebay_list._offer_batches(decisions)
+        assert [[d["offer_id"] for d in b] for b in batches] == [["c"], ["a", "b"], ["d"]]
+
+    def test_network_error_fails_only_its_batch(self, state_dir):
+        import requests
+        decisions = [{**_offer(o, p, item_id=i), "item_title": "Lens", "action": a}
+                     for o, p, i, a in (("a", 99, "1", "Accept"), ("b", 10, "2", "Decline"))]
+
+        def fake_call(call_name, body, *args):
+            if "<BestOfferID>b</BestOfferID>" in body:
+                raise requests.ConnectionError("connection reset")
+            return "<Ack>Success</Ack>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            sent = ebay_list.respond_to_offers(decisions, "tok")
+        assert ["error" in d for d in sent] == [False, True]
+        rows = dict(ebay_list.open_offer_store().execute("SELECT offer_id, status FROM offers").fetchall())
+        assert rows == {"a": "Accepted"}
+
+    def test_process_end_to_end(self, state_dir):
+        calls = []
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            calls.append((call_name, body))
+            if call_name == "GetMyeBaySelling":
+                return _selling_xml(["1", "2"])
+            if call_name == "GetItem":
+                item_id = re.search(r"<ItemID>(\d+)</ItemID>", body).group(1)
+                return _item_xml(item_id).replace("<BestOfferCount>2", "<BestOfferCount>0" if item_id == "2" else "<BestOfferCount>2")
+            if call_name == "GetBestOffers":
+                return _best_offers_xml(("o1", 95.0), ("o2", 40.0))
+            return "<Ack>Success</Ack>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            dry = ebay_list.process_best_offers("tok", dry_run=True)
+            assert [d["action"] for d in dry] == ["Accept", "Decline"]
+            assert not any(c[0] == "RespondToBestOffer" for c in calls)
+            ebay_list.process_best_offers("tok", seller_response="Thanks!")
+
+        assert sum(c[0] == "GetBestOffers" for c in calls) == 2  # item 2 has no offers
+        responds = [body for name, body in calls if name == "RespondToBestOffer"]
+        assert len(responds) == 2
+        assert any("<Action>Accept</Action>" in b and "<BestOfferID>o1</BestOfferID>" in b for b in responds)
+        rows = dict(ebay_list.open_offer_store().execute("SELECT offer_id, status FROM offers").fetchall())
+        assert rows == {"o1": "Accepted", "o2": "Declined"}
+
+
+def _sold_entry(item_id, transaction_id, shipped=False):
+    shipped_xml = "<ShippedTime>2026-10-01T00:00:00.000Z</ShippedTime>" if shipped else ""
+    return f"""<OrderTransaction><Transaction><Item><ItemID>{item_id}</ItemID><Title>T</Title></Item>
+        <TransactionID>{transaction_id}</TransactionID><OrderLineItemID>{item_id}-{transaction_id}</OrderLineItemID>
+        <TransactionPrice currencyID="AUD">10.0</TransactionPrice>{shipped_xml}</Transaction></OrderTransaction>"""
+
+
+class TestShipBatch:
+    def _csv(self, tmp_path, rows):
+        path = tmp_path / "ship.csv"
+        path.write_text("Order ID,Carrier,Tracking Number\n" + "".join(f"{o},{c},{t}\n" for o, c, t in rows))
+        return str(path)
+
+    def test_csv_header_aliases(self, tmp_path):
+        rows = ebay_list.load_shipments_csv(self._csv(tmp_path, [("1-2", "AusPost", "AP1")]))
+        assert rows == [{"order_id": "1-2", "carrier": "AusPost", "tracking": "AP1"}]
+
+    def test_missing_column_raises(self, tmp_path):
+        path = tmp_path / "bad.csv"
+        path.write_text("order_id,carrier\n1-2,AusPost\n")
+        with pytest.raises(ebay_list.EbayApiError, match="tracking"):
+            ebay_list.load_shipments_csv(str(path))
+
+    def test_upload_report_and_rerun(self, state_dir):
+        sold = _selling_xml([], sold=_sold_entry("11", "1") + _sold_entry("22", "2") + _sold_entry("33", "3", shipped=True))
+        conn = ebay_list.open_sales_store()
+        conn.execute("INSERT INTO sales (transaction_key, item_id, transaction_id, order_id) VALUES ('44-4', '44', '4', '07-1234-5678')")
+        conn.commit()
+        calls = []
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            calls.append((call_name, body))
+            if call_name == "GetMyeBaySelling":
+                return sold
+            if "<ItemID>22</ItemID>" in body:
+                return "<Ack>Failure</Ack><LongMessage>Invalid carrier</LongMessage>"
+            return "<Ack>Success</Ack>"
+
+        path = self._csv(state_dir, [("11-1", "AusPost", "AP1"), ("22-2", "Bogus", "X"), ("33-3", "AusPost", "AP3"),
+                                     ("07-1234-5678", "DHL", "D4"), ("99-9", "AusPost", "AP9")])
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            results = ebay_list.ship_batch(path, "tok")
+        assert [r["status"] for r in results] == ["uploaded", "failed", "skipped", "uploaded", "unmatched"]
+        assert results[1]["detail"] == "Invalid carrier"
+        complete = [b for name, b in calls if name == "CompleteSale"]
+        assert len(complete) == 3
+        assert any("<OrderID>07-1234-5678</OrderID>" in b and "<ShipmentTrackingNumber>D4" in b for b in complete)
+
+        calls.clear()
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            rerun = ebay_list.ship_batch(path, "tok")
+        assert [r["status"] for r in rerun] == ["skipped", "failed", "skipped", "skipped", "unmatched"]
+        assert [b for name, b in calls if name == "CompleteSale"] == [complete[1]]
+
+    def test_connection_error_fails_one_row_and_keeps_ledger(self, state_dir):
+        import requests
+        sold = _selling_xml([], sold=_sold_entry("11", "1") + _sold_entry("22", "2"))
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            if call_name == "GetMyeBaySelling":
+                return sold
+            if "<ItemID>22</ItemID>" in body:
+                raise requests.ConnectionError("connection reset")
+            return "<Ack>Success</Ack>"
+
+        path = self._csv(state_dir, [("11-1", "AusPost", "AP1"), ("22-2", "AusPost", "AP2")])
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            results = ebay_list.ship_batch(path, "tok")
+        assert [r["status"] for r in results] == ["uploaded", "failed"]
+        assert "connection reset" in results[1]["detail"]
+        ledger = ebay_list.open_sales_store().execute("SELECT order_id, tracking FROM shipments").fetchall()
+        assert [tuple(r) for r in ledger] == [("11-1", "AP1")]
+
+    def test_split_shipment_keeps_both_tracking_numbers(self, state_dir):
+        import requests
+        calls = []
+        state = {"shipped": False, "fail": "AP2"}
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            if call_name == "GetMyeBaySelling":
+                return _selling_xml([], sold=_sold_entry("11", "1", shipped=state["shipped"]))
+            calls.append(body)
+            if state["fail"] and f"<ShipmentTrackingNumber>{state['fail']}<" in body:
+                raise requests.Timeout("read timed out")
+            return "<Ack>Success</Ack>"
+
+        path = self._csv(state_dir, [("11-1", "AusPost", "AP1"), ("11-1", "AusPost", "AP2")])
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            assert [r["status"] for r in ebay_list.ship_batch(path, "tok")] == ["uploaded", "failed"]
+            # eBay now shows the order shipped (by us): the missing tracking number is still sent
+            state.update(shipped=True, fail="")
+            calls.clear()
+            assert [r["status"] for r in ebay_list.ship_batch(path, "tok")] == ["skipped", "uploaded"]
+            assert len(calls) == 1 and "AP2" in calls[0]
+            calls.clear()
+            assert [r["detail"] for r in ebay_list.ship_batch(path, "tok")] == ["already uploaded"] * 2
+        assert calls == []
+        ledger = ebay_list.open_sales_store().execute("SELECT tracking FROM shipments ORDER BY tracking").fetchall()
+        assert [r[0] for r in ledger] == ["AP1", "AP2"]
+
+    def test_combined_order_shipped_as_one(self, state_dir):
+        order = """<OrderTransaction><Order><OrderID>07-12345-67890</OrderID><TransactionArray>
+            <Transaction><Item><ItemID>55</ItemID></Item><TransactionID>5</TransactionID>
+              <OrderLineItemID>55-5</OrderLineItemID></Transaction>
+            <Transaction><Item><ItemID>66</ItemID></Item><TransactionID>6</TransactionID>
+              <OrderLineItemID>66-6</OrderLineItemID></Transaction>
+            </TransactionArray></Order></OrderTransaction>"""
+        sold = ebay_list._parse_sold_list(_selling_xml([], sold=order))
+        assert [(s["order_id"], s["order"]) for s in sold] == [("55-5", "07-12345-67890"), ("66-6", "07-12345-67890")]
+        calls = []
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            calls.append((call_name, body))
+            return _selling_xml([], sold=order) if call_name == "GetMyeBaySelling" else "<Ack>Success</Ack>"
+
+        path = self._csv(state_dir, [("07-12345-67890", "AusPost", "AP5")])
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            results = ebay_list.ship_batch(path, "tok")
+        assert [r["status"] for r in results] == ["uploaded"]
+        complete = [b for name, b in calls if name == "CompleteSale"]
+        assert len(complete) == 1
+        assert "<OrderID>07-12345-67890</OrderID>" in complete[0] and "<TransactionID>" not in complete[0]
+
+
+class TestBulkEndRelist:
+    def test_read_item_ids(self, tmp_path):
+        path = tmp_path / "ids.txt"
+        path.write_text("# stale\n111, old lens\n\n222\n111\nnot-an-id\n")
+        assert ebay_list.read_item_ids(str(path)) == ["111", "222"]
+
+    def test_listing_filters(self):
+        now = ebay_list.datetime(2026, 10, 19, tzinfo=ebay_list.timezone.utc)
+        item = {"item_id": "1", "title": "Canon Lens", "watchers": 0, "category_id": "3323",
+                "start_time": "2026-07-01T00:00:00.000Z"}
+        assert ebay_list.listing_matches(item, {"older_than_days": 60, "max_watchers": 0, "title": "canon"}, now)
+        assert not ebay_list.listing_matches(item, {"older_than_days": 200}, now)
+        assert not ebay_list.listing_matches({**item, "watchers": 3}, {"max_watchers": 0}, now)
+        assert not ebay_list.listing_matches(item, {"category_id": "999"}, now)
+
+    def test_end_items_batches_of_ten(self):
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            ids = re.findall(r"<ItemID>(\d+)</ItemID>", body)
+            containers = "".join(
+                f"<EndItemResponseContainer><CorrelationID>{n}</CorrelationID>"
+                + ("<Errors><LongMessage>Item already ended</LongMessage></Errors>" if item_id == "1005"
+                   else "<EndTime>2026-10-19T00:00:00.000Z</EndTime>")
+                + "</EndItemResponseContainer>"
+                for n, item_id in enumerate(ids)
+            )
+            return f"<EndItemsResponse><Ack>PartialFailure</Ack>{containers}</EndItemsResponse>"
+
+        ids = [str(1000 + n) for n in range(23)]
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            results = ebay_list.end_items(ids, "tok", reason="Incorrect")
+        assert mock_call.call_count == 3
+        assert all(c[0][0] == "EndItems" and "<EndingReason>Incorrect</EndingReason>" in c[0][1] for c in mock_call.call_args_list)
+        assert [r["item_id"] for r in results] == ids
+        assert results[5] == {"item_id": "1005", "error": "Item already ended"}
+        assert results[22]["end_time"] == "2026-10-19T00:00:00.000Z"
+
+    def test_end_items_warning_is_not_a_failure(self):
+        warning = "<Errors><SeverityCode>Warning</SeverityCode><LongMessage>Listing had bids</LongMessage></Errors>"
+        result = ("<EndItemsResponse><Ack>Warning</Ack><EndItemResponseContainer><CorrelationID>0</CorrelationID>"
+                  f"<EndTime>2026-10-19T00:00:00.000Z</EndTime>{warning}</EndItemResponseContainer></EndItemsResponse>")
+        with patch.object(ebay_list, "trading_api_call", return_value=result):
+            assert ebay_list.end_items(["1"], "tok") == [{"item_id": "1", "end_time": "2026-10-19T00:00:00.000Z"}]
+        partial = result.replace("<Ack>Warning</Ack>", "<Ack>PartialFailure</Ack>")
+        with patch.object(ebay_list, "trading_api_call", return_value=partial):
+            assert "error" not in ebay_list.end_items(["1"], "tok")[0]
+
+    def test_network_error_fails_only_its_batch_or_item(self):
+        import requests
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            if "<ItemID>1000</ItemID>" in body or "<ItemID>2</ItemID>" in body:
+                raise requests.ConnectionError("connection reset")
+            if call_name == "EndItems":
+                ids = re.findall(r"<ItemID>(\d+)</ItemID>", body)
+                return "<Ack>Success</Ack>" + "".join(
+                    f"<EndItemResponseContainer><CorrelationID>{n}</CorrelationID><EndTime>T</EndTime></EndItemResponseContainer>"
+                    for n in range(len(ids)))
+            return "<Ack>Success</Ack><ItemID>91</ItemID>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            ended = ebay_list.end_items([str(1000 + n) for n in range(12)], "tok")
+            relisted = ebay_list.relist_items(["1", "2"], "tok")
+        assert ["error" in r for r in ended] == [True] * 10 + [False] * 2
+        assert "connection reset" in ended[0]["error"]
+        assert relisted == [{"item_id": "1", "new_item_id": "91"}, {"item_id": "2", "error": "connection reset"}]
+
+    def test_relist_with_overrides(self):
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            old = re.search(r"<ItemID>(\d+)</ItemID>", body).group(1)
+            if old == "2":
+                return "<Ack>Failure</Ack><LongMessage>Item is still active</LongMessage>"
+            return f"<Ack>Success</Ack><ItemID>9{old}</ItemID>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            results = ebay_list.relist_items(["1", "2"], "tok", price=49.5, quantity=2)
+        body = mock_call.call_args_list[0][0][1]
+        assert '<StartPrice currencyID="AUD">49.50</StartPrice>' in body and "<Quantity>2</Quantity>" in body
+        assert results == [{"item_id": "1", "new_item_id": "91"}, {"item_id": "2", "error": "Item is still active"}]
+
+    def test_requires_selection(self, capsys):
+        with patch.dict(os.environ, {"EBAY_AUTH_TOKEN": "tok"}):
+            with patch("sys.argv", ["ebay_list.py", "end-batch"]):
+                with pytest.raises(SystemExit):
+                    ebay_list.main()
+        assert "--ids-file" in capsys.readouterr().err
+
+
+class TestReprice:
+    NOW = ebay_list.datetime(2026, 10, 19, tzinfo=ebay_list.timezone.utc)
+    ITEM = {"item_id": "1", "title": "Lens", "price": 100.0, "currency": "AUD", "watchers": 0,
+            "category_id": "3323", "best_offer_enabled": True, "best_offer_min": None, "best_offer_auto_accept": None,
+            "start_time": "2026-09-01T00:00:00.000Z"}
+    RULES = [
+        {"name": "watched", "when": {"min_watchers": 1}, "price_pct": 0},
+        {"name": "stale", "when": {"older_than_days": 30, "max_watchers": 0}, "price_pct": -5, "floor": 20,
+         "round_to": 0.5, "best_offer_min_pct": 70, "best_offer_auto_accept_pct": 90},
+    ]
+
+    def test_first_matching_rule_computes_values(self):
+        plan = ebay_list.plan_reprice(self.ITEM, self.RULES, self.NOW)
+        assert plan["rule"] == "stale"
+        assert plan["changes"] == {"price": 95.0, "best_offer_min": 66.5, "best_offer_auto_accept": 85.5}
+
+    def test_unchanged_and_unmatched(self):
+        assert ebay_list.plan_reprice({**self.ITEM, "watchers": 2}, self.RULES, self.NOW)["changes"] == {}
+        fresh = {**self.ITEM, "start_time": "2026-10-10T00:00:00.000Z"}
+        assert ebay_list.plan_reprice(fresh, self.RULES, self.NOW) is None
+
+    def test_floor_and_invalid_thresholds(self):
+        plan = ebay_list.plan_reprice({**self.ITEM, "price": 20.0}, self.RULES, self.NOW)
+        assert plan["new"]["price"] == 20.0
+        bad = ebay_list.plan_reprice({**self.ITEM, "best_offer_auto_accept": 98.0},
+                                     [{"name": "cut", "price_pct": -5}], self.NOW)
+        assert "auto-accept" in bad["error"]
+
+    def test_listing_below_floor_skipped_not_raised(self):
+        plan = ebay_list.plan_reprice({**self.ITEM, "price": 15.0}, self.RULES, self.NOW)
+        assert plan["changes"] == {}
+        assert "below the floor 20.00" in plan["skipped"]
+
+    def test_best_offer_untouched_when_disabled(self):
+        plan = ebay_list.plan_reprice({**self.ITEM, "best_offer_enabled": False}, self.RULES, self.NOW)
+        assert plan["changes"] == {"price": 95.0}
+
+    def test_minimum_checked_against_price_without_auto_accept(self):
+        bad = ebay_list.plan_reprice({**self.ITEM, "best_offer_min": 97.0}, [{"name": "cut", "price_pct": -5}], self.NOW)
+        assert "best-offer minimum 97.0 must be below the price 95.0" in bad["error"]
+
+    def test_price_driven_to_zero_is_an_error(self):
+        plan = ebay_list.plan_reprice({**self.ITEM, "price": 10.0}, [{"name": "cut", "price_delta": -15}], self.NOW)
+        assert "must be above zero" in plan["error"]
+
+    def test_network_error_reported_per_listing(self, state_dir):
+        import requests
+
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            if call_name == "GetMyeBaySelling":
+                return _selling_xml(["1", "2"])
+            if call_name == "GetItem":
+                item_id = re.search(r"<ItemID>(\d+)</ItemID>", body).group(1)
+                return _item_xml(item_id, start_time="2026-01-01T00:00:00.000Z")
+            if "<ItemID>2</ItemID>" in body:
+                raise requests.ConnectionError("connection reset")
+            return "<Ack>Success</Ack>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            plans = ebay_list.reprice_listings(self.RULES, "tok")
+        assert plans[0]["revised"] is True
+        assert "connection reset" in plans[1]["error"]
+
+    def test_unknown_rule_keys_rejected(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text('[{"when": {"age": 30}, "price_pct": -5}]')
+        with pytest.raises(ebay_list.EbayApiError, match="age"):
+            ebay_list.load_reprice_rules(str(path))
+
+    def test_pushes_only_changed_listings(self, state_dir):
+        def fake_call(call_name, body, token, sandbox, site_id="0"):
+            if call_name == "GetMyeBaySelling":
+                return _selling_xml(["1", "2"])
+            if call_name == "GetItem":
+                item_id = re.search(r"<ItemID>(\d+)</ItemID>", body).group(1)
+                return _item_xml(item_id, watchers=0 if item_id == "1" else 5, start_time="2026-01-01T00:00:00.000Z")
+            return "<Ack>Success</Ack>"
+
+        with patch.object(ebay_list, "trading_api_call", side_effect=fake_call) as mock_call:
+            dry = ebay_list.reprice_listings(self.RULES, "tok", dry_run=True)
+            assert not any(c[0][0] == "ReviseFixedPriceItem" for c in mock_call.call_args_list)
+            plans = ebay_list.reprice_listings(self.RULES, "tok")
+        revises = [c[0][1] for c in mock_call.call_args_list if c[0][0] == "ReviseFixedPriceItem"]
+        assert len(dry) == len(plans) == 2
+        assert len(revises) == 1
+        assert "<ItemID>1</ItemID>" in revises[0] and ">95.0</StartPrice>" in revises[0]
+        assert [p.get("revised", False) for p in plans] == [True, False]
+
+
+class TestRevisionSnapshots:
+    def test_only_changed_fields_sent_and_noop_skipped(self, state_dir):
+        description = "<p>" + "Long HTML " * 1000 + "</p>"
+        ebay_list.save_snapshot("7", {"price": 50.0, "title": "Lens", "description": description, "best_offer_min": 30.0})
+        assert "description" not in ebay_list.load_snapshot("7")
+        with patch.object(ebay_list, "trading_api_call", return_value="<Ack>Success</Ack>") as mock_call:
+            ebay_list.revise_fixed_price_item("7", "tok", price=45.0, title="Lens", description=description,
+                                              best_offer_min=30.0, best_offer_auto_accept=40.0)
+            body = mock_call.call_args[0][1]
+            assert "<StartPrice" in body and "<BestOfferAutoAcceptPrice" in body
+            assert "<Title>" not in body and "<Description>" not in body and "<MinimumBestOfferPrice" not in body
+
+            mock_call.reset_mock()
+            ebay_list.revise_fixed_price_item("7", "tok", price=45.0, description=description, best_offer_auto_accept=40.0)
+            mock_call.assert_not_called()
+
+            ebay_list.revise_fixed_price_item("7", "tok", price=45.0, force=True)
+            assert mock_call.call_count == 1
+
+    def test_failed_revision_keeps_snapshot(self, state_dir):
+        ebay_list.save_snapshot("8", {"price": 50.0})
+        with patch.object(ebay_list, "trading_api_call", return_value="<Ack>Failure</Ack><LongMessage>nope</LongMessage>"):
+            with pytest.raises(ebay_list.EbayApiError):
+                ebay_list.revise_fixed_price_item("8", "tok", price=40.0)
+        assert ebay_list.load_snapshot("8")["price"] == 50.0
+
+    def test_new_listing_seeds_snapshot(self, state_dir):
+        with patch.object(ebay_list, "resolve_condition", return_value="3000"):
+            with patch.object(ebay_list, "trading_api_call", return_value="<Ack>Success</Ack><ItemID>99</ItemID>"):
+                ebay_list.trading_add_fixed_price_item(
+                    title="Lens", description="Desc", price=50.0, condition="USED_GOOD",
+                    image_urls=["https://example.com/img.jpg"], category_id="31388", auth_token="tok",
+                )
+        snapshot = ebay_list.load_snapshot("99")
+        assert snapshot["price"] == 50.0
+        assert len(snapshot["description_sha256"]) == 64
+
+
+class TestCircuitBreaker:
+    def _fail(self, status=503):
+        resp = MagicMock(status_code=status, text="Service Unavailable", content=b"Service Unavailable")
+        return resp
+
+    def test_trips_after_threshold_and_short_circuits(self, capsys):
+        with patch("requests.post", return_value=self._fail()) as mock_post:
+            for _ in range(ebay_list.BREAKER_THRESHOLD):
+                with pytest.raises(ebay_list.EbayApiError, match="503"):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+            with pytest.raises(ebay_list.EbayApiError, match="circuit open"):
+                ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        assert mock_post.call_count == ebay_list.BREAKER_THRESHOLD
+        assert "Circuit breaker tripped for GetCategorySpecifics" in capsys.readouterr().err
+        assert ebay_list.breaker_status()[0]["state"] == "open"
+
+    def test_other_calls_and_client_errors_unaffected(self):
+        with patch("requests.post", return_value=self._fail(status=400)):
+            for _ in range(5):
+                with pytest.raises(ebay_list.EbayApiError, match="400"):
+                    ebay_list.trading_api_call("GetItem", "", "tok")
+        assert ebay_list.breaker_status() == []
+
+    def test_connection_errors_count_and_state_persists(self):
+        import requests
+        with patch("requests.post", side_effect=requests.ConnectionError("reset")):
+            for _ in range(3):
+                with pytest.raises(requests.ConnectionError):
+                    ebay_list.trading_api_call("GetSuggestedCategories", "", "tok")
+        ebay_list._BREAKER_STATE["path"] = ""  # force a reload, as a new run would
+        assert ebay_list.breaker_status()[0]["call"] == "GetSuggestedCategories"
+
+    def test_half_open_probe_closes_or_reopens(self, capsys):
+        with patch("requests.post", return_value=self._fail()):
+            for _ in range(3):
+                with pytest.raises(ebay_list.EbayApiError):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        later = ebay_list.time.time() + ebay_list.BREAKER_COOLDOWN + 1
+        with patch.object(ebay_list.time, "time", return_value=later):
+            assert ebay_list.breaker_status()[0]["state"] == "half-open"
+            with patch("requests.post", return_value=self._fail()) as mock_post:
+                with pytest.raises(ebay_list.EbayApiError, match="503"):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+                with pytest.raises(ebay_list.EbayApiError, match="circuit open"):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+            assert mock_post.call_count == 1
+        much_later = later + ebay_list.BREAKER_COOLDOWN + 1
+        with patch.object(ebay_list.time, "time", return_value=much_later):
+            with patch("requests.post", return_value=MagicMock(status_code=200, text="<Ack>Success</Ack>", content=b"")):
+                ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        assert ebay_list.breaker_status() == []
+        assert "closed again" in capsys.readouterr().err
+
+    def test_scoped_by_environment_and_account(self):
+        with patch("requests.post", return_value=self._fail()):
+            for _ in range(3):
+                with pytest.raises(ebay_list.EbayApiError, match="503"):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok", sandbox=True)
+        ok = MagicMock(status_code=200, text="<Ack>Success</Ack>", content=b"")
+        with patch("requests.post", return_value=ok) as mock_post:
+            ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")  # production still goes through
+        mock_post.assert_called_once()
+        assert [(b["scope"], b["state"]) for b in ebay_list.breaker_status()] == [("default/sandbox", "open")]
+        with ebay_list.use_account("shop2"):
+            assert ebay_list._breaker_scope(ebay_list.SANDBOX_API) == "shop2/sandbox"
+
+    def test_probe_slot_released_when_deadline_expires_first(self):
+        with patch("requests.post", return_value=self._fail()):
+            for _ in range(3):
+                with pytest.raises(ebay_list.EbayApiError):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        later = ebay_list.time.time() + ebay_list.BREAKER_COOLDOWN + 1
+        with patch.object(ebay_list.time, "time", return_value=later), \
+             patch.object(ebay_list.RateLimiter, "acquire", side_effect=ebay_list.DeadlineExceeded("expired")):
+            with pytest.raises(ebay_list.DeadlineExceeded):
+                ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        assert not ebay_list._BREAKER_STATE["probing"]
+        with patch.object(ebay_list.time, "time", return_value=later), \
+             patch("requests.post", return_value=MagicMock(status_code=200, text="<Ack>Success</Ack>", content=b"")):
+            ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")  # not "probe in flight"
+        assert ebay_list.breaker_status() == []
+
+    def test_reset(self):
+        with patch("requests.post", return_value=self._fail()):
+            for _ in range(3):
+                with pytest.raises(ebay_list.EbayApiError):
+                    ebay_list.trading_api_call("GetCategorySpecifics", "", "tok")
+        assert ebay_list.reset_breakers() == ["GetCategorySpecifics"]
+        assert ebay_list.breaker_status() == []
+
+
+class TestDeadline:
+    @pytest.fixture(autouse=True)
+    def _clear(self):
+        yield
+        ebay_list.clear_deadline()
+
+    def _ok(self):
+        return MagicMock(status_code=200, text="<Ack>Success</Ack>", content=b"")
+
+    def test_every_call_gets_a_timeout(self):
+        with patch("requests.post", return_value=self._ok()) as mock_post:
+            ebay_list.trading_api_call("GetItem", "", "tok")
+        assert mock_post.call_args[1]["timeout"] == ebay_list.DEFAULT_TIMEOUT
+
+    def test_timeout_clipped_to_remaining_budget(self):
+        ebay_list.set_deadline(5)
+        with patch("requests.post", return_value=self._ok()) as mock_post:
+            ebay_list.trading_api_call("GetItem", "", "tok")
+        assert 4 < mock_post.call_args[1]["timeout"] <= 5
+
+    def test_expired_budget_stops_before_calling(self):
+        ebay_list.set_deadline(0)
+        with patch("requests.post") as mock_post:
+            with pytest.raises(ebay_list.DeadlineExceeded):
+                ebay_list.trading_api_call("GetItem", "", "tok")
+        mock_post.assert_not_called()
+
+    def test_timeout_at_deadline_is_not_a_breaker_failure(self):
+        import requests
+
+        def hang(*args, **kwargs):
+            ebay_list.time.sleep(kwargs["timeout"])
+            raise requests.Timeout("read timed out")
+
+        ebay_list.set_deadline(0.1)
+        with patch("requests.post", side_effect=hang):
+            with pytest.raises(ebay_list.DeadlineExceeded, match="during GetItem"):
+                ebay_list.trading_api_call("GetItem", "", "tok")
+        assert ebay_list.breaker_status() == []
+
+    def test_not_swallowed_by_api_error_handlers(self, state_dir):
+        ebay_list.set_deadline(0)
+        with patch("requests.post") as mock_post:
+            with pytest.raises(ebay_list.DeadlineExceeded):
+                ebay_list.get_cached_category_specifics("31388", "tok", site_id="15")
+        mock_post.assert_not_called()
+
+    def test_rate_limiter_wait_respects_deadline(self):
+        limiter = ebay_list.RateLimiter(rate_per_second=0.1, burst=1)
+        limiter.acquire()
+        ebay_list.set_deadline(1)
+        started = ebay_list.time.monotonic()
+        with pytest.raises(ebay_list.DeadlineExceeded, match="rate limit"):
+            limiter.acquire()
+        assert ebay_list.time.monotonic() - started < 0.5
+
+    def test_zero_deadline_flag_is_applied(self):
+        with patch("sys.argv", ["ebay_list.py", "--deadline", "0", "breakers"]), \
+             patch.object(ebay_list, "set_deadline") as mock_set:
+            ebay_list.main()
+        mock_set.assert_called_once_with(0.0)
+
+    def test_concurrent_work_cancelled_on_expiry(self):
+        started = []
+
+        def slow(n):
+            started.append(n)
+            ebay_list.time.sleep(0.1)
+            return n
+
+        ebay_list.set_deadline(0.15)
+        with pytest.raises(ebay_list.DeadlineExceeded):
+            ebay_list._run_concurrently(slow, list(range(20)), max_workers=2)
+        assert len(started) < 20
+
+
+class TestHedging:
+    @pytest.fixture(autouse=True)
+    def _hedging(self):
+        with patch.dict(ebay_list.HEDGE_STATS, clear=True), patch.dict(ebay_list._LATENCIES, clear=True), \
+             patch.dict(ebay_list._LATENCY_STATE, {"loaded": True, "dirty": False}):
+            ebay_list.enable_hedging()
+            yield
+            ebay_list.enable_hedging(False)
+
+    def _seed(self, call_name, seconds=0.01, calls=100):
+        for _ in range(ebay_list.HEDGE_MIN_SAMPLES):
+            ebay_list._observe_latency(call_name, seconds)
+        ebay_list.HEDGE_STATS[call_name] = {"calls": calls, "hedged": 0, "won": 0}
+
+    def _slow_then_fast(self, slow=0.5):
+        calls = []
+
+        def fake_post(url, **kwargs):
+            calls.append(ebay_list.time.monotonic())
+            if len(calls) == 1:
+                ebay_list.time.sleep(slow)
+                return _streamed_response(b"<Ack>Success</Ack><Who>primary</Who>")
+            return _streamed_response(b"<Ack>Success</Ack><Who>hedge</Who>")
+
+        return calls, fake_post
+
+    def test_writes_and_unknown_latency_never_hedged(self):
+        self._seed("AddFixedPriceItem")
+        assert ebay_list._hedge_delay("AddFixedPriceItem") is None
+        assert ebay_list._hedge_delay("GetItem") is None  # no samples yet
+
+    def test_slow_read_is_hedged_and_hedge_wins(self):
+        self._seed("GetItem")
+        calls, fake_post = self._slow_then_fast()
+        with patch("requests.post", side_effect=fake_post):
+            result = ebay_list.trading_api_call("GetItem", "", "tok")
+        assert "<Who>hedge</Who>" in result
+        assert len(calls) == 2
+        assert 0.04 < calls[1] - calls[0] < 0.4
+        assert ebay_list.HEDGE_STATS["GetItem"]["hedged"] == 1
+        assert ebay_list.HEDGE_STATS["GetItem"]["won"] == 1
+
+    def test_hedges_capped(self):
+        self._seed("GetItem", calls=1)
+        calls, fake_post = self._slow_then_fast(slow=0.2)
+        with patch("requests.post", side_effect=fake_post):
+            result = ebay_list.trading_api_call("GetItem", "", "tok")
+        assert "<Who>primary</Who>" in result
+        assert len(calls) == 1
+
+    def test_write_is_sent_once_even_when_slow(self):
+        self._seed("ReviseFixedPriceItem")
+        calls, fake_post = self._slow_then_fast(slow=0.2)
+        with patch("requests.post", side_effect=fake_post):
+            ebay_list.trading_api_call("ReviseFixedPriceItem", "", "tok")
+        assert len(calls) == 1
+
+    def test_samples_persist_between_runs(self, state_dir):
+        self._seed("GetCategories")
+        ebay_list._LATENCY_STATE["dirty"] = True
+        ebay_list.save_latencies()
+        ebay_list._LATENCIES.clear()
+        ebay_list._LATENCY_STATE["loaded"] = False  # a new process
+        assert ebay_list._hedge_delay("GetCategories") == pytest.approx(ebay_list.HEDGE_MIN_DELAY)
+
+    def test_losing_response_closed_unread(self):
+        self._seed("GetItem")
+        slow = MagicMock()
+
+        def fake_post(url, **kwargs):
+            if not fake_post.calls:
+                fake_post.calls.append(1)
+                ebay_list.time.sleep(0.3)
+                return slow
+            return _streamed_response(b"<Ack>Success</Ack><Who>hedge</Who>")
+
+        fake_post.calls = []
+        with patch("requests.post", side_effect=fake_post):
+            assert "<Who>hedge</Who>" in ebay_list.trading_api_call("GetItem", "", "tok")
+        ebay_list.time.sleep(0.4)
+        slow.close.assert_called_once()
+        slow.content.__len__.assert_not_called()
+
+    def test_stats_printed(self, capsys):
+        self._seed("GetItem")
+        ebay_list.print_hedge_stats()
+        assert "GetItem" in capsys.readouterr().err
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def _fresh(self, state_dir):
+        with patch.dict(ebay_list._METRICS, {"calls": {}, "events": {}}), patch.dict(ebay_list._RUN):
+            yield
+
+    def test_requests_and_events_merged_into_store(self):
+        with patch("requests.post", return_value=_streamed_response(b"<Ack>Success</Ack>")):
+            ebay_list.trading_api_call("GetItem", "", "tok")
+            ebay_list.trading_api_call("GetItem", "", "tok")
+        ebay_list.count_event("listings_created")
+        ebay_list.flush_metrics("dashboard", "", ok=True, seconds=1.2)
+        store = ebay_list.flush_metrics("dashboard", "", ok=False, seconds=0.3)
+        assert store["calls"]["|GetItem"]["status"] == {"200": 2}
+        assert store["calls"]["|GetItem"]["latency"]["count"] == 2
+        assert store["events"] == {"|listings_created": 1}
+        assert store["commands"]["|dashboard"]["ok"] == 1
+        assert store["commands"]["|dashboard"]["error"] == 1
+
+    def test_connection_error_counted(self):
+        import requests
+        with patch("requests.post", side_effect=requests.ConnectionError("down")):
+            with pytest.raises(requests.ConnectionError):
+                ebay_list.trading_api_call("GetItem", "", "tok")
+        assert ebay_list._METRICS["calls"]["|GetItem"]["status"] == {"error": 1}
+
+    def test_prometheus_format(self, tmp_path):
+        ebay_list._metric_request("GetItem", "200", 0.3, 100, 50)
+        ebay_list._metric_request("GetItem", "503", 7.0)
+        ebay_list.flush_metrics("list", "shop2", ok=True, seconds=4.0)
+        path = tmp_path / "ebay.prom"
+        ebay_list.write_prometheus_textfile(str(path))
+        text = path.read_text()
+        assert 'ebay_api_requests_total{account="default",call="GetItem",status="503"} 1' in text
+        assert 'ebay_api_request_duration_seconds_bucket{account="default",call="GetItem",le="0.5"} 1' in text
+        assert 'ebay_api_request_duration_seconds_bucket{account="default",call="GetItem",le="+Inf"} 2' in text
+        assert 'ebay_command_runs_total{account="shop2",command="list",outcome="ok"} 1' in text
+        assert "# TYPE ebay_command_duration_seconds histogram" in text
+
+    def test_show_counts_5xx_and_connection_errors(self, capsys):
+        for status in ("200", "404", "503", "error"):
+            ebay_list._metric_request("GetItem", status, 0.1)
+        ebay_list.flush_metrics("list", "", ok=True, seconds=1.0)
+        with patch("sys.argv", ["ebay_list.py", "metrics", "show"]):
+            ebay_list.main()
+        row = next(line for line in capsys.readouterr().out.splitlines() if line.startswith("GetItem"))
+        assert row.split()[1:3] == ["4", "2"]
+
+    def test_run_records_command_outcome(self, tmp_path):
+        textfile = tmp_path / "ebay.prom"
+        with patch("sys.argv", ["ebay_list.py", "--metrics-textfile", str(textfile), "breakers"]):
+            with pytest.raises(SystemExit) as exc:
+                ebay_list.run()
+        assert exc.value.code == 0
+        assert ebay_list.load_metrics()["commands"]["|breakers"]["ok"] == 1
+        assert 'command="breakers",outcome="ok"} 1' in textfile.read_text()
+
+    def test_disabled_by_env(self):
+        with patch("sys.argv", ["ebay_list.py", "breakers"]), patch.dict(os.environ, {"EBAY_METRICS": "off"}):
+            with pytest.raises(SystemExit):
+                ebay_list.run()
+        assert ebay_list.load_metrics()["commands"] == {}
+
+
+class TestProfiling:
+    def test_writes_pstats_collapsed_and_allocations(self, tmp_path, capsys):
+        def slow_post(url, **kwargs):
+            ebay_list.time.sleep(0.05)
+            return _streamed_response(b"<Ack>Success</Ack>")
+
+        def parse(i):
+            return sum(len(re.findall(r"<Name>(.*?)</Name>", "<Name>x</Name>" * 2000)) for _ in range(20))
+
+        ebay_list.start_profiling(str(tmp_path), "dashboard")
+        try:
+            with patch("requests.post", side_effect=slow_post):
+                ebay_list.trading_api_call("GetItem", "", "tok")
+            ebay_list._run_concurrently(parse, range(4))
+        finally:
+            summary = ebay_list.stop_profiling()
+        assert ebay_list.stop_profiling() == {}  # idempotent
+        assert summary["network"] >= 0.05
+        pstats_file, collapsed, alloc = summary["files"]
+        stats = ebay_list.pstats.Stats(pstats_file)
+        assert any(func[2] == "parse" for func in stats.stats)  # worker thread profiled too
+        lines = open(collapsed).read().splitlines()
+        assert lines and all(re.fullmatch(r"\S.*;\S+ \d+", line) for line in lines)
+        assert "Peak traced memory" in open(alloc).read()
+        assert "network wait" in capsys.readouterr().err
+
+    def test_waits_not_tracked_without_profile(self):
+        with patch.dict(ebay_list._PROFILE, {"profiler": None, "waits": {}}):
+            ebay_list._profile_wait("network", 1.0)
+            assert ebay_list._PROFILE["waits"] == {}
+
+
+class TestConnectionRacing:
+    V6 = (ebay_list.socket.AF_INET6, 0, 0, "", ("2001:db8::1", 443, 0, 0))
+    V4 = (ebay_list.socket.AF_INET, 0, 0, "", ("192.0.2.1", 443))
+
+    @pytest.fixture(autouse=True)
+    def _fresh_cache(self, state_dir):
+        with patch.dict(ebay_list._DNS, {"entries": None}):
+            yield
+
+    def _connect(self, slow_family, delay=1.0, fail=False):
+        attempts = []
+
+        def fake_connect(family, sockaddr, timeout, source_address, socket_options):
+            attempts.append(family)
+            if family == slow_family:
+                ebay_list.time.sleep(0.0 if fail else delay)
+                if fail:
+                    raise OSError("unreachable")
+            return MagicMock(family=family)
+
+        return attempts, fake_connect
+
+    def test_dns_cached_and_persisted(self, state_dir):
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V6, self.V4]) as gai:
+            ebay_list.resolve_host("api.ebay.com", 443)
+            ebay_list._DNS["entries"] = None  # a new process
+            addrs = ebay_list.resolve_host("api.ebay.com", 443)
+        assert gai.call_count == 1
+        assert [f for f, _ in addrs] == [ebay_list.socket.AF_INET6, ebay_list.socket.AF_INET]
+        assert (state_dir / "dns_cache.json").exists()
+
+    def test_expired_entry_reresolved_and_stale_used_when_resolver_down(self):
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V4]):
+            ebay_list.resolve_host("api.ebay.com", 443)
+        ebay_list._DNS["entries"]["api.ebay.com:443"]["expires"] = 0
+        with patch.object(ebay_list.socket, "getaddrinfo", side_effect=ebay_list.socket.gaierror("down")):
+            assert ebay_list.resolve_host("api.ebay.com", 443) == [(ebay_list.socket.AF_INET, ("192.0.2.1", 443))]
+        assert ebay_list._DNS["entries"]["api.ebay.com:443"]["expires"] == 0  # still stale: retried next time
+
+    def test_aaaa_failure_falls_back_to_ipv4_lookup(self):
+        def gai(host, port, family, socktype):
+            if family != ebay_list.socket.AF_INET:
+                raise ebay_list.socket.gaierror("AAAA lookup failed")
+            return [self.V4]
+
+        with patch.object(ebay_list.socket, "getaddrinfo", side_effect=gai):
+            assert ebay_list.resolve_host("api.ebay.com", 443)[0][0] == ebay_list.socket.AF_INET
+
+    def test_slow_ipv6_loses_race_and_ipv4_is_remembered(self):
+        attempts, fake_connect = self._connect(ebay_list.socket.AF_INET6)
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V6, self.V4]), \
+             patch.object(ebay_list, "_connect_one", side_effect=fake_connect):
+            started = ebay_list.time.monotonic()
+            sock = ebay_list.create_connection(("api.ebay.com", 443), timeout=5)
+            assert ebay_list.time.monotonic() - started < 0.8
+            assert sock.family == ebay_list.socket.AF_INET
+            order = [f for f, _ in ebay_list.resolve_host("api.ebay.com", 443)]
+        assert order[0] == ebay_list.socket.AF_INET
+
+    def test_failed_attempt_starts_next_without_waiting(self):
+        attempts, fake_connect = self._connect(ebay_list.socket.AF_INET6, fail=True)
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V6, self.V4]), \
+             patch.object(ebay_list, "_connect_one", side_effect=fake_connect):
+            started = ebay_list.time.monotonic()
+            ebay_list.create_connection(("api.ebay.com", 443))
+        assert ebay_list.time.monotonic() - started < ebay_list.HAPPY_EYEBALLS_DELAY
+        assert attempts == [ebay_list.socket.AF_INET6, ebay_list.socket.AF_INET]
+
+    def test_all_attempts_fail(self):
+        def refuse(*args):
+            raise ConnectionRefusedError("refused")
+
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V6, self.V4]), \
+             patch.object(ebay_list, "_connect_one", side_effect=refuse):
+            with pytest.raises(ConnectionRefusedError):
+                ebay_list.create_connection(("api.ebay.com", 443))
+
+    def test_moved_host_reresolved_after_cached_addresses_fail(self):
+        moved = (ebay_list.socket.AF_INET, 0, 0, "", ("192.0.2.99", 443))
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[self.V4]):
+            ebay_list.resolve_host("api.ebay.com", 443)
+
+        def connect(family, sockaddr, *args):
+            if sockaddr[0] != "192.0.2.99":
+                raise ConnectionRefusedError("refused")
+            return MagicMock(family=family)
+
+        with patch.object(ebay_list.socket, "getaddrinfo", return_value=[moved]) as gai, \
+             patch.object(ebay_list, "_connect_one", side_effect=connect):
+            ebay_list.create_connection(("api.ebay.com", 443))
+        gai.assert_called_once()
+        assert ebay_list._DNS["entries"]["api.ebay.com:443"]["addrs"] == [[ebay_list.socket.AF_INET, ["192.0.2.99", 443]]]
+
+    def test_installed_into_urllib3(self):
+        assert ebay_list.urllib3_cn.create_connection is ebay_list.create_connection
+
+
+PROFILES_XML = """<GetUserPreferencesResponse><Ack>Success</Ack>
+<SellerProfilePreferences><SellerProfileOptedIn>true</SellerProfileOptedIn><SupportedSellerProfiles>
+  <SupportedSellerProfile><ProfileID>5550001</ProfileID><ProfileType>SHIPPING</ProfileType>
+    <ProfileName>Mascot pickup</ProfileName><ShortSummary>AU Regular $15, pickup</ShortSummary>
+    <CategoryGroup><Name>ALL</Name><IsDefault>true</IsDefault></CategoryGroup></SupportedSellerProfile>
+  <SupportedSellerProfile><ProfileID>5550002</ProfileID><ProfileType>RETURN_POLICY</ProfileType>
+    <ProfileName>No returns</ProfileName></SupportedSellerProfile>
+</SupportedSellerProfiles></SellerProfilePreferences></GetUserPreferencesResponse>"""
+
+
+class TestSellerProfiles:
+    @pytest.fixture(autouse=True)
+    def _isolated_state(self, state_dir):
+        yield
+
+    def test_profiles_fetched_once_and_cached(self):
+        with patch.object(ebay_list, "trading_api_call", return_value=PROFILES_XML) as mock_call:
+            first = ebay_list.fetch_seller_profiles("tok", site_id="15")
+            second = ebay_list.fetch_seller_profiles("tok", site_id="15")
+        assert mock_call.call_count == 1
+        assert "<ShowSellerProfilePreferences>true" in mock_call.call_args[0][1]
+        assert first == second
+        assert first[0] == {"id": "5550001", "type": "SHIPPING", "name": "Mascot pickup",
+                            "summary": "AU Regular $15, pickup", "default": True}
+
+    def test_names_and_ids_resolved(self):
+        with patch.object(ebay_list, "trading_api_call", return_value=PROFILES_XML):
+            ids = ebay_list.resolve_seller_profiles(
+                {"shipping": "mascot PICKUP", "return": "No returns", "payment": "777"}, "tok", site_id="15")
+        assert ids == {"shipping": "5550001", "return": "5550002", "payment": "777"}
+
+    def test_ids_only_need_no_lookup(self):
+        with patch.object(ebay_list, "trading_api_call") as mock_call:
+            assert ebay_list.resolve_seller_profiles({"shipping": "123"}, "tok") == {"shipping": "123"}
+        mock_call.assert_not_called()
+
+    def test_ids_checked_per_site_when_asked(self):
+        with patch.object(ebay_list, "trading_api_call", return_value=PROFILES_XML):
+            assert ebay_list.resolve_seller_profiles({"shipping": "5550001"}, "tok", site_id="15", check_ids=True) == \
+                {"shipping": "5550001"}
+            with pytest.raises(ebay_list.EbayApiError, match="No shipping policy with ID 5550002"):
+                ebay_list.resolve_seller_profiles({"shipping": "5550002"}, "tok", site_id="15", check_ids=True)
+
+    def test_profiles_skip_inline_policy_blocks(self):
+        with patch.object(ebay_list, "_shipping_details_xml") as mock_shipping:
+            xml = ebay_list._build_listing_xml(
+                title="T", description="D", price=1.0, condition_id="3000", image_urls=[],
+                category_id="31388", seller_profiles={"shipping": "1", "return": "2"},
+            )
+        mock_shipping.assert_not_called()
+        assert "<ShippingDetails>" not in xml and "<ReturnPolicy>" not in xml
+
+    def test_unknown_name_refreshes_once_then_fails(self):
+        with patch.object(ebay_list, "trading_api_call", return_value=PROFILES_XML) as mock_call:
+            with pytest.raises(ebay_list.EbayApiError, match="No return policy named '30 days'"):
+                ebay_list.resolve_seller_profiles({"return": "30 days"}, "tok", site_id="15")
+        assert mock_call.call_count == 2
+
+    def test_profiles_replace_inline_blocks(self):
+        build = TestBuildListingXml()._build
+        inline = build(domestic_services=[{"service": "AU_Regular", "cost": 15.0}])
+        xml = build(domestic_services=[{"service": "AU_Regular", "cost": 15.0}],
+                    seller_profiles={"shipping": "5550001", "return": "5550002"})
+        assert "<ShippingDetails>" not in xml and "<ReturnPolicy>" not in xml
+        assert "<DispatchTimeMax>" not in xml
+        assert "<SellerShippingProfile><ShippingProfileID>5550001</ShippingProfileID></SellerShippingProfile>" in xml
+        assert "<SellerReturnProfile><ReturnProfileID>5550002</ReturnProfileID></SellerReturnProfile>" in xml
+        assert len(xml) < len(inline)
+
+    def test_partial_profiles_keep_other_inline_block(self):
+        xml = TestBuildListingXml()._build(seller_profiles={"return": "5550002"})
+        assert "<ShippingDetails>" in xml and "<ReturnPolicy>" not in xml
+
+    def test_listing_references_profiles(self):
+        calls = []
+
+        def fake_call(call_name, body, *args, **kwargs):
+            calls.append((call_name, body))
+            return PROFILES_XML if call_name == "GetUserPreferences" else "<Ack>Success</Ack><ItemID>42</ItemID>"
+
+        with patch.object(ebay_list, "resolve_condition", return_value="3000"), \
+             patch.object(ebay_list, "trading_api_call", side_effect=fake_call):
+            ebay_list.trading_add_fixed_price_item(
+                title="Test", description="Desc", price=50.0, condition="USED_GOOD",
+                image_urls=["https://example.com/img.jpg"], category_id="31388", marketplace="AU",
+                auth_token="tok", seller_profiles={"shipping": "Mascot pickup"},
+            )
+        assert [c[0] for c in calls] == ["GetUserPreferences", "AddFixedPriceItem"]
+        assert "<ShippingProfileID>5550001</ShippingProfileID>" in calls[1][1]
+
+
+def _aspects_file(*categories):
+    return json.dumps({
+        "categoryTreeId": "15",
+        "categoryTreeVersion": "128",
+        "categoryAspects": [
+            {"category": {"categoryId": cid, "categoryName": name}, "aspects": [
+                {"localizedAspectName": "Brand",
+                 "aspectConstraint": {"aspectRequired": True, "aspectMode": "FREE_TEXT", "aspectUsage": "RECOMMENDED"},
+                 "aspectValues": [{"localizedValue": f"Brand {i}"} for i in range(150)]},
+                {"localizedAspectName": "Connectivity",
+                 "aspectConstraint": {"aspectRequired": False, "aspectMode": "SELECTION_ONLY", "aspectUsage": "OPTIONAL"},
+                 "aspectValues": [{"localizedValue": v} for v in ("Wi-Fi", "Bluetooth")]},
+            ]}
+            for cid, name in categories
+        ],
+    }, indent=1)
+
+
+class TestAspectIndex:
+    CATEGORIES = [("31388", "Digital Cameras"), ("179697", "Camera Drones"), ("9355", "Mobile Phones")]
+
+    @pytest.fixture(autouse=True)
+    def _isolated(self, state_dir):
+        with patch.dict(ebay_list._ASPECT_INDEXES, clear=True):
+            yield
+            for index in ebay_list._ASPECT_INDEXES.values():
+                index.close()
+
+    def _build(self, chunk_size=None):
+        import io
+        path = ebay_list._aspect_index_path("AU")
+        stream = io.StringIO(_aspects_file(*self.CATEGORIES))
+        if chunk_size:  # force the decoder to refill mid-record
+            read = stream.read
+            stream.read = lambda n=-1: read(chunk_size)
+        return ebay_list.build_aspect_index(stream, path, {"marketplace": "AU"})
+
+    def test_build_and_lookup(self):
+        meta = self._build(chunk_size=64)
+        assert meta["categories"] == 3
+        assert meta["categoryTreeVersion"] == "128"
+        record = ebay_list.lookup_aspects("179697", "15")
+        assert record["name"] == "Camera Drones"
+        brand, connectivity = record["aspects"]
+        assert brand["required"] is True
+        assert len(brand["values"]) == ebay_list.ASPECT_VALUES_MAX  # free text: capped
+        assert connectivity == {"name": "Connectivity", "required": False, "values": ["Wi-Fi", "Bluetooth"],
+                                "mode": "SELECTION_ONLY", "usage": "OPTIONAL"}
+        assert ebay_list.lookup_aspects("1", "15") is None
+        assert ebay_list.lookup_aspects("31388", "0") is None  # no US index
+
+    def test_stale_index_ignored(self):
+        self._build()
+        index = ebay_list.open_aspect_index("AU")
+        index.meta["synced_at"] -= ebay_list.ASPECT_INDEX_MAX_AGE + 1
+        assert ebay_list.lookup_aspects("31388", "15") is None
+
+    def test_truncated_file_rejected(self):
+        import io
+        path = ebay_list._aspect_index_path("AU")
+        with pytest.raises(ebay_list.EbayApiError, match="mid-record"):
+            ebay_list.build_aspect_index(io.StringIO(_aspects_file(*self.CATEGORIES)[:300]), path)
+        assert os.listdir(os.path.dirname(path)) == []  # the partial .tmp file was removed
+
+    def test_validation_uses_index_without_api_calls(self):
+        self._build()
+        with patch.object(ebay_list, "trading_api_call") as mock_call:
+            kwargs = dict(title="Sony A7 III", description="Camera", price=1500.0, image_count=3,
+                          category_id="31388", auth_token="tok", site_id="15")
+            assert ebay_list.validate_listing(**kwargs) == ["Missing required item specifics: Brand."]
+            problems = ebay_list.validate_listing(**kwargs, item_specifics={"Brand": "Sony", "Connectivity": "USB"})
+        assert problems == ["'USB' is not an allowed value for Connectivity (e.g. Wi-Fi, Bluetooth)."]
+        mock_call.assert_not_called()
+
+    def test_sync_downloads_gzipped_file(self):
+        import gzip
+        body = gzip.compress(_aspects_file(*self.CATEGORIES).encode())
+        download = MagicMock(status_code=200)
+        download.iter_content = lambda chunk_size: (body[i:i + 100] for i in range(0, len(body), 100))
+        responses = {
+            "ApplicationToken": MagicMock(status_code=200, json=lambda: {"access_token": "app"}),
+            "GetDefaultCategoryTreeId": MagicMock(status_code=200, json=lambda: {"categoryTreeId": "15"}),
+            "FetchItemAspects": download,
+        }
+        calls = []
+
+        def fake_http(method, url, call_name, **kwargs):
+            calls.append((call_name, url, kwargs.get("headers", {}), kwargs.get("stream")))
+            return responses[call_name]
+
+        env = {"EBAY_CLIENT_ID": "id", "EBAY_CLIENT_SECRET": "secret"}
+        with patch.object(ebay_list, "_http_request", side_effect=fake_http), patch.dict(os.environ, env):
+            meta = ebay_list.sync_aspect_index("AU")
+        assert meta["categories"] == 3
+        assert "marketplace_id=EBAY_AU" in calls[1][1]
+        assert calls[2][1].endswith("/category_tree/15/fetch_item_aspects")
+        assert calls[2][2]["Authorization"] == "Bearer app"
+        assert calls[2][3] is True  # streamed, not buffered
+        download.close.assert_called_once()
+        assert ebay_list.lookup_aspects("9355", "15")["name"] == "Mobile Phones"
+
+    def test_specifics_offline_from_index(self, capsys):
+        self._build()
+        env = {k: v for k, v in os.environ.items() if not k.startswith("EBAY_")}
+        with patch("sys.argv", ["ebay_list.py", "specifics", "31388", "--marketplace", "AU"]), \
+             patch.dict(os.environ, env, clear=True), \
+             patch.object(ebay_list, "trading_api_call") as mock_call:
+            ebay_list.main()
+        mock_call.assert_not_called()
+        out = capsys.readouterr().out
+        assert "Category 31388: Digital Cameras (leaf)" in out
+        assert "REQUIRED   Brand" in out
+
+    def test_aspects_show_without_credentials(self, capsys):
+        self._build()
+        env = {k: v for k, v in os.environ.items() if not k.startswith("EBAY_")}
+        with patch("sys.argv", ["ebay_list.py", "aspects", "show", "179697", "--marketplace", "AU"]), \
+             patch.dict(os.environ, env, clear=True):
+            ebay_list.main()
+        assert "Category 179697: Camera Drones" in capsys.readouterr().out